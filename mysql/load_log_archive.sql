@@ -0,0 +1,9 @@
+--
+-- mysql -u recorder -pbogus mythic_recorder_v1 < load_log_archive.sql
+--
+-- load_log rows for files read from a zip or tar.gz archive name the archive (relative to importDir)
+--
+USE `mythic_recorder_v1`;
+
+ALTER TABLE `mythic_recorder_v1`.`load_log`
+  ADD COLUMN `archive_name` VARCHAR(128) NULL AFTER `write_pop`;
@@ -0,0 +1,10 @@
+--
+-- mysql -u recorder -pbogus mythic_recorder_v1 < load_log_checkpoint.sql
+--
+-- add resumable load checkpoint to an existing load_log table
+--
+USE `mythic_recorder_v1`;
+
+ALTER TABLE `mythic_recorder_v1`.`load_log`
+  ADD COLUMN `checkpoint_offset` BIGINT UNSIGNED NOT NULL DEFAULT 0 AFTER `duration`,
+  ADD COLUMN `checkpoint_row` INT NOT NULL DEFAULT 0 AFTER `checkpoint_offset`;
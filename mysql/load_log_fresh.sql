@@ -0,0 +1,9 @@
+--
+-- mysql -u recorder -pbogus mythic_recorder_v1 < load_log_fresh.sql
+--
+-- flag load_log rows for files discovery has never seen, these may use LOAD DATA LOCAL INFILE
+--
+USE `mythic_recorder_v1`;
+
+ALTER TABLE `mythic_recorder_v1`.`load_log`
+  ADD COLUMN `fresh_flag` TINYINT(1) NOT NULL DEFAULT 0 AFTER `checkpoint_row`;
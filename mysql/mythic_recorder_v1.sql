@@ -9,8 +9,15 @@ CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`task_log` (
   `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
   `time_stamp` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `command` VARCHAR(128) NOT NULL,
-  PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC))
+  PRIMARY KEY (`id`))
+ENGINE = InnoDB;
+
+DROP TABLE IF EXISTS `mythic_recorder_v1`.`schema_version`;
+CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`schema_version` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  `time_stamp` DATETIME NOT NULL,
+  `version` INT NOT NULL,
+  PRIMARY KEY (`id`))
 ENGINE = InnoDB;
 
 DROP TABLE IF EXISTS `mythic_recorder_v1`.`application_log`;
@@ -21,8 +28,7 @@ CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`application_log` (
   `level` INT NOT NULL,
   `facility` VARCHAR(32) NOT NULL,
   `event` VARCHAR(128) NOT NULL,
-  PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC))
+  PRIMARY KEY (`id`))
 ENGINE = InnoDB;
 
 DROP TABLE IF EXISTS `mythic_recorder_v1`.`exchange`;
@@ -33,7 +39,6 @@ CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`exchange` (
   `symbol` VARCHAR(32) NOT NULL,
   `name` VARCHAR(64) NOT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC),
   UNIQUE INDEX `symbol_UNIQUE` (`symbol` ASC))
 ENGINE = InnoDB;
 
@@ -46,7 +51,6 @@ CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`file_stat` (
   `file_size` BIGINT UNSIGNED NOT NULL,
   `sha1_hash` VARCHAR(48) NOT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC),
   UNIQUE INDEX `normalized_name_UNIQUE` (`normalized_name` ASC))
 ENGINE = InnoDB;
 
@@ -65,9 +69,20 @@ CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`load_log` (
   `fresh_pop` INT NOT NULL,
   `stub_pop` INT NOT NULL,
   `complete_flag` TINYINT(1) NOT NULL,
-  `duration` BIGINT NOT NULL,
+  `duration` DOUBLE NOT NULL,
+  `checkpoint_offset` BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  `checkpoint_row` INT NOT NULL DEFAULT 0,
+  `fresh_flag` TINYINT(1) NOT NULL DEFAULT 0,
+  `read_duration` DOUBLE NOT NULL DEFAULT 0,
+  `parse_duration` DOUBLE NOT NULL DEFAULT 0,
+  `resolve_duration` DOUBLE NOT NULL DEFAULT 0,
+  `select_duration` DOUBLE NOT NULL DEFAULT 0,
+  `write_duration` DOUBLE NOT NULL DEFAULT 0,
+  `commit_duration` DOUBLE NOT NULL DEFAULT 0,
+  `select_pop` INT NOT NULL DEFAULT 0,
+  `write_pop` INT NOT NULL DEFAULT 0,
+  `archive_name` VARCHAR(128) NULL,
   PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC),
   INDEX `ndx1` (`complete_flag` ASC, `file_name` ASC))
 ENGINE = InnoDB;
 
@@ -81,8 +96,28 @@ CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`load_log_summary` (
   `update_file_pop` INT NOT NULL,
   `directory_pop` INT NOT NULL,
   `duration` BIGINT NOT NULL,
+  PRIMARY KEY (`id`))
+ENGINE = InnoDB;
+
+DROP TABLE IF EXISTS `mythic_recorder_v1`.`parse_summary`;
+CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`parse_summary` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  `time_stamp` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `task_id` BIGINT UNSIGNED NOT NULL,
+  `exchange` VARCHAR(16) NOT NULL,
+  `file_pop` INT NOT NULL,
+  `total_pop` INT NOT NULL,
+  `duration` DOUBLE NOT NULL,
+  `read_duration` DOUBLE NOT NULL,
+  `parse_duration` DOUBLE NOT NULL,
+  `resolve_duration` DOUBLE NOT NULL,
+  `select_duration` DOUBLE NOT NULL,
+  `write_duration` DOUBLE NOT NULL,
+  `commit_duration` DOUBLE NOT NULL,
+  `select_pop` INT NOT NULL,
+  `write_pop` INT NOT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC))
+  INDEX `ndx1` (`task_id` ASC))
 ENGINE = InnoDB;
 
 DROP TABLE IF EXISTS `mythic_recorder_v1`.`name`;
@@ -99,26 +134,29 @@ CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`name` (
   `expiration` DATE NOT NULL,
   `strike` BIGINT NOT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC),
   INDEX `ndx1` (`symbol` ASC, `exchange_id` ASC))
 ENGINE = InnoDB;
 
+--
+-- price_intraday is clustered on (name_id, date) w/monthly range partitions.
+-- p_max is split into monthly partitions by "partition_intraday.py extend", run it before each load.
+-- existing tables w/a surrogate id are converted by "partition_intraday.py migrate".
+--
 DROP TABLE IF EXISTS `mythic_recorder_v1`.`price_intraday`;
 CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`price_intraday` (
-  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
-  `task_id` BIGINT UNSIGNED NOT NULL,
-  `name_id` BIGINT UNSIGNED NOT NULL,
+  `task_id` INT UNSIGNED NOT NULL,
+  `name_id` INT UNSIGNED NOT NULL,
   `date` DATETIME NOT NULL,
-  `open_price` BIGINT NOT NULL,
-  `high_price` BIGINT NOT NULL,
-  `low_price` BIGINT NOT NULL,
-  `close_price` BIGINT NOT NULL,
+  `open_price` INT NOT NULL,
+  `high_price` INT NOT NULL,
+  `low_price` INT NOT NULL,
+  `close_price` INT NOT NULL,
   `volume` BIGINT NOT NULL,
-  `open_interest` BIGINT NOT NULL,
-  PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC),
-  UNIQUE INDEX `ndx1` (`name_id` ASC, `date` ASC))
-ENGINE = InnoDB;
+  `open_interest` INT NOT NULL,
+  PRIMARY KEY (`name_id`, `date`))
+ENGINE = InnoDB
+PARTITION BY RANGE (TO_DAYS(`date`)) (
+  PARTITION `p_max` VALUES LESS THAN MAXVALUE);
 
 DROP TABLE IF EXISTS `mythic_recorder_v1`.`price_session`;
 CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`price_session` (
@@ -133,7 +171,6 @@ CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`price_session` (
   `volume` BIGINT NOT NULL,
   `open_interest` BIGINT NOT NULL,
   PRIMARY KEY (`id`),
-  UNIQUE INDEX `id_UNIQUE` (`id` ASC),
   UNIQUE INDEX `ndx1` (`name_id` ASC, `date` ASC))
 ENGINE = InnoDB;
 
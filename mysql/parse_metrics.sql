@@ -0,0 +1,37 @@
+--
+-- mysql -u recorder -pbogus mythic_recorder_v1 < parse_metrics.sql
+--
+-- fractional load_log duration, per stage load_log metrics and per task/exchange parse_summary
+--
+USE `mythic_recorder_v1`;
+
+ALTER TABLE `mythic_recorder_v1`.`load_log`
+  MODIFY COLUMN `duration` DOUBLE NOT NULL,
+  ADD COLUMN `read_duration` DOUBLE NOT NULL DEFAULT 0 AFTER `fresh_flag`,
+  ADD COLUMN `parse_duration` DOUBLE NOT NULL DEFAULT 0 AFTER `read_duration`,
+  ADD COLUMN `resolve_duration` DOUBLE NOT NULL DEFAULT 0 AFTER `parse_duration`,
+  ADD COLUMN `select_duration` DOUBLE NOT NULL DEFAULT 0 AFTER `resolve_duration`,
+  ADD COLUMN `write_duration` DOUBLE NOT NULL DEFAULT 0 AFTER `select_duration`,
+  ADD COLUMN `commit_duration` DOUBLE NOT NULL DEFAULT 0 AFTER `write_duration`,
+  ADD COLUMN `select_pop` INT NOT NULL DEFAULT 0 AFTER `commit_duration`,
+  ADD COLUMN `write_pop` INT NOT NULL DEFAULT 0 AFTER `select_pop`;
+
+CREATE TABLE IF NOT EXISTS `mythic_recorder_v1`.`parse_summary` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  `time_stamp` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `task_id` BIGINT UNSIGNED NOT NULL,
+  `exchange` VARCHAR(16) NOT NULL,
+  `file_pop` INT NOT NULL,
+  `total_pop` INT NOT NULL,
+  `duration` DOUBLE NOT NULL,
+  `read_duration` DOUBLE NOT NULL,
+  `parse_duration` DOUBLE NOT NULL,
+  `resolve_duration` DOUBLE NOT NULL,
+  `select_duration` DOUBLE NOT NULL,
+  `write_duration` DOUBLE NOT NULL,
+  `commit_duration` DOUBLE NOT NULL,
+  `select_pop` INT NOT NULL,
+  `write_pop` INT NOT NULL,
+  PRIMARY KEY (`id`),
+  INDEX `ndx1` (`task_id` ASC))
+ENGINE = InnoDB;
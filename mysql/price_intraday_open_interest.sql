@@ -0,0 +1,9 @@
+--
+-- mysql -u recorder -pbogus mythic_recorder_v1 < price_intraday_open_interest.sql
+--
+-- signed price_intraday.open_interest, negative values are stored as read (as by price_session)
+--
+USE `mythic_recorder_v1`;
+
+ALTER TABLE `mythic_recorder_v1`.`price_intraday`
+  MODIFY COLUMN `open_interest` INT NOT NULL;
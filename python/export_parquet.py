@@ -0,0 +1,65 @@
+#! /usr/bin/python3
+#
+# Title:export_parquet.py
+# Description: export prices loaded since the previous run to parquet, partitioned by exchange and month
+# Development Environment:OS X 10.13.3/Python 3.6.4
+# Author:G.S. Cole (guycole at gmail dot com)
+#
+import sys
+import time
+
+from mythic_recorder.context import Context
+from mythic_recorder.parquet_export import ParquetExport
+from mythic_recorder.sql_table import SqlTable
+
+
+class ExportParquet:
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.facility = 'export_parquet'
+
+    def execute(self, yaml_file_name, directory):
+        start_time = time.time()
+
+        context = Context()
+        context.loader(yaml_file_name)
+
+        sql_table = SqlTable(context)
+        session = sql_table.session_factory()
+
+        parquet_export = ParquetExport(session, directory)
+
+        try:
+            task_id = parquet_export.execute()
+        finally:
+            session.close()
+
+        print("exported through task %d, %d partitions, %d rows, %.1f seconds" % (task_id, parquet_export.partition_counter, parquet_export.row_counter, time.time() - start_time))
+
+print('start export_parquet')
+
+#
+# argv[1] = configuration filename
+# argv[2] = export directory, i.e. /data/parquet (requires pyarrow)
+# run after loader.py, i.e. from the same cron entry
+#
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("usage: export_parquet.py config_file export_directory")
+        sys.exit(1)
+
+    if not ParquetExport.available():
+        print("export requires the pyarrow package")
+        sys.exit(1)
+
+    export_parquet = ExportParquet()
+    export_parquet.execute(sys.argv[1], sys.argv[2])
+
+print('stop export_parquet')
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
@@ -0,0 +1,241 @@
+#! /usr/bin/python3
+#
+# Title:load_benchmark.py
+# Description: end to end discovery/parse throughput over an EODData tree, SQLite, MySQL or PostgreSQL
+# Development Environment:OS X 10.13.3/Python 3.6.4
+# Author:G.S. Cole (guycole at gmail dot com)
+#
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlalchemy import func
+
+from mythic_recorder.alert_log import AlertLog
+from mythic_recorder.context import Context
+from mythic_recorder.discovery import Discovery
+from mythic_recorder.eod_file import EodFile
+from mythic_recorder.parser import Parser
+from mythic_recorder.sql_table import Base
+from mythic_recorder.sql_table import LoadLog
+from mythic_recorder.sql_table import SqlTable
+from mythic_recorder.sql_table import TaskLog
+
+
+class LoadBenchmark:
+    """
+    Run Discovery and Parser stage by stage against a scratch database and report
+    files/sec, rows/sec, SQL statement population and peak RSS per stage.
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.facility = 'load_benchmark'
+
+        self.query_counter = 0
+
+        # one dictionary per stage
+        self.results = []
+
+    def count_query(self, connection, cursor, statement, parameters, context, executemany):
+        self.query_counter = 1 + self.query_counter
+
+    def peak_rss(self):
+        """
+        :return: process high water RSS in MiB, never decreases between stages
+        """
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            return peak / 1048576.0
+
+        return peak / 1024.0
+
+    def measure(self, label, function, context):
+        """
+        :param label: stage name
+        :param function: stage function, returns (file population, row population)
+        :param context: runtime context
+        :return: None
+        """
+        self.query_counter = 0
+
+        start_time = time.time()
+        files, rows = function(context)
+        duration = max(time.time() - start_time, 0.000001)
+
+        result = {'stage': label, 'files': files, 'rows': rows, 'duration': round(duration, 3),
+                  'files_sec': round(files / duration, 1), 'rows_sec': round(rows / duration, 1),
+                  'queries': self.query_counter, 'peak_rss_mib': round(self.peak_rss(), 1)}
+        self.results.append(result)
+
+        print("%-9s %7d files %10d rows %9.3f sec %9.1f files/sec %10.0f rows/sec %8d queries %8.1f MiB peak" %
+              (label, files, rows, duration, result['files_sec'], result['rows_sec'], self.query_counter, result['peak_rss_mib']))
+
+    def load_log_totals(self, context, load_log_ids):
+        """
+        :return: (file population, classified row population) for LoadLog rows, total_pop is only kept for prices
+        """
+        if len(load_log_ids) < 1:
+            return 0, 0
+
+        rows = context.session.query(func.sum(LoadLog.fresh_pop + LoadLog.update_pop + LoadLog.duplicate_pop + LoadLog.fail_pop)).\
+            filter(LoadLog.id.in_(load_log_ids)).scalar()
+        return len(load_log_ids), int(rows or 0)
+
+    def pending_ids(self, context, file_name):
+        selected_set = context.session.query(LoadLog.id).filter_by(complete_flag=False, file_name=file_name).all()
+        return [row[0] for row in selected_set]
+
+    def pending_prices(self, context, intraday_flag):
+        """
+        :return: incomplete price file LoadLog ids, session or intraday
+        """
+        results = []
+
+        selected_set = context.session.query(LoadLog.id, LoadLog.normalized_name).filter_by(complete_flag=False).\
+            order_by(LoadLog.normalized_name)
+        for row_id, normalized_name in selected_set:
+            if not normalized_name.endswith('.csv'):
+                continue
+
+            eod_file = EodFile("%s/%s" % (context.import_directory, normalized_name))
+            if eod_file.is_intraday() == intraday_flag:
+                results.append(row_id)
+
+        return results
+
+    def stage_discovery(self, context):
+        discovery = Discovery()
+        discovery.execute(context)
+        return discovery.total_file_counter, 0
+
+    def stage_exchange(self, context):
+        load_log_ids = self.pending_ids(context, 'ExchangeList.xml')
+        Parser().service_exchange(context)
+        return self.load_log_totals(context, load_log_ids)
+
+    def stage_name(self, context):
+        load_log_ids = self.pending_ids(context, 'SymbolList.xml')
+        Parser().service_name(context)
+        return self.load_log_totals(context, load_log_ids)
+
+    def stage_prices(self, context, intraday_flag):
+        load_log_ids = self.pending_prices(context, intraday_flag)
+
+        parser = Parser()
+        for load_log_id in load_log_ids:
+            parser.service_load_log(context, load_log_id)
+
+        return self.load_log_totals(context, load_log_ids)
+
+    def stage_session(self, context):
+        return self.stage_prices(context, False)
+
+    def stage_intraday(self, context):
+        return self.stage_prices(context, True)
+
+    def git_commit(self):
+        try:
+            return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return 'unknown'
+
+    def execute(self, yaml_file_name, backend, import_directory, results_file):
+        context = Context()
+        context.loader(yaml_file_name)
+
+        context.import_directory = os.path.abspath(import_directory)
+        context.manifest_file = ''
+        context.sns_alarm = None
+
+        if backend == 'sqlite':
+            database_file = tempfile.NamedTemporaryFile(suffix='.sqlite', delete=False).name
+            context.sqlite_file = database_file
+            context.load_infile = False
+            context.parse_workers = 1
+        elif 'benchmark' not in context.mysql_database:
+            print("refusing to reset %s, benchmark database name must contain 'benchmark'" % context.mysql_database)
+            return None
+
+        context.set_backend(backend)
+
+        sql_table = SqlTable(context)
+
+        # start from empty tables so every file is fresh
+        Base.metadata.drop_all(sql_table.engine)
+        Base.metadata.create_all(sql_table.engine)
+
+        event.listen(sql_table.engine, 'before_cursor_execute', self.count_query)
+
+        alert_session = sql_table.session_factory()
+
+        task_log = TaskLog(self.facility)
+        alert_session.add(task_log)
+        alert_session.commit()
+
+        context.set_task_id(task_log.id)
+
+        # flush log entries at close, SQLite permits a single writer
+        alert_log = AlertLog(None, alert_session, task_log.id, 1000000, 3600.0)
+        context.set_alert_log(alert_log)
+
+        session = sql_table.session_factory()
+        context.set_session(session)
+
+        print("%s %s, %s" % (backend, sql_table.engine.url, context.import_directory))
+
+        try:
+            self.measure('discovery', self.stage_discovery, context)
+            self.measure('exchange', self.stage_exchange, context)
+            self.measure('names', self.stage_name, context)
+            self.measure('session', self.stage_session, context)
+            self.measure('intraday', self.stage_intraday, context)
+        finally:
+            session.close()
+            alert_log.close()
+            alert_session.close()
+
+        if backend == 'sqlite':
+            os.remove(database_file)
+
+        if results_file is not None:
+            record = {'commit': self.git_commit(), 'backend': backend, 'import_directory': context.import_directory,
+                      'time_stamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'stages': self.results}
+
+            with open(results_file, 'a') as out_file:
+                out_file.write(json.dumps(record))
+                out_file.write('\n')
+
+#
+# argv[1] = configuration filename, mysql and postgresql backends must name a scratch database
+# argv[2] = sqlite, mysql or postgresql
+# argv[3] = EODData import directory (i.e. from synthetic_eoddata.py)
+# argv[4] = optional results file, one JSON line appended per run
+#
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[2] not in ('sqlite', 'mysql', 'postgresql'):
+        print("usage: load_benchmark.py config_file sqlite|mysql|postgresql [import_directory] [results_file]")
+        sys.exit(1)
+
+    if len(sys.argv) > 3:
+        import_directory = sys.argv[3]
+    else:
+        import_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'EODData', 'DataClient', 'ASCII')
+
+    results_file = None
+    if len(sys.argv) > 4:
+        results_file = os.path.abspath(sys.argv[4])
+
+    benchmark = LoadBenchmark()
+    benchmark.execute(sys.argv[1], sys.argv[2], import_directory, results_file)
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
@@ -5,14 +5,21 @@
 # Development Environment:OS X 10.10.5/Python 2.7.7
 # Author:G.S. Cole (guycole at gmail dot com)
 #
+import argparse
+import copy
+import os
+import queue
 import syslog
-import sys
+import threading
 import time
 
 from mythic_recorder.alert_log import AlertLog
 from mythic_recorder.context import Context
 from mythic_recorder.discovery import Discovery
+from mythic_recorder.exchange_registry import ExchangeRegistry
 from mythic_recorder.parser import Parser
+from mythic_recorder.profile_hook import ProfileHook
+from mythic_recorder.profile_hook import STAGES
 from mythic_recorder.sql_table import SqlTable
 from mythic_recorder.sql_table import TaskLog
 
@@ -25,12 +32,63 @@ class Loader:
         """
         self.facility = 'loader'
 
-    def execute(self, yaml_file_name):
+    def discovery_thread(self, context, load_log_queue):
+        """
+        stream producer, the None sentinel is queued no matter what
+        :param context: discovery context w/dedicated session
+        :param load_log_queue: bounded queue.Queue of LoadLog ids
+        :return: None
+        """
+        try:
+            discovery = Discovery()
+            context.profile_hook.run('discovery', discovery.execute, context, load_log_queue)
+        except:
+            context.alert_log.log_writer(self.facility, 4, "discovery failure noted")
+        finally:
+            context.session.commit()
+            context.session.close()
+            load_log_queue.put(None)
+
+    def execute_stream(self, context, sql_table):
+        """
+        discovery and parse overlap, discovery in a thread feeding a bounded queue
+        :param context: runtime context
+        :param sql_table: engine and session factory
+        :return: None
+        """
+        load_log_queue = queue.Queue(maxsize=context.stream_queue_size)
+
+        # sessions and exchange rows are not shared between threads
+        discovery_context = copy.copy(context)
+        discovery_context.set_session(sql_table.session_factory())
+        discovery_context.exchange_registry = ExchangeRegistry()
+
+        producer = threading.Thread(target=self.discovery_thread, args=(discovery_context, load_log_queue), name='discovery')
+        producer.start()
+
+        parse_session = sql_table.bulk_session_factory()
+        context.set_session(parse_session)
+
+        try:
+            parser = Parser()
+            parser.execute_stream(context, load_log_queue)
+        except:
+            context.alert_log.log_writer(self.facility, 4, "parse failure noted")
+        finally:
+            parse_session.commit()
+            parse_session.close()
+
+        producer.join()
+
+    def execute(self, yaml_file_name, profile_hook=None):
         start_time = time.time()
 
         context = Context()
         context.loader(yaml_file_name)
 
+        if profile_hook is not None:
+            context.profile_hook = profile_hook
+
         sql_table = SqlTable(context)
         alert_session = sql_table.session_factory()
 
@@ -40,23 +98,56 @@ class Loader:
 
         context.set_task_id(task_log.id)
 
-        alert_log = AlertLog(context.sns_alarm, alert_session, task_log.id)
+        alert_log = AlertLog(context.sns_alarm, alert_session, task_log.id, context.log_flush_size, context.log_flush_interval)
         alert_log.log_writer(self.facility, 6, 'start')
         context.set_alert_log(alert_log)
 
+        # worker processes are not profiled
+        if context.profile_hook.enabled() and context.profile_hook.stage in ('', 'prices') and context.parse_workers > 1:
+            alert_log.log_writer(self.facility, 6, "profiling, parseWorkers %d reduced to 1" % context.parse_workers)
+            context.parse_workers = 1
+
+        try:
+            if context.stream_load:
+                self.execute_stream(context, sql_table)
+            else:
+                self.execute_batch(context, sql_table)
+
+            for artifact in context.profile_hook.dump(task_log.id):
+                alert_log.log_writer(self.facility, 6, "profile:%s" % artifact)
+
+            alert_log.log_writer(self.facility, 6, "pool %s" % context.pool_metrics)
+
+            alert_log.log_writer(self.facility, 6, 'stop')
+        finally:
+            # guaranteed flush of buffered log entries and alerts
+            alert_log.close()
+            alert_session.close()
+            sql_table.dispose()
+
+        stop_time = time.time()
+        return stop_time - start_time
+
+    def execute_batch(self, context, sql_table):
+        """
+        discovery over the whole tree, then parse
+        :param context: runtime context
+        :param sql_table: engine and session factory
+        :return: None
+        """
         discovery_session = sql_table.session_factory()
         context.set_session(discovery_session)
 
         try:
             discovery = Discovery()
-            discovery.execute(context)
+            context.profile_hook.run('discovery', discovery.execute, context)
         except:
             context.alert_log.log_writer(self.facility, 4, "discovery failure noted")
         finally:
             discovery_session.commit()
             discovery_session.close()
 
-        parse_session = sql_table.session_factory()
+        parse_session = sql_table.bulk_session_factory()
         context.set_session(parse_session)
 
         try:
@@ -68,26 +159,30 @@ class Loader:
             parse_session.commit()
             parse_session.close()
 
-        alert_log.log_writer(self.facility, 6, 'stop')
-
-        stop_time = time.time()
-        return stop_time - start_time
-
 print('start loader');
 
 #
 # argv[1] = configuration filename
+# --profile writes cProfile artifacts task_<TaskLog.id>_<stage>.prof/.txt
 #
 if __name__ == '__main__':
     syslog.openlog(logoption=syslog.LOG_PID, facility=syslog.LOG_LOCAL4)
 
-    if len(sys.argv) > 1:
-        yaml_file_name = sys.argv[1]
-    else:
-        yaml_file_name = 'config.dev'
+    arg_parser = argparse.ArgumentParser(description='load eoddata.com files')
+    arg_parser.add_argument('yaml_file_name', nargs='?', default='config.dev', help='configuration file')
+    arg_parser.add_argument('--profile', action='store_true', help='run under cProfile')
+    arg_parser.add_argument('--profile-dir', default='.', help='profile artifact directory')
+    arg_parser.add_argument('--profile-stage', default='', choices=STAGES, help='profile only this stage')
+    arg_parser.add_argument('--profile-exchange', default='', help='profile only price files from this exchange')
+    args = arg_parser.parse_args()
+
+    profile_hook = None
+    if args.profile:
+        # absolute, discovery changes the working directory
+        profile_hook = ProfileHook(os.path.abspath(args.profile_dir), args.profile_stage, args.profile_exchange)
 
     loader = Loader()
-    duration = loader.execute(yaml_file_name)
+    duration = loader.execute(args.yaml_file_name, profile_hook)
 
     syslog.closelog()
 
@@ -5,26 +5,49 @@
 # Author: G.S. Cole (guycole at gmail dot com)
 #
 import boto3
+import datetime
+import queue
 import syslog
+import threading
+import time
 
 from mythic_recorder.sql_table import ApplicationLog
 
+# ApplicationLog.event width
+EVENT_SIZE = 128
+
+# SNS message population limit, remaining alerts are only counted
+ALERT_LINES = 50
+
 class AlertLog:
     """
     Logging and Alerting facade.  Logging goes to SysLog and RDBMS.  Urgent messages go to SNS for email delivery.
+    RDBMS writes are buffered and flushed by a background thread w/multi-row inserts, on size or time.
+    Urgent messages are coalesced into one SNS publish per flush.  close() must be called at shutdown.
     """
 
-    def __init__(self, sns_arn, session, task_id):
+    def __init__(self, sns_arn, session, task_id, flush_size=100, flush_interval=5.0):
         """
         ctor
         :param sns_arn: SNS ARN for email delivery.  NONE means no SNS.
-        :param session: database session
+        :param session: database session, owned by the writer thread from here on
         :param task_id: from TaskLog
+        :param flush_size: flush after this many log entries
+        :param flush_interval: flush after this many seconds
         """
         self.sns_arn = sns_arn
         self.session = session
         self.task_id = task_id
 
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self.sns_client = None
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.run, name='alert_log', daemon=True)
+        self.writer.start()
+
     def mail_alert(self, facility, level, message):
         """
         write to SNS for mail delivery
@@ -36,11 +59,77 @@ class AlertLog:
         if self.sns_arn is None:
             return
 
-        client = boto3.client('sns')
-        response = client.publish(TopicArn = self.sns_arn, Message = "%s:%d:%s" % (facility, level, message))
+        if self.sns_client is None:
+            self.sns_client = boto3.client('sns')
+
+        response = self.sns_client.publish(TopicArn = self.sns_arn, Message = "%s:%d:%s" % (facility, level, message))
 
         # print("Response: {}".format(response))
 
+    def flush(self, records):
+        """
+        write buffered entries w/one multi-row insert, then publish coalesced alerts
+        :param records: list of (time_stamp, facility, level, message)
+        :return: None
+        """
+        if len(records) < 1:
+            return None
+
+        rows = []
+        alerts = []
+        for time_stamp, facility, level, message in records:
+            rows.append({"time_stamp": time_stamp, "task_id": self.task_id, "facility": facility, "level": level, "event": message[:EVENT_SIZE]})
+            if level < 5:
+                alerts.append("%s:%d:%s" % (facility, level, message))
+
+        try:
+            self.session.execute(ApplicationLog.__table__.insert(), rows)
+            self.session.commit()
+        except Exception as error:
+            self.session.rollback()
+            syslog.syslog(syslog.LOG_ERR, "application_log flush failure:%s" % error)
+
+        if len(alerts) < 1:
+            return None
+
+        if len(alerts) == 1:
+            message = alerts[0]
+        else:
+            message = "%d alerts\n%s" % (len(alerts), "\n".join(alerts[:ALERT_LINES]))
+
+        try:
+            self.mail_alert('alert_log', 4, message)
+        except Exception as error:
+            syslog.syslog(syslog.LOG_ERR, "sns failure:%s" % error)
+
+        return None
+
+    def run(self):
+        """
+        writer thread, drains queue until a None sentinel arrives
+        :return: None
+        """
+        records = []
+        deadline = time.time() + self.flush_interval
+
+        while True:
+            try:
+                record = self.queue.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                record = False
+
+            if record is None:
+                self.flush(records)
+                return None
+
+            if record:
+                records.append(record)
+
+            if len(records) >= self.flush_size or time.time() >= deadline:
+                self.flush(records)
+                records = []
+                deadline = time.time() + self.flush_interval
+
     def log_writer(self, facility, level, message):
         """
         write a log entry to ApplicationLog, severe entries are echoed via email
@@ -51,11 +140,7 @@ class AlertLog:
         """
         syslog.syslog(syslog.LOG_INFO, message)
 
-        self.session.add(ApplicationLog(self.task_id, facility, level, message))
-        self.session.commit()
-
-        if level < 5:
-            self.mail_alert(facility, level, message)
+        self.queue.put((datetime.datetime.utcnow(), facility, level, message))
 
     def log_fatal(self, facility, message):
         """
@@ -69,6 +154,15 @@ class AlertLog:
         self.log_writer(facility, 4, message)
         self.log_writer(facility, 6, 'stop')
 
+    def close(self):
+        """
+        flush all buffered entries and stop the writer thread
+        :return: None
+        """
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+
 #;;; Local Variables: ***
 #;;; mode:python ***
 #;;; End: ***
@@ -0,0 +1,451 @@
+#
+# Title: bar_store.py
+# Description: local memory mapped price bars, one fixed width record file per symbol per year
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import calendar
+import datetime
+import json
+import os
+import urllib.parse
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mythic_recorder.price_sink import PriceSink
+
+# epoch seconds (UTC, intraday bars are exchange wall clock) and prices as pennies * 10
+BAR_FIELDS = [('time', '<i8'), ('open', '<i8'), ('high', '<i8'), ('low', '<i8'), ('close', '<i8'), ('volume', '<i8'), ('open_interest', '<i8')]
+
+INDEX_FILE = 'index.json'
+
+# BarSink rows held before writing, about 100 bytes each
+FLUSH_ROWS = 250000
+
+def epoch_seconds(date):
+    """
+    :param date: datetime.date or datetime.datetime
+    :return: seconds since epoch
+    """
+    if isinstance(date, datetime.datetime):
+        return calendar.timegm(date.timetuple())
+
+    return (date - datetime.date(1970, 1, 1)).days * 86400
+
+class BarStore:
+    """
+    Price bars outside the database for research reads:
+    <directory>/<exchange>/<session|intraday>/<year>/<symbol>.bar
+    Each file is an array of BAR_FIELDS records ordered by time, read w/numpy.memmap (no copy, no parse).
+    Each year directory has index.json, symbol => [committed record count, file generation].  Files are
+    appended, records beyond the count are the remains of an interrupted append, ignored by readers and
+    truncated by the next append.  A bar at or before the last recorded time writes the merge to the next
+    generation (<symbol>.<generation>.bar), the previous generation is removed once index.json names
+    the new one.  One writer per exchange (as parse workers are partitioned).  Requires numpy.
+    """
+
+    def __init__(self, directory):
+        """
+        ctor
+        :param directory: store root directory
+        """
+        self.directory = directory
+
+        # year directory => {symbol => [record count, generation]}
+        self.indexes = {}
+        self.dirty = set()
+
+        # generations replaced since the last save_indexes
+        self.obsolete = []
+
+    @staticmethod
+    def available():
+        return numpy is not None
+
+    @staticmethod
+    def dtype():
+        return numpy.dtype(BAR_FIELDS)
+
+    def year_directory(self, exchange, intraday_flag, year):
+        if intraday_flag:
+            kind = 'intraday'
+        else:
+            kind = 'session'
+
+        return os.path.join(self.directory, exchange.upper(), kind, str(year))
+
+    def bar_file_name(self, directory, symbol, generation=0):
+        # symbols may contain '/' or '.', i.e. BRK/B, '.' is quoted so the generation is unambiguous
+        name = urllib.parse.quote(symbol, safe='').replace('.', '%2E')
+        if generation > 0:
+            return os.path.join(directory, "%s.%d.bar" % (name, generation))
+
+        return os.path.join(directory, "%s.bar" % name)
+
+    def entry(self, directory, symbol):
+        """
+        :param directory: year directory
+        :param symbol: ticker symbol
+        :return: committed record count and file generation
+        """
+        return self.load_index(directory).get(symbol, (0, 0))
+
+    def load_index(self, directory):
+        """
+        :param directory: year directory
+        :return: symbol => record count, cached
+        """
+        index = self.indexes.get(directory)
+        if index is not None:
+            return index
+
+        index = {}
+
+        file_name = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(file_name):
+            with open(file_name, 'r') as in_file:
+                index = json.load(in_file)
+
+        self.indexes[directory] = index
+
+        return index
+
+    def save_indexes(self):
+        """
+        write index.json for every year directory changed since the last save, then remove replaced generations
+        :return: None
+        """
+        for directory in self.dirty:
+            file_name = os.path.join(directory, INDEX_FILE)
+            temp_name = "%s.tmp" % file_name
+
+            with open(temp_name, 'w') as out_file:
+                json.dump(self.indexes[directory], out_file, sort_keys=True)
+
+            os.replace(temp_name, file_name)
+
+        self.dirty = set()
+
+        for file_name in self.obsolete:
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+        self.obsolete = []
+
+        return None
+
+    def invalidate(self):
+        """
+        forget cached indexes, i.e. before reading bars written by another process
+        :return: None
+        """
+        self.indexes = {}
+        self.dirty = set()
+        self.obsolete = []
+
+        return None
+
+    def write(self, exchange, intraday_flag, year, symbol, records):
+        """
+        merge records into a symbol year, the index is updated in memory (see save_indexes)
+        :param exchange: exchange code
+        :param intraday_flag: true if intraday bars
+        :param year: calendar year of every record
+        :param symbol: ticker symbol
+        :param records: BAR_FIELDS array, unique times
+        :return: fresh, update and duplicate record counts
+        """
+        directory = self.year_directory(exchange, intraday_flag, year)
+        os.makedirs(directory, exist_ok=True)
+
+        index = self.load_index(directory)
+        count, generation = index.get(symbol, (0, 0))
+
+        file_name = self.bar_file_name(directory, symbol, generation)
+
+        records = numpy.sort(records, order='time', kind='stable')
+
+        existing = None
+        if count > 0:
+            existing = numpy.fromfile(file_name, dtype=records.dtype, count=count)
+
+        if existing is None or records['time'][0] > existing['time'][-1]:
+            # only an append may truncate, the committed count always describes this generation
+            if os.path.exists(file_name) and os.path.getsize(file_name) != count * records.itemsize:
+                os.truncate(file_name, count * records.itemsize)
+
+            with open(file_name, 'ab') as out_file:
+                out_file.write(records.tobytes())
+
+            index[symbol] = [count + len(records), generation]
+            self.dirty.add(directory)
+
+            return len(records), 0, 0
+
+        position = numpy.searchsorted(existing['time'], records['time'])
+        found = position < count
+        found[found] = existing['time'][position[found]] == records['time'][found]
+
+        equal = existing[position[found]] == records[found]
+        existing[position[found]] = records[found]
+
+        merged = numpy.concatenate((existing, records[~found]))
+        merged = numpy.sort(merged, order='time', kind='stable')
+
+        # readers and a crashed writer keep the committed generation until index.json names this one
+        merged.tofile(self.bar_file_name(directory, symbol, generation + 1))
+
+        index[symbol] = [len(merged), generation + 1]
+        self.dirty.add(directory)
+        self.obsolete.append(file_name)
+
+        duplicate = int(numpy.count_nonzero(equal))
+
+        return len(records) - len(equal), len(equal) - duplicate, duplicate
+
+    def years(self, exchange, symbol, intraday_flag=False):
+        """
+        :param exchange: exchange code
+        :param symbol: ticker symbol
+        :param intraday_flag: true for intraday bars
+        :return: sorted years holding bars for symbol
+        """
+        parent = os.path.dirname(self.year_directory(exchange, intraday_flag, 0))
+        if not os.path.isdir(parent):
+            return []
+
+        results = []
+        for name in os.listdir(parent):
+            if name.isdigit() and symbol in self.load_index(os.path.join(parent, name)):
+                results.append(int(name))
+
+        return sorted(results)
+
+    def read_year(self, exchange, symbol, year, intraday_flag=False):
+        """
+        :param exchange: exchange code
+        :param symbol: ticker symbol
+        :param year: calendar year
+        :param intraday_flag: true for intraday bars
+        :return: read only memmap of BAR_FIELDS records ordered by time, empty array if none
+        """
+        directory = self.year_directory(exchange, intraday_flag, year)
+
+        count, generation = self.entry(directory, symbol)
+        if count < 1:
+            return numpy.empty(0, dtype=BAR_FIELDS)
+
+        return numpy.memmap(self.bar_file_name(directory, symbol, generation), dtype=BAR_FIELDS, mode='r', shape=(count,))
+
+    def read(self, exchange, symbol, start=None, end=None, intraday_flag=False):
+        """
+        :param exchange: exchange code
+        :param symbol: ticker symbol
+        :param start: first date or datetime, None for no bound
+        :param end: last date or datetime (inclusive, a date includes the whole day), None for no bound
+        :param intraday_flag: true for intraday bars
+        :return: BAR_FIELDS records ordered by time, a memmap slice when within one year
+        """
+        if numpy is None:
+            raise ValueError('bar store requires numpy')
+
+        years = self.years(exchange, symbol, intraday_flag)
+        if start is not None:
+            years = [year for year in years if year >= start.year]
+        if end is not None:
+            years = [year for year in years if year <= end.year]
+
+        if len(years) < 1:
+            return numpy.empty(0, dtype=BAR_FIELDS)
+
+        if len(years) == 1:
+            results = self.read_year(exchange, symbol, years[0], intraday_flag)
+        else:
+            results = numpy.concatenate([self.read_year(exchange, symbol, year, intraday_flag) for year in years])
+
+        if start is not None:
+            results = results[numpy.searchsorted(results['time'], epoch_seconds(start), side='left'):]
+
+        if end is not None:
+            limit = epoch_seconds(end)
+            if not isinstance(end, datetime.datetime):
+                limit = limit + 86399
+            results = results[:numpy.searchsorted(results['time'], limit, side='right')]
+
+        return results
+
+class BarSink(PriceSink):
+    """
+    Feed one price file to a BarStore.  Rows are held per file (up to FLUSH_ROWS) so each symbol year
+    is written once, name.id is mapped back to symbol through the name cache.
+    """
+
+    def __init__(self, bar_store, name_cache, session, exchange, intraday_flag):
+        """
+        ctor
+        :param bar_store: destination
+        :param name_cache: symbol to name.id resolution
+        :param session: database session
+        :param exchange: associated exchange
+        :param intraday_flag: true if intraday file
+        """
+        super().__init__()
+
+        self.bar_store = bar_store
+        self.name_cache = name_cache
+        self.session = session
+        self.exchange = exchange
+        self.intraday_flag = intraday_flag
+
+        # (name_id, epoch seconds) => values
+        self.rows = {}
+
+        # (name_ids, records) from append_columns
+        self.columns = []
+
+        # (name_id, epoch seconds) => first values of rows repeated w/different values
+        self.firsts = {}
+
+        # name_id => symbol
+        self.symbols = {}
+
+    def append(self, name_id, date, open_price, high_price, low_price, close_price, volume, open_interest):
+        if not self.intraday_flag and isinstance(date, datetime.datetime):
+            date = date.date()
+
+        key = (name_id, epoch_seconds(date))
+        values = (open_price, high_price, low_price, close_price, volume, open_interest)
+
+        current = self.rows.get(key)
+        if current is not None:
+            # repeated row within file, classify against previous occurrence
+            if current == values:
+                self.duplicate_row_counter = 1 + self.duplicate_row_counter
+            else:
+                self.update_row_counter = 1 + self.update_row_counter
+                self.firsts.setdefault(key, current)
+
+        self.rows[key] = values
+
+        if len(self.rows) >= FLUSH_ROWS:
+            self.flush()
+
+        return None
+
+    def append_columns(self, name_ids, dates, open_price, high_price, low_price, close_price, volume, open_interest):
+        self.flush()
+
+        records = numpy.empty(len(name_ids), dtype=BAR_FIELDS)
+        records['time'] = dates.astype('datetime64[s]').astype(numpy.int64)
+        records['open'] = open_price
+        records['high'] = high_price
+        records['low'] = low_price
+        records['close'] = close_price
+        records['volume'] = volume
+        records['open_interest'] = open_interest
+
+        self.columns.append((numpy.asarray(name_ids, dtype=numpy.int64), records))
+
+        self.flush()
+
+        return None
+
+    def select_symbol(self, name_id):
+        symbol = self.symbols.get(name_id)
+        if symbol is None:
+            # stubs are added to the name cache as they are inserted
+            symbols = self.name_cache.get_symbols(self.session, self.exchange.id)
+            self.symbols = {value: key for key, value in symbols.items()}
+            symbol = self.symbols[name_id]
+
+        return symbol
+
+    def collect(self):
+        """
+        :return: name_id array and BAR_FIELDS array of every pending row
+        """
+        results = self.columns
+
+        if len(self.rows) > 0:
+            records = numpy.empty(len(self.rows), dtype=BAR_FIELDS)
+            keys = list(self.rows.keys())
+            records['time'] = [key[1] for key in keys]
+
+            columns = list(zip(*self.rows.values()))
+            for ndx, field in enumerate(('open', 'high', 'low', 'close', 'volume', 'open_interest')):
+                records[field] = columns[ndx]
+
+            results.append((numpy.array([key[0] for key in keys], dtype=numpy.int64), records))
+
+        self.rows = {}
+        self.columns = []
+
+        return numpy.concatenate([name_ids for name_ids, records in results]), numpy.concatenate([records for name_ids, records in results])
+
+    def reclassify(self):
+        """
+        BarStore.write() compares the last occurrence of each row, the row path the first.
+        rows repeated w/different values are rare, those already stored are read and recounted.
+        :return: None
+        """
+        for (name_id, seconds), first in self.firsts.items():
+            year = datetime.datetime.utcfromtimestamp(seconds).year
+            stored = self.bar_store.read_year(self.exchange.symbol, self.select_symbol(name_id), year, self.intraday_flag)
+
+            position = int(numpy.searchsorted(stored['time'], seconds))
+            if position >= len(stored) or stored['time'][position] != seconds:
+                continue
+
+            selected = tuple(int(value) for value in stored[position].tolist()[1:])
+            if selected == self.rows[(name_id, seconds)]:
+                self.duplicate_row_counter = self.duplicate_row_counter - 1
+            else:
+                self.update_row_counter = self.update_row_counter - 1
+
+            if selected == first:
+                self.duplicate_row_counter = 1 + self.duplicate_row_counter
+            else:
+                self.update_row_counter = 1 + self.update_row_counter
+
+        self.firsts = {}
+
+        return None
+
+    def flush(self):
+        if len(self.rows) + len(self.columns) < 1:
+            return None
+
+        self.reclassify()
+
+        name_ids, records = self.collect()
+
+        years = records['time'].astype('datetime64[s]').astype('datetime64[Y]').astype(numpy.int64) + 1970
+
+        order = numpy.lexsort((records['time'], years, name_ids))
+        name_ids = name_ids[order]
+        records = records[order]
+        years = years[order]
+
+        # one write per (name_id, year) run
+        breaks = numpy.flatnonzero((name_ids[1:] != name_ids[:-1]) | (years[1:] != years[:-1])) + 1
+        starts = [0] + breaks.tolist()
+        stops = breaks.tolist() + [len(records)]
+
+        for start, stop in zip(starts, stops):
+            fresh, update, duplicate = self.bar_store.write(self.exchange.symbol, self.intraday_flag, int(years[start]),
+                                                            self.select_symbol(int(name_ids[start])), records[start:stop])
+
+            self.fresh_row_counter = fresh + self.fresh_row_counter
+            self.update_row_counter = update + self.update_row_counter
+            self.duplicate_row_counter = duplicate + self.duplicate_row_counter
+
+        self.bar_store.save_indexes()
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
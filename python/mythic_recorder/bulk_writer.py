@@ -0,0 +1,218 @@
+#
+# Title: bulk_writer.py
+# Description: set based price loader
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import datetime
+
+from sqlalchemy import Date
+from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+from mythic_recorder.price_sink import PriceSink
+
+PRICE_COLUMNS = ('open_price', 'high_price', 'low_price', 'close_price', 'volume', 'open_interest')
+
+class BulkWriter(PriceSink):
+    """
+    Batch price rows and apply each batch w/one select and one multi-row upsert.
+    Existing rows are selected per batch so fresh/update/duplicate counts remain accurate.
+    Fresh and changed rows are applied w/executemany insert and update (portable, i.e. SQLite),
+    subclasses upsert w/one statement.  See SqlBackend.bulk_writer.
+    """
+
+    def __init__(self, session, table, task_id, batch_size):
+        """
+        ctor
+        :param session: database session
+        :param table: price_session or price_intraday table
+        :param task_id: parent task id
+        :param batch_size: rows per batch
+        """
+        super().__init__()
+
+        self.session = session
+        self.table = table
+        self.task_id = task_id
+        self.batch_size = batch_size
+
+        # price_session.date is a DATE, parsed values are datetime
+        self.date_only = isinstance(table.c.date.type, Date)
+
+        # (name_id, date) => [first values, last values]
+        self.batch = {}
+
+    def append(self, name_id, date, open_price, high_price, low_price, close_price, volume, open_interest):
+        """
+        add a price row to the current batch, flush when batch is full
+        :return: None
+        """
+        if self.date_only and isinstance(date, datetime.datetime):
+            date = date.date()
+
+        key = (name_id, date)
+        values = (open_price, high_price, low_price, close_price, volume, open_interest)
+
+        current = self.batch.get(key)
+        if current is None:
+            self.batch[key] = [values, values]
+        else:
+            # repeated row within file, classify against previous occurrence
+            if current[1] == values:
+                self.duplicate_row_counter = 1 + self.duplicate_row_counter
+            else:
+                self.update_row_counter = 1 + self.update_row_counter
+                current[1] = values
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+        return None
+
+    def append_columns(self, name_ids, dates, open_price, high_price, low_price, close_price, volume, open_interest):
+        """
+        add columns which are already de-duplicated (see IntradayColumns), one flush per batch_size slice.
+        python values are only materialized for the slice being written, as the DBAPI requires.
+        :return: None
+        """
+        self.flush()
+
+        population = len(name_ids)
+        for start in range(0, population, self.batch_size):
+            stop = start + self.batch_size
+
+            rows = zip(name_ids[start:stop].tolist(), dates[start:stop].tolist(),
+                       open_price[start:stop].tolist(), high_price[start:stop].tolist(), low_price[start:stop].tolist(),
+                       close_price[start:stop].tolist(), volume[start:stop].tolist(), open_interest[start:stop].tolist())
+
+            for row in rows:
+                values = row[2:]
+                self.batch[(row[0], row[1])] = [values, values]
+
+            self.flush()
+
+        return None
+
+    def select_existing(self):
+        """
+        select existing rows which might collide w/the current batch
+        :return: dictionary of (name_id, date) => price values
+        """
+        name_ids = set()
+        dates = []
+        for name_id, date in self.batch.keys():
+            name_ids.add(name_id)
+            dates.append(date)
+
+        columns = [self.table.c.name_id, self.table.c.date] + [self.table.c[column] for column in PRICE_COLUMNS]
+        query = select(columns).where(and_(self.table.c.name_id.in_(name_ids), self.table.c.date.between(min(dates), max(dates))))
+
+        results = {}
+        for row in self.session.execute(query):
+            results[(row[0], row[1])] = tuple(row[2:])
+
+        return results
+
+    def make_row(self, key, values):
+        row = {'task_id': self.task_id, 'name_id': key[0], 'date': key[1]}
+        for ndx, column in enumerate(PRICE_COLUMNS):
+            row[column] = values[ndx]
+
+        return row
+
+    def apply(self, fresh, changed):
+        """
+        executemany insert for fresh rows and executemany update for changed rows
+        :param fresh: fresh rows
+        :param changed: changed rows
+        :return: None
+        """
+        if len(fresh) > 0:
+            self.session.execute(self.table.insert(), fresh)
+
+        if len(changed) > 0:
+            statement = self.table.update().\
+                where(and_(self.table.c.name_id == bindparam('b_name_id'), self.table.c.date == bindparam('b_date'))).\
+                values({column: bindparam(column) for column in PRICE_COLUMNS})
+
+            parameters = []
+            for row in changed:
+                parameter = {column: row[column] for column in PRICE_COLUMNS}
+                parameter['b_name_id'] = row['name_id']
+                parameter['b_date'] = row['date']
+                parameters.append(parameter)
+
+            self.session.execute(statement, parameters)
+
+        return None
+
+    def flush(self):
+        """
+        classify and apply the current batch
+        :return: None
+        """
+        if len(self.batch) < 1:
+            return None
+
+        existing = self.select_existing()
+
+        fresh = []
+        changed = []
+        for key, (first, last) in self.batch.items():
+            selected = existing.get(key)
+            if selected is None:
+                self.fresh_row_counter = 1 + self.fresh_row_counter
+                fresh.append(self.make_row(key, last))
+            else:
+                if selected == first:
+                    self.duplicate_row_counter = 1 + self.duplicate_row_counter
+                else:
+                    self.update_row_counter = 1 + self.update_row_counter
+
+                if selected != last:
+                    changed.append(self.make_row(key, last))
+
+        self.apply(fresh, changed)
+
+        self.batch = {}
+
+        return None
+
+class MySqlBulkWriter(BulkWriter):
+    """
+    MySQL multi-row INSERT ... ON DUPLICATE KEY UPDATE against ndx1 (name_id, date)
+    """
+
+    def apply(self, fresh, changed):
+        if len(fresh) + len(changed) < 1:
+            return None
+
+        statement = mysql_insert(self.table).values(fresh + changed)
+        statement = statement.on_duplicate_key_update({column: statement.inserted[column] for column in PRICE_COLUMNS})
+        self.session.execute(statement)
+
+        return None
+
+class PostgreSqlBulkWriter(BulkWriter):
+    """
+    PostgreSQL multi-row INSERT ... ON CONFLICT (name_id, date) DO UPDATE
+    """
+
+    def apply(self, fresh, changed):
+        if len(fresh) + len(changed) < 1:
+            return None
+
+        statement = postgresql_insert(self.table).values(fresh + changed)
+        statement = statement.on_conflict_do_update(index_elements=['name_id', 'date'],
+                                                    set_={column: statement.excluded[column] for column in PRICE_COLUMNS})
+        self.session.execute(statement)
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
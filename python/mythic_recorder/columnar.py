@@ -0,0 +1,179 @@
+#
+# Title: columnar.py
+# Description: read an intraday price file into typed numpy arrays
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import datetime
+import io
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mythic_recorder.price_reader import PriceReader
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+class IntradayColumns:
+    """
+    Whole 5 minute bar file as typed numpy arrays (numpy is optional, see available()).
+    Conversion runs once per distinct string (symbols, bar times, prices) and is broadcast back
+    by index, no per-row python objects are created.
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.price_reader = PriceReader()
+
+        self.symbols = None
+        self.symbol_codes = None
+        self.minutes = None
+        self.open_price = None
+        self.high_price = None
+        self.low_price = None
+        self.close_price = None
+        self.volume = None
+        self.open_interest = None
+
+        self.duplicate_row_counter = 0
+        self.fail_row_counter = 0
+        self.total_row_counter = 0
+
+    @staticmethod
+    def available():
+        """
+        :return: True if numpy is installed
+        """
+        return numpy is not None
+
+    def convert_unique(self, column, converter):
+        """
+        convert each distinct string once, then broadcast by index
+        :param column: numpy byte string column
+        :param converter: string to integer function
+        :return: int64 array
+        """
+        uniques, inverse = numpy.unique(column, return_inverse=True)
+        converted = numpy.array([converter(arg) for arg in uniques.astype(str).tolist()], dtype=numpy.int64)
+        return converted[inverse]
+
+    def minute_converter(self, arg):
+        """
+        :param arg: bar time stamp, i.e. 27-Apr-2018 09:20
+        :return: epoch minutes
+        """
+        return int((self.price_reader.date_converter(arg) - EPOCH).total_seconds()) // 60
+
+    def read(self, in_file):
+        """
+        read and convert an intraday file
+        :param in_file: price file open in binary mode, see EodFile.open_binary
+        :return: None, raises ValueError if file is not rectangular or does not parse
+        """
+        content = io.TextIOWrapper(in_file, encoding='utf-8').read()
+
+        self.total_row_counter = content.count('\n')
+        if len(content) > 0 and not content.endswith('\n'):
+            self.total_row_counter = 1 + self.total_row_counter
+
+        skip_rows = 0
+        if content.startswith('Symbol'):
+            skip_rows = 1
+            self.fail_row_counter = 1 + self.fail_row_counter
+
+        # byte strings, a quarter the size of unicode columns
+        raw = numpy.loadtxt(io.StringIO(content), dtype=bytes, delimiter=',', skiprows=skip_rows, ndmin=2)
+        del content
+
+        if raw.shape[0] < 1:
+            raw = numpy.empty((0, 7), dtype=bytes)
+
+        if raw.shape[1] not in (7, 8):
+            raise ValueError("unexpected column population:%d" % raw.shape[1])
+
+        # blank lines are skipped by loadtxt, the row path counts them as failures
+        self.fail_row_counter = self.fail_row_counter + self.total_row_counter - skip_rows - raw.shape[0]
+
+        symbols, self.symbol_codes = numpy.unique(numpy.char.strip(raw[:, 0]), return_inverse=True)
+        self.symbols = symbols.astype(str)
+        self.minutes = self.convert_unique(raw[:, 1], self.minute_converter)
+
+        # OHLC share most of their distinct values, convert them together
+        prices = self.convert_unique(raw[:, 2:6].ravel(), self.price_reader.price_converter).reshape(-1, 4)
+        self.open_price = prices[:, 0].copy()
+        self.high_price = prices[:, 1].copy()
+        self.low_price = prices[:, 2].copy()
+        self.close_price = prices[:, 3].copy()
+        self.volume = raw[:, 6].astype(numpy.int64)
+
+        if raw.shape[1] > 7:
+            self.open_interest = raw[:, 7].astype(numpy.int64)
+        else:
+            self.open_interest = numpy.zeros(raw.shape[0], dtype=numpy.int64)
+
+        self.deduplicate()
+
+        return None
+
+    def select(self, mask):
+        """
+        retain rows where mask is true
+        :param mask: boolean array
+        :return: None
+        """
+        self.symbol_codes = self.symbol_codes[mask]
+        self.minutes = self.minutes[mask]
+        self.open_price = self.open_price[mask]
+        self.high_price = self.high_price[mask]
+        self.low_price = self.low_price[mask]
+        self.close_price = self.close_price[mask]
+        self.volume = self.volume[mask]
+        self.open_interest = self.open_interest[mask]
+
+    def values(self):
+        return numpy.stack([self.open_price, self.high_price, self.low_price, self.close_price, self.volume, self.open_interest], axis=1)
+
+    def deduplicate(self):
+        """
+        collapse repeated (symbol, bar time) rows which are all equal, each repeat counts as a duplicate.
+        a changed repeat raises ValueError, the row and bulk paths classify each occurrence against the one
+        before it (and the first against the database), which depends on order.
+        :return: None
+        """
+        keys = self.symbol_codes.astype(numpy.int64) * (1 << 32) + self.minutes
+
+        population = keys.size
+        reversed_keys = keys[::-1]
+        uniques, first_reversed, inverse = numpy.unique(reversed_keys, return_index=True, return_inverse=True)
+        if uniques.size == population:
+            return None
+
+        retained = (population - 1) - first_reversed
+        retained_by_row = retained[inverse][::-1]
+
+        dropped = retained_by_row != numpy.arange(population)
+        values = self.values()
+        equal = numpy.all(values == values[retained_by_row], axis=1)
+
+        if numpy.count_nonzero(dropped & ~equal) > 0:
+            raise ValueError("changed repeated rows")
+
+        self.duplicate_row_counter = int(numpy.count_nonzero(dropped)) + self.duplicate_row_counter
+
+        self.select(numpy.sort(retained))
+
+        return None
+
+    def dates(self):
+        """
+        :return: datetime64 minute array, tolist() yields datetime.datetime
+        """
+        return self.minutes.astype('datetime64[m]')
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
@@ -4,7 +4,18 @@
 # Development Environment: OS X 10.13.3/Python 3.6.4
 # Author: G.S. Cole (guycole at gmail dot com)
 #
-from yaml import load
+import os
+
+from yaml import safe_load
+
+from mythic_recorder.bar_store import BarStore
+from mythic_recorder.eod_archive import ArchiveCache
+from mythic_recorder.exchange_registry import ExchangeRegistry
+from mythic_recorder.name_cache import NameCache
+from mythic_recorder.pool_metrics import PoolMetrics
+from mythic_recorder.profile_hook import ProfileHook
+from mythic_recorder.sql_backend import select_backend
+from mythic_recorder.stage_timer import StageTimer
 
 class Context:
 
@@ -14,10 +25,54 @@ class Context:
 
         self.task_id = 0
 
+        self.archive_cache = ArchiveCache()
+        self.exchange_registry = ExchangeRegistry()
+        self.name_cache = NameCache()
+        self.stage_timer = StageTimer()
+        self.pool_metrics = PoolMetrics()
+        self.profile_hook = ProfileHook()
+
         self.import_directory = ''
+        self.manifest_file = ''
+        self.metrics_file = ''
         self.sns_alarm = ''
 
-        self.mysql_url = ''
+        self.log_flush_size = 100
+        self.log_flush_interval = 5.0
+
+        self.hash_algorithm = 'sha1'
+        self.hash_workers = 1
+
+        self.bulk_load = False
+        self.batch_size = 1000
+        self.chunk_size = 0
+        self.columnar_load = False
+        self.load_infile = False
+        self.reconcile_names = False
+
+        self.parse_workers = 1
+        self.stream_load = False
+        self.stream_queue_size = 256
+        self.yaml_file_name = ''
+
+        self.bar_store = None
+        self.bar_store_dir = ''
+        self.price_sink = 'database'
+
+        self.database_url = ''
+        self.db_backend = 'mysql'
+        self.db_port = 0
+        self.sql_backend = None
+        self.sqlite_file = ''
+        self.sqlite_pragmas = {}
+
+        self.bulk_session = False
+        self.executemany_page_size = 1000
+        self.pool_max_overflow = 10
+        self.pool_pre_ping = True
+        self.pool_recycle = 3600
+        self.pool_size = 5
+
         self.mysql_username = ''
         self.mysql_password = ''
         self.mysql_hostname = ''
@@ -32,20 +87,90 @@ class Context:
     def set_task_id(self, arg):
         self.task_id = arg
 
+    def set_backend(self, arg):
+        """
+        :param arg: mysql, postgresql or sqlite, credentials and sqlite_file must already be set
+        """
+        self.db_backend = arg
+        self.sql_backend = select_backend(arg)
+        self.database_url = self.sql_backend.url(self)
+
+    def absolute_path(self, file_name):
+        """
+        discovery changes the working directory, relative paths from config.dev are resolved at load
+        :param file_name: configured path, empty (disabled) and :memory: are returned as is
+        :return: absolute path
+        """
+        if len(file_name) < 1 or file_name == ':memory:':
+            return file_name
+
+        return os.path.abspath(file_name)
+
     def loader(self, file_name):
+        # absolute, discovery changes the working directory
+        self.yaml_file_name = os.path.abspath(file_name)
+
         with open(file_name, 'r') as in_file:
-            configuration = load(in_file)
+            configuration = safe_load(in_file)
             in_file.close()
 
         self.import_directory = configuration['importDir']
+        self.manifest_file = self.absolute_path(configuration.get('manifestFile', ''))
+        self.metrics_file = self.absolute_path(configuration.get('metricsFile', ''))
         self.sns_alarm = configuration['snsArn']
 
-        self.mysql_username = configuration['mySqlUserName']
-        self.mysql_password = configuration['mySqlPassWord']
-        self.mysql_hostname = configuration['mySqlHostName']
-        self.mysql_database = configuration['mySqlDataBase']
+        self.log_flush_size = configuration.get('logFlushSize', 100)
+        self.log_flush_interval = configuration.get('logFlushInterval', 5.0)
+
+        self.hash_algorithm = configuration.get('hashAlgorithm', 'sha1')
+        self.hash_workers = configuration.get('hashWorkers', 1)
+
+        self.bulk_load = configuration.get('bulkLoad', False)
+        self.batch_size = configuration.get('batchSize', 1000)
+        self.chunk_size = configuration.get('chunkSize', 0)
+        self.columnar_load = configuration.get('columnarLoad', False)
+        self.load_infile = configuration.get('loadInfile', False)
+        self.reconcile_names = configuration.get('reconcileNames', False)
+
+        self.parse_workers = configuration.get('parseWorkers', 1)
+        self.stream_load = configuration.get('streamLoad', False)
+        self.stream_queue_size = configuration.get('streamQueueSize', 256)
+
+        self.bar_store_dir = self.absolute_path(configuration.get('barStoreDir', ''))
+        self.price_sink = configuration.get('priceSink', 'database')
+        if self.price_sink not in ('database', 'store', 'both'):
+            raise ValueError("priceSink must be database, store or both:%s" % self.price_sink)
+
+        if self.price_sink != 'database':
+            if len(self.bar_store_dir) < 1 or not BarStore.available():
+                raise ValueError("priceSink %s requires barStoreDir and numpy" % self.price_sink)
+            self.bar_store = BarStore(self.bar_store_dir)
+
+        # server credentials, mysql or postgresql
+        self.mysql_username = configuration.get('mySqlUserName', '')
+        self.mysql_password = configuration.get('mySqlPassWord', '')
+        self.mysql_hostname = configuration.get('mySqlHostName', '')
+        self.mysql_database = configuration.get('mySqlDataBase', '')
+        self.db_port = configuration.get('dbPort', 0)
+
+        self.sqlite_file = self.absolute_path(configuration.get('sqliteFile', ''))
+        self.sqlite_pragmas = configuration.get('sqlitePragmas', {})
+
+        self.bulk_session = configuration.get('bulkSession', False)
+        self.executemany_page_size = configuration.get('executemanyPageSize', 1000)
+        self.pool_max_overflow = configuration.get('poolMaxOverflow', 10)
+        self.pool_pre_ping = configuration.get('poolPrePing', True)
+        self.pool_recycle = configuration.get('poolRecycle', 3600)
+        self.pool_size = configuration.get('poolSize', 5)
+
+        self.set_backend(configuration.get('dbBackend', 'mysql'))
+
+        # discovery and parsing (or parse workers) write concurrently, SQLite has a single writer lock
+        if self.stream_load and self.sql_backend.name == 'sqlite':
+            raise ValueError("streamLoad requires a mysql or postgresql dbBackend")
 
-        self.mysql_url = "mysql://%s:%s@%s:3306/%s" % (self.mysql_username, self.mysql_password, self.mysql_hostname, self.mysql_database)
+        if self.parse_workers > 1 and self.sql_backend.name == 'sqlite':
+            raise ValueError("parseWorkers %d requires a mysql or postgresql dbBackend" % self.parse_workers)
 
 #;;; Local Variables: ***
 #;;; mode:python ***
@@ -0,0 +1,85 @@
+#
+# Title: copy_loader.py
+# Description: COPY price loader for never loaded files (PostgreSQL)
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import io
+
+from sqlalchemy import text
+
+from mythic_recorder.bulk_writer import PRICE_COLUMNS
+from mythic_recorder.infile_loader import InfileLoader
+from mythic_recorder.infile_loader import stage_columns
+
+STAGE_TABLE = """CREATE TEMPORARY TABLE IF NOT EXISTS %s (
+  name_id BIGINT NOT NULL,
+  date %s NOT NULL,
+  %s,
+  PRIMARY KEY (name_id, date))"""
+
+class CopyLoader(InfileLoader):
+    """
+    InfileLoader for PostgreSQL.  Rows are streamed from memory w/COPY ... FROM STDIN into a per connection
+    staging table, classified w/one join and merged w/one INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+    Requires psycopg2.
+    """
+
+    def stage(self, buffer):
+        """
+        (re)create the staging table and COPY the TSV
+        :param buffer: TSV text stream
+        :return: None
+        """
+        if self.date_only:
+            date_type = 'DATE'
+        else:
+            date_type = 'TIMESTAMP'
+
+        self.session.execute(text(STAGE_TABLE % (self.stage_name, date_type, stage_columns(self.table, ''))))
+        self.session.execute(text("TRUNCATE TABLE %s" % self.stage_name))
+
+        # raw psycopg2 cursor on the session connection, same transaction
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert("COPY %s (name_id, date, %s) FROM STDIN" % (self.stage_name, ", ".join(PRICE_COLUMNS)), buffer)
+        finally:
+            cursor.close()
+
+        return None
+
+    def merge(self):
+        columns = ", ".join(PRICE_COLUMNS)
+        updates = ", ".join("%s = EXCLUDED.%s" % (column, column) for column in PRICE_COLUMNS)
+
+        statement = "INSERT INTO %s (task_id, name_id, date, %s) SELECT :task_id, name_id, date, %s FROM %s ON CONFLICT (name_id, date) DO UPDATE SET %s" % \
+                    (self.table.name, columns, columns, self.stage_name, updates)
+
+        self.session.execute(text(statement), {'task_id': self.task_id})
+
+        return None
+
+    def flush(self):
+        """
+        stage, classify and merge all appended rows, no temporary file
+        :return: None
+        """
+        if len(self.rows) < 1:
+            return None
+
+        buffer = io.StringIO()
+        self.write_tsv(buffer)
+        buffer.seek(0)
+
+        self.stage(buffer)
+        self.classify()
+        self.reclassify()
+        self.merge()
+
+        self.rows = {}
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
@@ -7,11 +7,22 @@
 import os
 import time
 
+from mythic_recorder.eod_archive import EodArchive
+from mythic_recorder.eod_archive import is_archive
 from mythic_recorder.eod_file import EodFile
+from mythic_recorder.eod_file import compression_available
+from mythic_recorder.eod_file import hash_algorithm
+from mythic_recorder.eod_file import hash_available
+from mythic_recorder.eod_file import hash_files
+from mythic_recorder.manifest import Manifest
+from mythic_recorder.sql_table import YIELD_SIZE
 from mythic_recorder.sql_table import FileStat
 from mythic_recorder.sql_table import LoadLog
 from mythic_recorder.sql_table import LoadLogSummary
 
+# stream queue order w/in a batch, then by normalized name
+STREAM_ORDER = {'ExchangeList.xml': 0, 'SymbolList.xml': 1}
+
 class Discovery:
     """
     Inspect import directory for fresh files to reload.
@@ -24,13 +35,38 @@ class Discovery:
         """
         ctor
         """
+        self.archive_counter = 0
         self.directory_counter = 0
         self.fresh_file_counter = 0
+        self.hash_file_counter = 0
         self.total_file_counter = 0
         self.updated_file_counter = 0
 
         self.facility = 'discovery'
 
+        # normalized name => (id, file_size, sha1_hash)
+        self.file_stats = {}
+        self.manifest = Manifest('')
+
+        # (eod_file, stat_key) awaiting classification
+        self.candidates = []
+
+        # normalized name => source (archive name, '' if unpacked) which claimed it this scan
+        self.claims = {}
+        self.collision_counter = 0
+
+        # FileStat rows inserted since the last flush
+        self.fresh_file_stats = []
+
+        # LoadLog rows awaiting the stream queue
+        self.fresh_load_logs = []
+
+        self.hash_algorithm = 'sha1'
+        self.hash_workers = 1
+
+        self.exchange_registry = None
+        self.import_directory = ''
+
     def insert_load_log_summary(self, session, task_id, duration):
         """
         insert a new load log summary row
@@ -55,99 +91,367 @@ class Discovery:
         :param session: database connection
         :param task_id: parent task id
         :param eod_file: candidate file
-        :return: None
+        :return: fresh load log row
         """
-        load_log = LoadLog(task_id, eod_file.get_exchange(), eod_file.file_name, eod_file.normalized_file_name)
+        exchange = self.exchange_registry.exchange_code(self.import_directory, session, eod_file)
+        load_log = LoadLog(task_id, exchange, eod_file.file_name, eod_file.normalized_file_name)
+        if eod_file.archive is not None:
+            load_log.archive_name = os.path.relpath(eod_file.archive.file_name, self.import_directory)
         session.add(load_log)
 
+        self.fresh_load_logs.append(load_log)
+
+        return load_log
+
+    def select_file_stats(self, session):
+        """
+        preload all file stat rows w/one query
+        :param session: database connection
+        :return: None
+        """
+        self.file_stats = {}
+
+        # server side cursor, the whole table is read
+        selected_set = session.query(FileStat.normalized_name, FileStat.id, FileStat.file_size, FileStat.sha1_hash).\
+            order_by(FileStat.creation_task_id).yield_per(YIELD_SIZE)
+        for normalized_name, row_id, file_size, sha1_hash in selected_set:
+            self.file_stats[normalized_name] = (row_id, file_size, sha1_hash)
+
         return None
 
-    def insert_file_stat(self, session, task_id, eod_file):
+    def insert_file_stat(self, session, task_id, eod_file, file_size, sha1_hash):
         """
         insert a new file stat row
         :param session: database connection
         :param task_id: parent task id
         :param eod_file: candidate file
+        :param file_size: file size in bytes
+        :param sha1_hash: file hash
         :return: None
         """
         self.fresh_file_counter = self.fresh_file_counter + 1
 
-        file_stat = FileStat(task_id, eod_file.normalized_file_name, eod_file.file_size(), eod_file.sha1_hash())
+        file_stat = FileStat(task_id, eod_file.normalized_file_name, file_size, sha1_hash)
         session.add(file_stat)
+        self.fresh_file_stats.append(file_stat)
 
-        self.insert_load_log(session, task_id, eod_file)
+        # never loaded before, eligible for the LOAD DATA fast path
+        load_log = self.insert_load_log(session, task_id, eod_file)
+        load_log.fresh_flag = True
 
         return None
 
-    def update_file_stat(self, session, task_id, eod_file, original):
+    def update_file_stat(self, session, task_id, eod_file, original_id, file_size, sha1_hash):
         """
         update an existing file stat row
         :param session: database connection
         :param task_id: parent task id
         :param eod_file: candidate file
-        :param original: original row
+        :param original_id: original row id
+        :param file_size: file size in bytes
+        :param sha1_hash: file hash
         :return: None
         """
         self.updated_file_counter = self.updated_file_counter + 1
 
-        session.query(FileStat).with_for_update().filter_by(id=original.id).update({"update_task_id":task_id, "file_size":eod_file.file_size(), "sha1_hash":eod_file.sha1_hash(ssl_command)})
+        session.query(FileStat).with_for_update().filter_by(id=original_id).update({"update_task_id":task_id, "file_size":file_size, "sha1_hash":sha1_hash})
+        self.file_stats[eod_file.normalized_file_name] = (original_id, file_size, sha1_hash)
 
         self.insert_load_log(session, task_id, eod_file)
 
         return None
 
-    def process_file(self, session, task_id, eod_file):
+    def rehash_file_stat(self, session, task_id, eod_file, original_id, file_size, file_hash):
+        """
+        replace the digest of an unchanged file after a hash algorithm change, file is not reloaded
+        :param session: database connection
+        :param task_id: parent task id
+        :param eod_file: candidate file
+        :param original_id: original row id
+        :param file_size: file size in bytes
+        :param file_hash: digest in the configured algorithm
+        :return: None
+        """
+        session.query(FileStat).filter_by(id=original_id).update({"update_task_id":task_id, "sha1_hash":file_hash})
+        self.file_stats[eod_file.normalized_file_name] = (original_id, file_size, file_hash)
+
+        return None
+
+    def suspect_algorithm(self, eod_file, stat_key):
+        """
+        :param eod_file: candidate file
+        :param stat_key: (size, mtime, inode)
+        :return: algorithm required to classify this file, None if no hash is needed
+        """
+        selected = self.file_stats.get(eod_file.normalized_file_name)
+        if selected is None or stat_key[0] != selected[1]:
+            return eod_file.native_algorithm(self.hash_algorithm)
+
+        if self.manifest.select(eod_file.normalized_file_name, stat_key) == selected[2]:
+            return None
+
+        # compare in the algorithm used for the stored digest
+        return hash_algorithm(selected[2])
+
+    def process_file(self, session, task_id, eod_file, stat_key):
         """
-        test a file for new/updated status
+        test a file for new/updated status.
+        files whose stat metadata matches the manifest are not hashed, only suspect files are.
         :param session: database connection
         :param task_id: parent task id
         :param eod_file: candidate file
+        :param stat_key: (size, mtime, inode)
         :return: None
         """
-        selected = session.query(FileStat).filter_by(normalized_name = eod_file.normalized_file_name).order_by(FileStat.creation_task_id.desc()).first()
+        normalized_name = eod_file.normalized_file_name
+        file_size = stat_key[0]
+
+        # archive members prefer the CRC they carry
+        algorithm = eod_file.native_algorithm(self.hash_algorithm)
+
+        selected = self.file_stats.get(normalized_name)
         if selected is None:
-            self.insert_file_stat(session, task_id, eod_file)
+            file_hash = eod_file.file_hash(algorithm)
+            self.insert_file_stat(session, task_id, eod_file, file_size, file_hash)
+            self.manifest.put(normalized_name, stat_key, file_hash)
             return None
 
-        if eod_file.file_size() != selected.file_size:
-            self.update_file_stat(session, task_id, eod_file, selected)
+        row_id, original_size, original_hash = selected
+
+        if file_size != original_size:
+            file_hash = eod_file.file_hash(algorithm)
+            self.update_file_stat(session, task_id, eod_file, row_id, file_size, file_hash)
+            self.manifest.put(normalized_name, stat_key, file_hash)
             return None
 
-        if eod_file.sha1_hash() != selected.sha1_hash:
-            self.update_file_stat(session, task_id, eod_file, selected)
+        if self.manifest.select(normalized_name, stat_key) == original_hash:
+            return None
+
+        file_hash = original_hash
+        if eod_file.file_hash(hash_algorithm(original_hash)) != original_hash:
+            file_hash = eod_file.file_hash(algorithm)
+            self.update_file_stat(session, task_id, eod_file, row_id, file_size, file_hash)
+        elif hash_algorithm(original_hash) != algorithm:
+            file_hash = eod_file.file_hash(algorithm)
+            self.rehash_file_stat(session, task_id, eod_file, row_id, file_size, file_hash)
+
+        self.manifest.put(normalized_name, stat_key, file_hash)
 
         return None
 
-    def process_directory(self, session, task_id, alert_log, directory_name):
+    def stale_sibling(self, eod_file, stat_key, previous_file, previous_key):
         """
-        test the current directory for new/updated files
+        X.csv beside X.csv.xz is left by a recompress.py run interrupted between the file_stat update and
+        the remove, the copy which matches file_stat is kept so the file does not reload
+        :param eod_file: candidate file
+        :param stat_key: (size, mtime, inode)
+        :param previous_file: earlier candidate w/the same normalized name
+        :param previous_key: (size, mtime, inode)
+        :return: True if eod_file should be ignored in favour of previous_file
+        """
+        if eod_file.archive is not None or previous_file.archive is not None:
+            return False
+
+        selected = self.file_stats.get(eod_file.normalized_file_name)
+        if selected is None:
+            return False
+
+        return previous_key[0] == selected[1] and stat_key[0] != selected[1]
+
+    def claim(self, eod_file):
+        """
+        file_stat holds one digest per normalized name, an unpacked file and an archive member (or two archives)
+        w/the same name would replace each other's digest every scan, the first source in scan order keeps the name
+        :param eod_file: candidate file
+        :return: True if eod_file belongs to the source which claimed its name
+        """
+        source = ''
+        if eod_file.archive is not None:
+            source = eod_file.archive.file_name
+
+        claimed = self.claims.setdefault(eod_file.normalized_file_name, source)
+        if claimed == source:
+            return True
+
+        self.collision_counter = 1 + self.collision_counter
+        print("skipping, %s already read from %s:%s" % (eod_file.normalized_file_name, claimed or 'importDir', eod_file.full_name))
+
+        return False
+
+    def process_candidates(self, session, task_id):
+        """
+        hash all suspect files in parallel, then classify every candidate
         :param session: database connection
         :param task_id: parent task id
-        :param alert_log: alert log
-        :param directory_name: current directory name
         :return: None
         """
+        # a name repeated w/in one source, the last wins
+        latest = {}
+        for eod_file, stat_key in self.candidates:
+            if not self.claim(eod_file):
+                continue
+
+            previous = latest.get(eod_file.normalized_file_name)
+            if previous is not None and self.stale_sibling(eod_file, stat_key, previous[0], previous[1]):
+                continue
+
+            latest[eod_file.normalized_file_name] = (eod_file, stat_key)
+        self.candidates = list(latest.values())
+
+        suspects = []
+        members = []
+        for eod_file, stat_key in self.candidates:
+            algorithm = self.suspect_algorithm(eod_file, stat_key)
+            if algorithm is None:
+                continue
+
+            if eod_file.archive is None:
+                suspects.append((eod_file, algorithm))
+            else:
+                members.append((eod_file, algorithm))
+
+        self.hash_file_counter = len(suspects) + len(members) + self.hash_file_counter
+        hash_files(suspects, self.hash_workers)
+
+        # archives are read sequentially
+        hash_files(members, 1)
+
+        for eod_file, stat_key in self.candidates:
+            self.process_file(session, task_id, eod_file, stat_key)
+
+        self.candidates = []
+
+        # later batches (stream, archives) must see these rows
+        if len(self.fresh_file_stats) > 0:
+            session.flush()
+            for file_stat in self.fresh_file_stats:
+                self.file_stats[file_stat.normalized_name] = (file_stat.id, file_stat.file_size, file_stat.sha1_hash)
+            self.fresh_file_stats = []
+
+        return None
+
+    def scan_directory(self, directory_name):
+        """
+        walk w/os.scandir, file type and stat metadata come from the directory entry
+        :param directory_name: current directory name
+        :return: generator of candidate lists, one per directory, files before subdirectories
+        """
         self.directory_counter = self.directory_counter + 1
 
-        candidates = os.listdir(directory_name)
-        for candidate in candidates:
-            normalized_name = "%s/%s" % (directory_name, candidate)
-            if os.path.isdir(normalized_name):
-                self.process_directory(session, task_id, alert_log, normalized_name)
-            else:
+        archives = []
+        candidates = []
+        subdirectories = []
+
+        with os.scandir(directory_name) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subdirectories.append(entry.path)
+                    continue
+
+                if is_archive(entry.name):
+                    archives.append(entry.path)
+                    continue
+
                 self.total_file_counter = self.total_file_counter + 1
 
-                eod_file = EodFile(normalized_name)
-                if eod_file.file_size() < 1:
+                if not compression_available(entry.name):
+                    print("skipping, zstandard unavailable:%s" % entry.path)
+                    continue
+
+                eod_file = EodFile(entry.path)
+                stat_key = eod_file.stat_key(entry.stat())
+                if stat_key[0] < 1:
                     print("skipping empty file:%s" % eod_file.full_name)
                 else:
-                    self.process_file(session, task_id, eod_file)
+                    candidates.append((eod_file, stat_key))
+
+        yield candidates
+
+        for archive_name in sorted(archives):
+            yield from self.scan_archive(archive_name)
+
+        for subdirectory in sorted(subdirectories):
+            yield from self.scan_directory(subdirectory)
+
+    def scan_archive(self, file_name):
+        """
+        list a zip or tar.gz archive, members are read in place and never unpacked
+        :param file_name: fully qualified archive name
+        :return: generator of one candidate list, the archive remains open while candidates are classified
+        """
+        self.archive_counter = self.archive_counter + 1
+
+        archive = EodArchive(file_name)
+        archive.open()
+
+        try:
+            candidates = []
+
+            for member in archive.scan():
+                self.total_file_counter = self.total_file_counter + 1
+
+                if member.file_size() < 1:
+                    print("skipping empty file:%s" % member.full_name)
+                    continue
+
+                # exchange directories w/in the archive route by these codes
+                if member.file_name == 'ExchangeList.xml':
+                    self.exchange_registry.add_codes(self.import_directory, member)
+
+                candidates.append((member, member.stat_key()))
 
-    def execute(self, context):
+            yield candidates
+        finally:
+            archive.close()
+
+    def process_directory(self, session, task_id, alert_log, directory_name):
+        """
+        collect candidate files for the whole tree
+        :param session: database connection
+        :param task_id: parent task id
+        :param alert_log: alert log
+        :param directory_name: current directory name
+        :return: None
+        """
+        for candidates in self.scan_directory(directory_name):
+            self.candidates.extend(candidates)
+
+            # archive members are classified while their archive is open
+            if len(candidates) > 0 and candidates[0][0].archive is not None:
+                self.process_candidates(session, task_id)
+
+    def stream_directory(self, session, task_id, directory_name, load_log_queue):
+        """
+        classify and commit one directory at a time, then queue fresh LoadLog ids for the parser.
+        ExchangeList.xml (root) precedes every exchange directory and SymbolList.xml precedes its price files.
+        the queue is bounded, a slow parser throttles discovery.
+        :param session: database connection
+        :param task_id: parent task id
+        :param directory_name: import directory
+        :param load_log_queue: bounded queue.Queue of LoadLog ids
+        :return: None
+        """
+        for candidates in self.scan_directory(directory_name):
+            self.candidates = candidates
+            self.process_candidates(session, task_id)
+            session.flush()
+
+            # ids before commit, reading an expired row is another select
+            self.fresh_load_logs.sort(key=lambda load_log: (STREAM_ORDER.get(load_log.file_name, len(STREAM_ORDER)), load_log.normalized_name))
+            load_log_ids = [load_log.id for load_log in self.fresh_load_logs]
+            self.fresh_load_logs = []
+
+            session.commit()
+
+            for load_log_id in load_log_ids:
+                load_log_queue.put(load_log_id)
+
+    def execute(self, context, load_log_queue=None):
         """
         Inspect a directory w/a freshly unpacked ftp.eoddata.com file for updated files.
         Write updated file information to DB tables: FileStat and LoadLog.
         :param context: runtime context
+        :param load_log_queue: stream fresh LoadLog ids to a concurrent parser, None classifies the whole tree at once
         :return: True if success
         """
         start_time = time.time()
@@ -157,8 +461,36 @@ class Discovery:
         if os.path.exists(context.import_directory):
             os.chdir(context.import_directory)
 
-            self.process_directory(context.session, context.task_id, context.alert_log, context.import_directory)
+            self.manifest = Manifest(context.manifest_file)
+            self.manifest.load()
+
+            self.hash_algorithm = context.hash_algorithm
+            if not hash_available(self.hash_algorithm):
+                context.alert_log.log_writer(self.facility, 4, "hash algorithm unavailable:%s, using sha1" % self.hash_algorithm)
+                self.hash_algorithm = 'sha1'
+
+            self.hash_workers = context.hash_workers
+
+            self.exchange_registry = context.exchange_registry
+            self.import_directory = context.import_directory
+
+            self.select_file_stats(context.session)
+            self.claims = {}
+
+            if load_log_queue is None:
+                self.process_directory(context.session, context.task_id, context.alert_log, context.import_directory)
+                self.process_candidates(context.session, context.task_id)
+            else:
+                self.stream_directory(context.session, context.task_id, context.import_directory, load_log_queue)
+
             context.session.commit()
+
+            # only after commit, else a failed run could hide changed files
+            self.manifest.save()
+
+            context.alert_log.log_writer(self.facility, 6, "hashed %d of %d files, %d archives" % (self.hash_file_counter, self.total_file_counter, self.archive_counter))
+            if self.collision_counter > 0:
+                context.alert_log.log_writer(self.facility, 4, "%d files skipped, name already read from another source" % self.collision_counter)
             status = True
         else:
             context.alert_log.log_fatal(self.facility, "missing import directory:%s" % context.import_directory)
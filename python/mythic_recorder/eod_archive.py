@@ -0,0 +1,260 @@
+#
+# Title: eod_archive.py
+# Description: read eoddata files from zip and tar.gz archives w/o unpacking
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import tarfile
+import time
+import zipfile
+
+from mythic_recorder.eod_file import BLOCK_SIZE
+from mythic_recorder.eod_file import DIGEST_PREFIX
+from mythic_recorder.eod_file import Crc32Hasher
+from mythic_recorder.eod_file import EodFile
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar.gz', '.tgz')
+
+def is_archive(file_name):
+    """
+    :param file_name: candidate file name
+    :return: True if file is a zip or tar.gz archive
+    """
+    return file_name.lower().endswith(ARCHIVE_SUFFIXES)
+
+def normalized_member_name(member_name):
+    """
+    :param member_name: archive member, i.e. DataClient/ASCII/AMEX/AMEX_20180430.csv
+    :return: member name below ASCII, as for an unpacked file
+    """
+    member_name = member_name.replace('\\', '/')
+
+    ndx = member_name.find('ASCII/')
+    if ndx < 0:
+        return member_name.lstrip('/')
+
+    return member_name[ndx + len('ASCII/'):]
+
+class ArchiveMember(EodFile):
+    """
+    Archive member w/the EodFile interface.  Contents are streamed from the archive, never written to disk.
+    Change detection uses the member CRC (stored by zip, computed while listing a tar.gz).
+    """
+
+    def __init__(self, archive, member_name, file_size, modify_time, crc=None):
+        """
+        :param archive: parent EodArchive
+        :param member_name: name within archive
+        :param file_size: uncompressed size in bytes
+        :param modify_time: member time stamp, seconds since epoch
+        :param crc: CRC-32 of member contents, None if unknown
+        """
+        super().__init__("%s/%s" % (archive.file_name, member_name), normalized_member_name(member_name))
+
+        self.archive = archive
+        self.member_name = member_name
+
+        self.size = file_size
+        self.mtime = modify_time
+        self.crc = crc
+
+        if crc is not None:
+            self.hash['crc32'] = "%s%08x" % (DIGEST_PREFIX['crc32'], crc)
+
+    def __repr__(self):
+        return "<archive_member(%s)>" % self.full_name
+
+    def update_hasher(self, hasher):
+        with self.open_binary() as in_file:
+            buffer = in_file.read(BLOCK_SIZE)
+            while len(buffer) > 0:
+                hasher.update(buffer)
+                buffer = in_file.read(BLOCK_SIZE)
+
+        return None
+
+    def native_algorithm(self, algorithm):
+        if self.crc is None:
+            return algorithm
+
+        return 'crc32'
+
+    def open_binary(self):
+        return self.archive.open_member(self.member_name)
+
+    def stat_key(self, stat=None):
+        """
+        (size, mtime, crc) in place of (size, mtime, inode)
+        """
+        return self.size, self.mtime * 1000000000, self.crc or 0
+
+    def file_size(self):
+        return self.size
+
+    def access_time(self):
+        return self.mtime
+
+    def create_time(self):
+        return self.mtime
+
+    def modify_time(self):
+        return self.mtime
+
+class EodArchive:
+    """
+    A weekly zip or tar.gz of the eoddata tree.  Prefer zip, members are read at random and carry a CRC.
+    A tar.gz is decompressed once to list members, and members should be read in archive order.
+    """
+
+    def __init__(self, file_name):
+        """
+        ctor
+        :param file_name: fully qualified archive name
+        """
+        self.file_name = file_name
+        self.zip_file = None
+        self.tar_file = None
+
+        # normalized name => ArchiveMember
+        self.members = None
+
+    def __repr__(self):
+        return "<eod_archive(%s)>" % self.file_name
+
+    def is_zip(self):
+        return self.file_name.lower().endswith('.zip')
+
+    def open(self):
+        if self.is_zip():
+            self.zip_file = zipfile.ZipFile(self.file_name)
+        else:
+            self.tar_file = tarfile.open(self.file_name, 'r:gz')
+
+        return None
+
+    def close(self):
+        if self.zip_file is not None:
+            self.zip_file.close()
+            self.zip_file = None
+
+        if self.tar_file is not None:
+            self.tar_file.close()
+            self.tar_file = None
+
+        return None
+
+    def scan_zip(self):
+        results = []
+
+        for info in self.zip_file.infolist():
+            if info.is_dir():
+                continue
+
+            modify_time = int(time.mktime(info.date_time + (0, 0, -1)))
+            results.append(ArchiveMember(self, info.filename, info.file_size, modify_time, info.CRC))
+
+        return results
+
+    def scan_tar(self, digest):
+        """
+        :param digest: True computes the CRC of each member, a sequential pass over the archive
+        :return: list of ArchiveMember
+        """
+        results = []
+
+        if not digest:
+            for info in self.tar_file.getmembers():
+                if info.isfile():
+                    results.append(ArchiveMember(self, info.name, info.size, int(info.mtime)))
+            return results
+
+        with tarfile.open(self.file_name, 'r|gz') as stream:
+            for info in stream:
+                if not info.isfile():
+                    continue
+
+                hasher = Crc32Hasher()
+                in_file = stream.extractfile(info)
+                buffer = in_file.read(BLOCK_SIZE)
+                while len(buffer) > 0:
+                    hasher.update(buffer)
+                    buffer = in_file.read(BLOCK_SIZE)
+
+                results.append(ArchiveMember(self, info.name, info.size, int(info.mtime), hasher.value))
+
+        return results
+
+    def scan(self, digest=True):
+        """
+        list archive members, later duplicates of a normalized name win
+        :param digest: False skips the tar.gz CRC pass, i.e. when only reading members
+        :return: list of ArchiveMember
+        """
+        if self.is_zip():
+            results = self.scan_zip()
+        else:
+            results = self.scan_tar(digest)
+
+        self.members = {}
+        for member in results:
+            self.members[member.normalized_file_name] = member
+
+        return list(self.members.values())
+
+    def member(self, normalized_name):
+        """
+        :param normalized_name: file name w/parent directory, as in load_log
+        :return: ArchiveMember, raises KeyError if absent
+        """
+        if self.members is None:
+            self.scan(False)
+
+        return self.members[normalized_name]
+
+    def open_member(self, member_name):
+        """
+        :param member_name: name within archive
+        :return: binary stream, seekable
+        """
+        if self.zip_file is not None:
+            return self.zip_file.open(member_name)
+
+        return self.tar_file.extractfile(member_name)
+
+class ArchiveCache:
+    """
+    Archives opened by the parser, held open for the run so members are not listed once per file.
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        # archive file name => EodArchive
+        self.archives = {}
+
+    def select(self, file_name, normalized_name):
+        """
+        :param file_name: fully qualified archive name
+        :param normalized_name: file name w/parent directory, as in load_log
+        :return: ArchiveMember
+        """
+        archive = self.archives.get(file_name)
+        if archive is None:
+            archive = EodArchive(file_name)
+            archive.open()
+            self.archives[file_name] = archive
+
+        return archive.member(normalized_name)
+
+    def close(self):
+        for archive in self.archives.values():
+            archive.close()
+
+        self.archives = {}
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
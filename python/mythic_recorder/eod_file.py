@@ -4,26 +4,178 @@
 # Development Environment: OS X 10.13.3/Python 3.6.4
 # Author: G.S. Cole (guycole at gmail dot com)
 #
+import gzip
 import hashlib
+import io
+import lzma
+import mmap
 import os
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOCK_SIZE = 65536
+MMAP_THRESHOLD = 1048576
+
+# compressed at rest, i.e. NYSE_20180430.csv.zst
+COMPRESSION_SUFFIXES = ('.gz', '.zst', '.xz')
+
+# stored digests are prefixed w/algorithm, except sha1 which predates the prefix
+DIGEST_PREFIX = {'sha1': '', 'blake2b': 'b2:', 'xxh64': 'xx:', 'crc32': 'crc:'}
+
+def hash_algorithm(stored_hash):
+    """
+    :param stored_hash: digest as stored in file_stat.sha1_hash
+    :return: algorithm name
+    """
+    for algorithm, prefix in DIGEST_PREFIX.items():
+        if len(prefix) > 0 and stored_hash.startswith(prefix):
+            return algorithm
+
+    return 'sha1'
+
+def hash_available(algorithm):
+    """
+    :param algorithm: sha1, blake2b or xxh64
+    :return: True if algorithm can be computed on this host
+    """
+    if algorithm == 'xxh64':
+        return xxhash is not None
+
+    return algorithm in DIGEST_PREFIX
+
+def compression_suffix(file_name):
+    """
+    :param file_name: file name
+    :return: compression suffix or empty string
+    """
+    for suffix in COMPRESSION_SUFFIXES:
+        if file_name.endswith(suffix):
+            return suffix
+
+    return ''
+
+def compression_available(file_name):
+    """
+    :param file_name: file name
+    :return: True if file can be decompressed on this host
+    """
+    return compression_suffix(file_name) != '.zst' or zstandard is not None
+
+def strip_compression(file_name):
+    """
+    :param file_name: file name
+    :return: file name w/o compression suffix
+    """
+    suffix = compression_suffix(file_name)
+    if len(suffix) < 1:
+        return file_name
+
+    return file_name[:-len(suffix)]
+
+def locate_file(file_name):
+    """
+    :param file_name: uncompressed file name, i.e. from load_log.normalized_name
+    :return: file name as stored, w/compression suffix if only a compressed copy exists
+    """
+    if os.path.exists(file_name):
+        return file_name
+
+    for suffix in COMPRESSION_SUFFIXES:
+        if os.path.exists(file_name + suffix):
+            return file_name + suffix
+
+    return file_name
+
+def open_compressed(file_name):
+    """
+    :param file_name: file name, decompressed according to suffix
+    :return: binary stream of uncompressed contents
+    """
+    suffix = compression_suffix(file_name)
+
+    if suffix == '.gz':
+        return gzip.open(file_name, 'rb')
+
+    if suffix == '.xz':
+        return lzma.open(file_name, 'rb')
+
+    if suffix == '.zst':
+        if zstandard is None:
+            raise ValueError("zstandard unavailable:%s" % file_name)
+
+        # buffered for line iteration, stream_reader only seeks forward
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(file_name, 'rb'), closefd=True))
+
+    return open(file_name, 'rb')
+
+def hash_files(candidates, workers):
+    """
+    hash files on a thread pool, hashlib releases the GIL so this scales across cores.
+    results are cached on each EodFile.
+    :param candidates: list of (EodFile, algorithm)
+    :param workers: thread population
+    :return: None
+    """
+    if workers < 2 or len(candidates) < 2:
+        for eod_file, algorithm in candidates:
+            eod_file.file_hash(algorithm)
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda candidate: candidate[0].file_hash(candidate[1]), candidates))
+
+    return None
+
+class Crc32Hasher:
+    """
+    zlib.crc32 w/the hashlib update/hexdigest interface.  zip archives store this digest for every member.
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, buffer):
+        self.value = zlib.crc32(buffer, self.value)
+
+    def hexdigest(self):
+        return "%08x" % self.value
 
 class EodFile:
     """
     File wrapper
     """
-    def __init__(self, raw_name):
+    def __init__(self, raw_name, normalized_name=None):
         """
         :param raw_name: fully qualified file name
+        :param normalized_name: name below ASCII, None derives it from raw_name
         """
-        self.hash = ''
+        # algorithm => stored digest
+        self.hash = {}
         self.full_name = raw_name
 
-        # raise substring not found if error
-        ndx1 = raw_name.index('ASCII')
-        ndx2 = ndx1 + len('ASCII/')
-        self.normalized_file_name = raw_name[ndx2:]
+        # parent EodArchive, None for an unpacked file
+        self.archive = None
+
+        if normalized_name is None:
+            # raise substring not found if error, a compressed file keeps the name of the original
+            ndx1 = raw_name.index('ASCII')
+            ndx2 = ndx1 + len('ASCII/')
+            normalized_name = strip_compression(raw_name[ndx2:])
+
+        self.normalized_file_name = normalized_name
 
-        tokens = raw_name.split('/')
+        tokens = self.normalized_file_name.split('/')
         self.file_name = tokens[len(tokens)-1]
     
     def __repr__(self):
@@ -39,19 +191,87 @@ class EodFile:
         else:
             return False
 
-    def sha1_hash(self):
+    def new_hasher(self, algorithm):
+        if algorithm == 'sha1':
+            return hashlib.sha1()
+
+        if algorithm == 'blake2b':
+            # 20 bytes, fits file_stat.sha1_hash w/prefix
+            return hashlib.blake2b(digest_size=20)
+
+        if algorithm == 'xxh64' and xxhash is not None:
+            return xxhash.xxh64()
+
+        if algorithm == 'crc32':
+            return Crc32Hasher()
+
+        raise ValueError("unsupported hash algorithm:%s" % algorithm)
+
+    def file_hash(self, algorithm):
         """
-        calculate sha1 hash
+        calculate file digest, large files are read via mmap.  results are cached per algorithm.
+        :param algorithm: sha1, blake2b or xxh64
+        :return: digest w/algorithm prefix, as stored in file_stat
+        """
+        result = self.hash.get(algorithm)
+        if result is not None:
+            return result
+
+        hasher = self.new_hasher(algorithm)
+        self.update_hasher(hasher)
+
+        result = DIGEST_PREFIX[algorithm] + hasher.hexdigest()
+        self.hash[algorithm] = result
+
+        return result
+
+    def update_hasher(self, hasher):
+        """
+        feed file contents to hasher
+        :param hasher: hashlib style object
+        :return: None
         """
-        BLOCK_SIZE = 65536
-        hash_sha1 = hashlib.sha1()
         with open(self.full_name, 'rb') as in_file:
-            buffer = in_file.read(BLOCK_SIZE)
-            while len(buffer) > 0:
-                hash_sha1.update(buffer)
+            if os.fstat(in_file.fileno()).st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    hasher.update(mapped)
+            else:
                 buffer = in_file.read(BLOCK_SIZE)
+                while len(buffer) > 0:
+                    hasher.update(buffer)
+                    buffer = in_file.read(BLOCK_SIZE)
+
+        return None
+
+    def native_algorithm(self, algorithm):
+        """
+        :param algorithm: configured hash algorithm
+        :return: algorithm to classify this file w/, archive members prefer a digest they already carry
+        """
+        return algorithm
+
+    def open_binary(self):
+        """
+        digests cover the file as stored, readers see uncompressed contents
+        :return: file contents as a binary stream, seekable unless zstd
+        """
+        return open_compressed(self.full_name)
+
+    def sha1_hash(self):
+        """
+        calculate sha1 hash
+        """
+        return self.file_hash('sha1')
+
+    def stat_key(self, stat=None):
+        """
+        return (size, mtime, inode) from a single stat call, used for change detection
+        :param stat: stat result already in hand, i.e. from os.DirEntry.stat()
+        """
+        if stat is None:
+            stat = os.stat(self.full_name)
 
-        return hash_sha1.hexdigest()
+        return int(stat.st_size), int(stat.st_mtime_ns), int(stat.st_ino)
 
     def file_size(self):
         """
@@ -90,63 +310,15 @@ class EodFile:
             return -1
 
     def get_exchange(self):
-        if self.normalized_file_name.startswith('AMEX'):
-            return 'amex'
-        elif self.normalized_file_name.startswith('ASX'):
-            return 'asx'
-        elif self.normalized_file_name.startswith('BSE'):
-            return 'bse'
-        elif self.normalized_file_name.startswith('CBOT'):
-            return 'cbot'
-        elif self.normalized_file_name.startswith('CFE'):
-            return 'cfe'
-        elif self.normalized_file_name.startswith('CME'):
-            return 'cme'
-        elif self.normalized_file_name.startswith('COMEX'):
-            return 'comex'
-        elif self.normalized_file_name.startswith('EUREX'):
-            return 'eurex'
-        elif self.normalized_file_name.startswith('FOREX'):
-            return 'forex'
-        elif self.normalized_file_name.startswith('HKEX'):
-            return 'hkex'
-        elif self.normalized_file_name.startswith('INDEX'):
-            return 'index'
-        elif self.normalized_file_name.startswith('KCBT'):
-            return 'kcbt'
-        elif self.normalized_file_name.startswith('LIFFE'):
-            return 'liffe'
-        elif self.normalized_file_name.startswith('LSE'):
-            return 'lse'
-        elif self.normalized_file_name.startswith('MGEX'):
-            return 'mgex'
-        elif self.normalized_file_name.startswith('NASDAQ'):
-            return 'nasdaq'
-        elif self.normalized_file_name.startswith('NSE'):
-            return 'nse'
-        elif self.normalized_file_name.startswith('NYBOT'):
-            return 'nybot'
-        elif self.normalized_file_name.startswith('NYMEX'):
-            return 'nymex'
-        elif self.normalized_file_name.startswith('NYSE'):
-            return 'nyse'
-        elif self.normalized_file_name.startswith('NZX'):
-            return 'nzx'
-        elif self.normalized_file_name.startswith('OTCBB'):
-            return 'otcbb'
-        elif self.normalized_file_name.startswith('SGX'):
-            return 'sgx'
-        elif self.normalized_file_name.startswith('TSXV'):
-            return 'tsxv'
-        elif self.normalized_file_name.startswith('TSX'):
-            return 'tsx'
-        elif self.normalized_file_name.startswith('USMF'):
-            return 'usmf'
-        elif self.normalized_file_name.startswith('WCE'):
-            return 'wce'
-        else:
+        """
+        :return: lower case exchange code, the first directory of the normalized name (see ExchangeRegistry)
+        """
+        tokens = self.normalized_file_name.split('/')
+        if len(tokens) < 2:
             return 'unknown'
 
+        return tokens[0].lower()
+
 #;;; Local Variables: ***
 #;;; mode:python ***
 #;;; End: ***
@@ -0,0 +1,134 @@
+#
+# Title: exchange_registry.py
+# Description: exchange codes and rows, loaded once per run
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import os
+
+from xml.etree import ElementTree
+
+from mythic_recorder.eod_file import locate_file
+from mythic_recorder.eod_file import open_compressed
+from mythic_recorder.sql_table import Exchange
+
+class ExchangeRegistry:
+    """
+    Exchange codes from ExchangeList.xml and the exchange table, keyed by lower case code.
+    The first directory of a normalized file name is the exchange code, so routing is a dictionary lookup
+    and a freshly listed exchange needs no code change.  Exchange rows are detached copies, parsers read
+    exchange.id w/o a database round trip.
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        # lower case code from ExchangeList.xml
+        self.codes = None
+
+        # lower case code => detached Exchange
+        self.exchanges = None
+
+    def load_codes(self, import_directory):
+        """
+        read exchange codes from ExchangeList.xml, a missing file leaves only exchange table codes
+        :param import_directory: eoddata root directory
+        :return: None
+        """
+        self.codes = set()
+
+        file_name = locate_file(os.path.join(import_directory, 'ExchangeList.xml'))
+        if not os.path.exists(file_name):
+            return None
+
+        with open_compressed(file_name) as in_file:
+            self.read_codes(in_file)
+
+        return None
+
+    def read_codes(self, in_file):
+        """
+        :param in_file: ExchangeList.xml open in binary mode
+        :return: None
+        """
+        for event, element in ElementTree.iterparse(in_file):
+            if element.tag == 'EXCHANGE' and element.get('Code') is not None:
+                self.codes.add(element.get('Code').lower())
+            element.clear()
+
+        return None
+
+    def add_codes(self, import_directory, eod_file):
+        """
+        add codes from another ExchangeList.xml, i.e. an archive member
+        :param import_directory: eoddata root directory
+        :param eod_file: ExchangeList.xml
+        :return: None
+        """
+        if self.codes is None:
+            self.load_codes(import_directory)
+
+        with eod_file.open_binary() as in_file:
+            self.read_codes(in_file)
+
+        return None
+
+    def load(self, session):
+        """
+        select every exchange row w/one query
+        :param session: database session
+        :return: None
+        """
+        self.exchanges = {}
+
+        for row_id, symbol, name in session.query(Exchange.id, Exchange.symbol, Exchange.name):
+            exchange = Exchange(symbol, name)
+            exchange.id = row_id
+            self.exchanges[symbol.lower()] = exchange
+
+        return None
+
+    def invalidate(self):
+        """
+        discard exchange rows, i.e. after ExchangeList.xml is loaded
+        :return: None
+        """
+        self.exchanges = None
+
+    def exchange_code(self, import_directory, session, eod_file):
+        """
+        :param import_directory: eoddata root directory
+        :param session: database session
+        :param eod_file: candidate file
+        :return: lower case exchange code, or 'unknown'
+        """
+        if self.codes is None:
+            self.load_codes(import_directory)
+
+        code = eod_file.get_exchange()
+        if code in self.codes:
+            return code
+
+        if self.exchanges is None:
+            self.load(session)
+
+        if code in self.exchanges:
+            return code
+
+        return 'unknown'
+
+    def select(self, session, code):
+        """
+        :param session: database session
+        :param code: exchange code, any case
+        :return: Exchange or None
+        """
+        if self.exchanges is None:
+            self.load(session)
+
+        return self.exchanges.get(code.lower())
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
@@ -0,0 +1,229 @@
+#
+# Title: infile_loader.py
+# Description: LOAD DATA LOCAL INFILE price loader for never loaded files (MySQL)
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import datetime
+import os
+import tempfile
+
+from sqlalchemy import BigInteger
+from sqlalchemy import Date
+from sqlalchemy import and_
+from sqlalchemy import select
+from sqlalchemy import text
+
+from mythic_recorder.bulk_writer import PRICE_COLUMNS
+from mythic_recorder.price_sink import PriceSink
+
+STAGE_TABLE = """CREATE TEMPORARY TABLE IF NOT EXISTS `%s` (
+  `name_id` INT UNSIGNED NOT NULL,
+  `date` %s NOT NULL,
+  %s,
+  PRIMARY KEY (`name_id`, `date`))
+ENGINE = InnoDB"""
+
+def stage_columns(table, quote):
+    """
+    staged price columns typed as in the target, so a value is rejected (or not) by both alike
+    :param table: price_session or price_intraday table
+    :param quote: identifier quote character
+    :return: column definitions
+    """
+    results = []
+    for column in PRICE_COLUMNS:
+        if isinstance(table.c[column].type, BigInteger):
+            results.append("%s%s%s BIGINT NOT NULL" % (quote, column, quote))
+        else:
+            results.append("%s%s%s INT NOT NULL" % (quote, column, quote))
+
+    return ",\n  ".join(results)
+
+class InfileLoader(PriceSink):
+    """
+    Whole file loader for files discovery has never seen, where (almost) every row is fresh.
+    Rows are written to a temporary TSV, loaded w/LOAD DATA LOCAL INFILE into a per connection staging table,
+    classified w/one join and merged w/one INSERT ... SELECT ... ON DUPLICATE KEY UPDATE.
+    Same append() and counters as BulkWriter, requires local_infile on client and server.
+    """
+
+    def __init__(self, session, table, task_id):
+        """
+        ctor
+        :param session: database session
+        :param table: price_session or price_intraday table
+        :param task_id: parent task id
+        """
+        super().__init__()
+
+        self.session = session
+        self.table = table
+        self.task_id = task_id
+
+        self.stage_name = "%s_stage" % table.name
+
+        # price_session.date is a DATE, parsed values are datetime
+        self.date_only = isinstance(table.c.date.type, Date)
+
+        # (name_id, date) => values, last occurrence wins
+        self.rows = {}
+
+        # (name_id, date) => first values, for rows repeated w/different values (see reclassify)
+        self.firsts = {}
+
+    def append(self, name_id, date, open_price, high_price, low_price, close_price, volume, open_interest):
+        """
+        add a price row, repeated rows within the file are classified against the previous occurrence
+        :return: None
+        """
+        if self.date_only and isinstance(date, datetime.datetime):
+            date = date.date()
+
+        key = (name_id, date)
+        values = (open_price, high_price, low_price, close_price, volume, open_interest)
+
+        current = self.rows.get(key)
+        if current is not None:
+            if current == values:
+                self.duplicate_row_counter = 1 + self.duplicate_row_counter
+            else:
+                self.update_row_counter = 1 + self.update_row_counter
+                self.firsts.setdefault(key, current)
+
+        self.rows[key] = values
+
+        return None
+
+    def write_tsv(self, out_file):
+        """
+        :param out_file: text file
+        :return: None
+        """
+        for (name_id, date), values in self.rows.items():
+            out_file.write("%d\t%s\t%d\t%d\t%d\t%d\t%d\t%d\n" % ((name_id, str(date)) + values))
+
+        return None
+
+    def stage(self, file_name):
+        """
+        (re)create the staging table and load the TSV
+        :param file_name: TSV file name
+        :return: None
+        """
+        if self.date_only:
+            date_type = 'DATE'
+        else:
+            date_type = 'DATETIME'
+
+        self.session.execute(text(STAGE_TABLE % (self.stage_name, date_type, stage_columns(self.table, '`'))))
+
+        # TRUNCATE of a temporary table does not commit
+        self.session.execute(text("TRUNCATE TABLE `%s`" % self.stage_name))
+
+        self.session.execute(text("LOAD DATA LOCAL INFILE '%s' INTO TABLE `%s` FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' (name_id, date, %s)" %
+                                  (file_name.replace("'", "''"), self.stage_name, ", ".join(PRICE_COLUMNS))))
+
+        return None
+
+    def classify(self):
+        """
+        count staged rows which are fresh, equal to or different from rows already stored, portable SQL (CopyLoader)
+        :return: None
+        """
+        equal = " AND ".join("target.%s = stage.%s" % (column, column) for column in PRICE_COLUMNS)
+
+        statement = "SELECT COUNT(*), COALESCE(SUM(CASE WHEN target.name_id IS NULL THEN 1 ELSE 0 END), 0), COALESCE(SUM(CASE WHEN %s THEN 1 ELSE 0 END), 0) " \
+                    "FROM %s stage LEFT JOIN %s target ON target.name_id = stage.name_id AND target.date = stage.date" % \
+                    (equal, self.stage_name, self.table.name)
+
+        population, fresh, duplicate = self.session.execute(text(statement)).first()
+
+        self.fresh_row_counter = int(fresh) + self.fresh_row_counter
+        self.duplicate_row_counter = int(duplicate) + self.duplicate_row_counter
+        self.update_row_counter = int(population - fresh - duplicate) + self.update_row_counter
+
+        return None
+
+    def reclassify(self):
+        """
+        classify() compares the last occurrence of each row, BulkWriter (and the row path) the first.
+        rows repeated w/different values are rare, those already stored are selected and recounted.
+        :return: None
+        """
+        if len(self.firsts) < 1:
+            return None
+
+        name_ids = set()
+        dates = []
+        for name_id, date in self.firsts.keys():
+            name_ids.add(name_id)
+            dates.append(date)
+
+        columns = [self.table.c.name_id, self.table.c.date] + [self.table.c[column] for column in PRICE_COLUMNS]
+        query = select(columns).where(and_(self.table.c.name_id.in_(name_ids), self.table.c.date.between(min(dates), max(dates))))
+
+        for row in self.session.execute(query):
+            key = (row[0], row[1])
+            first = self.firsts.get(key)
+            if first is None:
+                continue
+
+            selected = tuple(row[2:])
+            if selected == self.rows[key]:
+                self.duplicate_row_counter = self.duplicate_row_counter - 1
+            else:
+                self.update_row_counter = self.update_row_counter - 1
+
+            if selected == first:
+                self.duplicate_row_counter = 1 + self.duplicate_row_counter
+            else:
+                self.update_row_counter = 1 + self.update_row_counter
+
+        self.firsts = {}
+
+        return None
+
+    def merge(self):
+        """
+        move staged rows into the price table w/one statement
+        :return: None
+        """
+        columns = ", ".join(PRICE_COLUMNS)
+        updates = ", ".join("%s = VALUES(%s)" % (column, column) for column in PRICE_COLUMNS)
+
+        statement = "INSERT INTO `%s` (task_id, name_id, date, %s) SELECT :task_id, name_id, date, %s FROM `%s` ON DUPLICATE KEY UPDATE %s" % \
+                    (self.table.name, columns, columns, self.stage_name, updates)
+
+        self.session.execute(text(statement), {'task_id': self.task_id})
+
+        return None
+
+    def flush(self):
+        """
+        stage, classify and merge all appended rows
+        :return: None
+        """
+        if len(self.rows) < 1:
+            return None
+
+        temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.tsv', delete=False)
+        try:
+            with temp_file:
+                self.write_tsv(temp_file)
+
+            self.stage(temp_file.name)
+        finally:
+            os.remove(temp_file.name)
+
+        self.classify()
+        self.reclassify()
+        self.merge()
+
+        self.rows = {}
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
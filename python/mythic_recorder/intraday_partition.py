@@ -0,0 +1,174 @@
+#
+# Title: intraday_partition.py
+# Description: migrate and maintain the clustered, partitioned price_intraday layout (MySQL)
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import datetime
+
+from sqlalchemy import text
+
+TABLES = ('application_log', 'exchange', 'file_stat', 'load_log', 'load_log_summary', 'name', 'price_intraday', 'price_session', 'task_log')
+
+COMPACT_COLUMNS = "task_id, name_id, date, open_price, high_price, low_price, close_price, volume, open_interest"
+
+COMPACT_TABLE = """CREATE TABLE `%s` (
+  `task_id` INT UNSIGNED NOT NULL,
+  `name_id` INT UNSIGNED NOT NULL,
+  `date` DATETIME NOT NULL,
+  `open_price` INT NOT NULL,
+  `high_price` INT NOT NULL,
+  `low_price` INT NOT NULL,
+  `close_price` INT NOT NULL,
+  `volume` BIGINT NOT NULL,
+  `open_interest` INT NOT NULL,
+  PRIMARY KEY (`name_id`, `date`))
+ENGINE = InnoDB
+PARTITION BY RANGE (TO_DAYS(`date`)) (
+%s)"""
+
+def first_of_month(arg):
+    return datetime.date(arg.year, arg.month, 1)
+
+def next_month(arg):
+    if arg.month == 12:
+        return datetime.date(arg.year + 1, 1, 1)
+
+    return datetime.date(arg.year, arg.month + 1, 1)
+
+def partition_clause(month):
+    """
+    :param month: first day of month
+    :return: partition definition holding that month
+    """
+    return "PARTITION `p%04d%02d` VALUES LESS THAN (TO_DAYS('%s'))" % (month.year, month.month, next_month(month).isoformat())
+
+class IntradayPartition:
+    """
+    Convert price_intraday from a surrogate id table to one clustered on (name_id, date) w/monthly partitions,
+    and split p_max into monthly partitions ahead of fresh data.
+    """
+
+    def __init__(self, engine, database):
+        """
+        ctor
+        :param engine: MySQL engine
+        :param database: schema name
+        """
+        self.engine = engine
+        self.database = database
+        self.facility = 'intraday_partition'
+
+    def scalar(self, connection, statement, **parameters):
+        return connection.execute(text(statement), **parameters).scalar()
+
+    def drop_redundant_indexes(self, connection):
+        """
+        PRIMARY KEY (id) already enforces uniqueness, id_UNIQUE is a second B-tree w/the same content
+        :param connection: database connection
+        :return: list of tables altered
+        """
+        altered = []
+        for table in TABLES:
+            population = self.scalar(connection, "select count(*) from information_schema.statistics where table_schema = :schema and table_name = :table and index_name = 'id_UNIQUE'", schema=self.database, table=table)
+            if population > 0:
+                connection.execute(text("ALTER TABLE `%s` DROP INDEX `id_UNIQUE`" % table))
+                altered.append(table)
+
+        return altered
+
+    def legacy_layout(self, connection):
+        """
+        :param connection: database connection
+        :return: True if price_intraday still has a surrogate id
+        """
+        population = self.scalar(connection, "select count(*) from information_schema.columns where table_schema = :schema and table_name = 'price_intraday' and column_name = 'id'", schema=self.database)
+        return population > 0
+
+    def migrate(self, months_ahead, chunk_size):
+        """
+        copy price_intraday into the compact partitioned layout, then swap tables.
+        the original table is kept as price_intraday_legacy for the operator to drop.
+        :param months_ahead: empty monthly partitions to create past the newest row
+        :param chunk_size: name_id population per INSERT ... SELECT
+        :return: None
+        """
+        with self.engine.connect() as connection:
+            print("dropped id_UNIQUE from:%s" % self.drop_redundant_indexes(connection))
+
+            if not self.legacy_layout(connection):
+                print("price_intraday already compact")
+                return None
+
+            oldest = self.scalar(connection, "select min(date) from price_intraday")
+            newest = self.scalar(connection, "select max(date) from price_intraday")
+            if oldest is None:
+                oldest = newest = datetime.datetime.utcnow()
+
+            partitions = []
+            month = first_of_month(oldest)
+            stop = first_of_month(newest)
+            for ndx in range(months_ahead):
+                stop = next_month(stop)
+
+            while month <= stop:
+                partitions.append(partition_clause(month))
+                month = next_month(month)
+
+            partitions.append("PARTITION `p_max` VALUES LESS THAN MAXVALUE")
+
+            connection.execute(text("DROP TABLE IF EXISTS `price_intraday_compact`"))
+            connection.execute(text(COMPACT_TABLE % ('price_intraday_compact', ",\n".join("  %s" % partition for partition in partitions))))
+
+            # copy in primary key order, one name_id range per statement
+            high_id = self.scalar(connection, "select max(name_id) from price_intraday") or 0
+            for low in range(0, high_id + 1, chunk_size):
+                connection.execute(text("INSERT INTO price_intraday_compact (%s) SELECT %s FROM price_intraday WHERE name_id >= :low AND name_id < :high ORDER BY name_id, date" % (COMPACT_COLUMNS, COMPACT_COLUMNS)), low=low, high=low + chunk_size)
+                print("copied name_id < %d" % (low + chunk_size))
+
+            legacy_population = self.scalar(connection, "select count(*) from price_intraday")
+            compact_population = self.scalar(connection, "select count(*) from price_intraday_compact")
+            if legacy_population != compact_population:
+                raise ValueError("row count mismatch:%d vs %d" % (legacy_population, compact_population))
+
+            connection.execute(text("RENAME TABLE price_intraday TO price_intraday_legacy, price_intraday_compact TO price_intraday"))
+            print("migrated %d rows, %d partitions" % (compact_population, len(partitions)))
+
+        return None
+
+    def extend(self, months_ahead):
+        """
+        split p_max so monthly partitions exist through months_ahead past the current month.
+        cheap while p_max is empty, i.e. before the load which needs the fresh months.
+        :param months_ahead: months to provision
+        :return: population of fresh partitions
+        """
+        with self.engine.connect() as connection:
+            newest = self.scalar(connection, "select max(cast(partition_description as unsigned)) from information_schema.partitions where table_schema = :schema and table_name = 'price_intraday' and partition_name <> 'p_max'", schema=self.database)
+
+            if newest is None:
+                month = first_of_month(datetime.date.today())
+            else:
+                # partition_description is TO_DAYS of the exclusive upper bound
+                month = datetime.date.fromordinal(int(newest) - 365)
+
+            stop = first_of_month(datetime.date.today())
+            for ndx in range(months_ahead):
+                stop = next_month(stop)
+
+            partitions = []
+            while month <= stop:
+                partitions.append(partition_clause(month))
+                month = next_month(month)
+
+            if len(partitions) < 1:
+                return 0
+
+            partitions.append("PARTITION `p_max` VALUES LESS THAN MAXVALUE")
+            connection.execute(text("ALTER TABLE price_intraday REORGANIZE PARTITION p_max INTO (%s)" % ", ".join(partitions)))
+
+        return len(partitions) - 1
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
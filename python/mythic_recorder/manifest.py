@@ -0,0 +1,86 @@
+#
+# Title: manifest.py
+# Description: local manifest of file stat metadata for cheap change detection
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import json
+import os
+
+class Manifest:
+    """
+    Persisted map of normalized file name to (size, mtime, inode) and sha1 hash.
+    A file whose stat metadata matches the manifest (and whose hash matches file_stat) is not hashed again.
+    """
+
+    def __init__(self, file_name):
+        """
+        ctor
+        :param file_name: manifest file name, empty means no manifest
+        """
+        self.file_name = file_name
+
+        # normalized name => [size, mtime, inode, sha1]
+        self.entries = {}
+
+    def load(self):
+        """
+        read manifest, a missing or damaged manifest is treated as empty
+        :return: None
+        """
+        if len(self.file_name) < 1 or not os.path.exists(self.file_name):
+            return None
+
+        try:
+            with open(self.file_name, 'r') as in_file:
+                self.entries = json.load(in_file)
+        except ValueError:
+            self.entries = {}
+
+        return None
+
+    def save(self):
+        """
+        write manifest via a temporary file so a crash never leaves a partial manifest
+        :return: None
+        """
+        if len(self.file_name) < 1:
+            return None
+
+        temp_name = "%s.tmp" % self.file_name
+        with open(temp_name, 'w') as out_file:
+            json.dump(self.entries, out_file)
+
+        os.replace(temp_name, self.file_name)
+
+        return None
+
+    def select(self, normalized_name, stat_key):
+        """
+        :param normalized_name: file name w/parent directory
+        :param stat_key: (size, mtime, inode)
+        :return: sha1 hash if stat metadata is unchanged, else None
+        """
+        entry = self.entries.get(normalized_name)
+        if entry is None:
+            return None
+
+        if tuple(entry[:3]) != tuple(stat_key):
+            return None
+
+        return entry[3]
+
+    def put(self, normalized_name, stat_key, sha1_hash):
+        """
+        :param normalized_name: file name w/parent directory
+        :param stat_key: (size, mtime, inode)
+        :param sha1_hash: file hash
+        :return: None
+        """
+        self.entries[normalized_name] = [stat_key[0], stat_key[1], stat_key[2], sha1_hash]
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
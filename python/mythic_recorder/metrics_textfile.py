@@ -0,0 +1,101 @@
+#
+# Title: metrics_textfile.py
+# Description: write ParseSummary rows as a Prometheus node_exporter textfile
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import os
+
+from mythic_recorder.stage_timer import STAGES
+
+class MetricsTextfile:
+    """
+    Render the most recent task as gauges for the node_exporter textfile collector.
+    The file is replaced atomically so the collector never reads a partial file.
+    """
+
+    def __init__(self, file_name):
+        """
+        ctor
+        :param file_name: textfile name, should end in .prom
+        """
+        self.file_name = file_name
+
+    def render(self, task_id, summaries, pool_values=None):
+        """
+        :param task_id: parent task id
+        :param summaries: ParseSummary rows for task
+        :param pool_values: PoolMetrics values, None omits connection metrics
+        :return: textfile contents
+        """
+        lines = []
+
+        lines.append('# HELP mythic_recorder_task_id Task which produced these metrics.')
+        lines.append('# TYPE mythic_recorder_task_id gauge')
+        lines.append("mythic_recorder_task_id %d" % task_id)
+
+        lines.append('# HELP mythic_recorder_stage_seconds Price load time by exchange and stage.')
+        lines.append('# TYPE mythic_recorder_stage_seconds gauge')
+        for summary in summaries:
+            for stage in STAGES:
+                lines.append('mythic_recorder_stage_seconds{exchange="%s",stage="%s"} %.6f' % (summary.exchange, stage, getattr(summary, "%s_duration" % stage)))
+
+        lines.append('# HELP mythic_recorder_statements SQL statements by exchange and kind.')
+        lines.append('# TYPE mythic_recorder_statements gauge')
+        for summary in summaries:
+            lines.append('mythic_recorder_statements{exchange="%s",kind="select"} %d' % (summary.exchange, summary.select_pop))
+            lines.append('mythic_recorder_statements{exchange="%s",kind="write"} %d' % (summary.exchange, summary.write_pop))
+
+        lines.append('# HELP mythic_recorder_files Price files loaded by exchange.')
+        lines.append('# TYPE mythic_recorder_files gauge')
+        for summary in summaries:
+            lines.append('mythic_recorder_files{exchange="%s"} %d' % (summary.exchange, summary.file_pop))
+
+        lines.append('# HELP mythic_recorder_rows Price rows read by exchange.')
+        lines.append('# TYPE mythic_recorder_rows gauge')
+        for summary in summaries:
+            lines.append('mythic_recorder_rows{exchange="%s"} %d' % (summary.exchange, summary.total_pop))
+
+        lines.append('# HELP mythic_recorder_seconds Price load time by exchange.')
+        lines.append('# TYPE mythic_recorder_seconds gauge')
+        for summary in summaries:
+            lines.append('mythic_recorder_seconds{exchange="%s"} %.6f' % (summary.exchange, summary.duration))
+
+        if pool_values is not None:
+            lines.append('# HELP mythic_recorder_connections Database connections opened, w/setup time.')
+            lines.append('# TYPE mythic_recorder_connections gauge')
+            lines.append("mythic_recorder_connections %d" % pool_values['connect_pop'])
+            lines.append('mythic_recorder_connect_seconds %.6f' % pool_values['connect_duration'])
+
+            lines.append('# HELP mythic_recorder_checkouts Connections drawn from the pool.')
+            lines.append('# TYPE mythic_recorder_checkouts gauge')
+            lines.append("mythic_recorder_checkouts %d" % pool_values['checkout_pop'])
+
+            lines.append('# HELP mythic_recorder_commits Session commits (flush and COMMIT), w/elapsed time.')
+            lines.append('# TYPE mythic_recorder_commits gauge')
+            lines.append("mythic_recorder_commits %d" % pool_values['commit_pop'])
+            lines.append('mythic_recorder_commit_seconds %.6f' % pool_values['commit_duration'])
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, task_id, summaries, pool_values=None):
+        """
+        :param task_id: parent task id
+        :param summaries: ParseSummary rows for task
+        :param pool_values: PoolMetrics values, None omits connection metrics
+        :return: None
+        """
+        if len(self.file_name) < 1:
+            return None
+
+        temp_name = "%s.tmp" % self.file_name
+        with open(temp_name, 'w') as out_file:
+            out_file.write(self.render(task_id, summaries, pool_values))
+
+        os.replace(temp_name, self.file_name)
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
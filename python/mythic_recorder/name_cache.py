@@ -0,0 +1,99 @@
+#
+# Title: name_cache.py
+# Description: in memory symbol to name.id resolution
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+from mythic_recorder.sql_table import YIELD_SIZE
+from mythic_recorder.sql_table import Name
+
+class NameCache:
+    """
+    Symbol to name.id dictionary, one per exchange.
+    Each exchange is loaded once per run w/a single query, then maintained as names and stubs are inserted.
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        # exchange_id => {symbol => name_id}
+        self.exchanges = {}
+
+    def load(self, session, exchange_id):
+        """
+        load all active symbols for an exchange
+        :param session: database session
+        :param exchange_id: exchange.id
+        :return: symbol dictionary
+        """
+        symbols = {}
+
+        selected_set = session.query(Name.symbol, Name.id).filter_by(exchange_id=exchange_id, active_flag=True).order_by(Name.id).yield_per(YIELD_SIZE)
+        for symbol, name_id in selected_set:
+            symbols.setdefault(symbol, name_id)
+
+        self.exchanges[exchange_id] = symbols
+
+        return symbols
+
+    def get_symbols(self, session, exchange_id):
+        """
+        :param session: database session
+        :param exchange_id: exchange.id
+        :return: symbol dictionary, loaded on first reference
+        """
+        symbols = self.exchanges.get(exchange_id)
+        if symbols is None:
+            symbols = self.load(session, exchange_id)
+
+        return symbols
+
+    def select(self, session, exchange_id, symbol):
+        """
+        :param session: database session
+        :param exchange_id: exchange.id
+        :param symbol: ticker symbol
+        :return: name.id or None
+        """
+        return self.get_symbols(session, exchange_id).get(symbol)
+
+    def put(self, exchange_id, symbol, name_id):
+        """
+        register a freshly inserted name, ignored if exchange not yet loaded
+        :param exchange_id: exchange.id
+        :param symbol: ticker symbol
+        :param name_id: name.id
+        :return: None
+        """
+        symbols = self.exchanges.get(exchange_id)
+        if symbols is not None:
+            symbols.setdefault(symbol, name_id)
+
+        return None
+
+    def invalidate(self):
+        """
+        forget all exchanges, i.e. after a rollback discarded fresh names
+        :return: None
+        """
+        self.exchanges = {}
+
+        return None
+
+    def discard(self, exchange_id, symbol):
+        """
+        forget a symbol which is no longer active
+        :param exchange_id: exchange.id
+        :param symbol: ticker symbol
+        :return: None
+        """
+        symbols = self.exchanges.get(exchange_id)
+        if symbols is not None:
+            symbols.pop(symbol, None)
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
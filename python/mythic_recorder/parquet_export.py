@@ -0,0 +1,295 @@
+#
+# Title: parquet_export.py
+# Description: incremental parquet export of loaded prices, partitioned by exchange and month
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import datetime
+import json
+import os
+import re
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from sqlalchemy import and_
+from sqlalchemy import func
+from sqlalchemy import select
+
+from mythic_recorder.intraday_partition import first_of_month
+from mythic_recorder.intraday_partition import next_month
+from mythic_recorder.sql_table import Exchange
+from mythic_recorder.sql_table import LoadLog
+from mythic_recorder.sql_table import Name
+from mythic_recorder.sql_table import PriceIntraDay
+from mythic_recorder.sql_table import PriceSession
+
+# session date from price file name, i.e. NYSE_20180430.csv
+FILE_DATE = re.compile(r'_(\d{8})\.csv$')
+
+# rows fetched per round trip
+FETCH_SIZE = 50000
+
+PRICE_COLUMNS = ('open_price', 'high_price', 'low_price', 'close_price')
+
+class ParquetExport:
+    """
+    Write price_session and price_intraday to parquet files, hive partitioned:
+    <directory>/<table>/exchange=NYSE/month=2018-04/part-0.parquet
+    Progress is the highest load_log.update_task_id exported, kept in export_state.json, and never reaches
+    a task which has price files still loading.  Each run
+    rewrites only the (exchange, month) partitions touched by price files loaded since, so rows
+    updated by a later file never appear twice.  Prices are dollars.  Requires pyarrow.
+    """
+
+    def __init__(self, session, directory):
+        """
+        ctor
+        :param session: database session
+        :param directory: export root directory
+        """
+        self.session = session
+        self.directory = directory
+        self.state_file = os.path.join(directory, 'export_state.json')
+
+        # highest exported task id
+        self.task_id = 0
+
+        self.partition_counter = 0
+        self.row_counter = 0
+
+    @staticmethod
+    def available():
+        return pyarrow is not None
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return None
+
+        with open(self.state_file, 'r') as in_file:
+            self.task_id = json.load(in_file).get('task_id', 0)
+
+        return None
+
+    def save_state(self):
+        temp_name = "%s.tmp" % self.state_file
+        with open(temp_name, 'w') as out_file:
+            json.dump({'task_id': self.task_id}, out_file)
+
+        os.replace(temp_name, self.state_file)
+
+        return None
+
+    def all_months(self, table):
+        """
+        :param table: price table
+        :return: every month w/rows
+        """
+        first, last = self.session.query(func.min(table.c.date), func.max(table.c.date)).one()
+        if first is None:
+            return []
+
+        results = []
+        month = first_of_month(first)
+        while month <= first_of_month(last):
+            results.append(month)
+            month = next_month(month)
+
+        return results
+
+    def select_dirty(self):
+        """
+        partitions touched by price files completed since the last export
+        :return: table name => {month => set of lower case exchange codes}, highest task id
+        """
+        results = {PriceSession.__tablename__: {}, PriceIntraDay.__tablename__: {}}
+        undated = {PriceSession.__tablename__: set(), PriceIntraDay.__tablename__: set()}
+
+        task_id = self.task_id
+
+        selected_set = self.session.query(LoadLog.exchange, LoadLog.normalized_name, LoadLog.update_task_id).\
+            filter(LoadLog.update_task_id > self.task_id, LoadLog.complete_flag == True, LoadLog.normalized_name.like('%.csv'))
+
+        for exchange, normalized_name, update_task_id in selected_set:
+            task_id = max(task_id, update_task_id)
+            exchange = exchange.lower()
+
+            # i.e. AMEX/5/AMEX_20180430.csv, see EodFile.is_intraday
+            if len(normalized_name.split('/')) == 3:
+                table_name = PriceIntraDay.__tablename__
+            else:
+                table_name = PriceSession.__tablename__
+
+            match = FILE_DATE.search(normalized_name)
+            if match is None:
+                undated[table_name].add(exchange)
+                continue
+
+            file_date = datetime.datetime.strptime(match.group(1), '%Y%m%d')
+            results[table_name].setdefault(first_of_month(file_date), set()).add(exchange)
+
+        for table in (PriceSession.__table__, PriceIntraDay.__table__):
+            if len(undated[table.name]) < 1:
+                continue
+
+            for month in self.all_months(table):
+                results[table.name].setdefault(month, set()).update(undated[table.name])
+
+        # a task w/files still loading completes them later under the same update_task_id
+        task_id = min(task_id, self.select_pending() - 1)
+
+        return results, max(task_id, self.task_id)
+
+    def select_pending(self):
+        """
+        :return: lowest task id which started or resumed a price file not yet complete, else a very large id
+        """
+        results = 2 ** 63 - 1
+
+        selected_set = self.session.query(LoadLog.creation_task_id, LoadLog.update_task_id).\
+            filter(LoadLog.complete_flag == False, LoadLog.normalized_name.like('%.csv')).distinct()
+
+        for creation_task_id, update_task_id in selected_set:
+            results = min(results, max(creation_task_id, update_task_id))
+
+        return results
+
+    def partition_name(self, table_name, exchange, month):
+        return os.path.join(self.directory, table_name, "exchange=%s" % exchange, "month=%s" % month.strftime('%Y-%m'), 'part-0.parquet')
+
+    def make_schema(self, table):
+        if table.name == PriceIntraDay.__tablename__:
+            date_type = pyarrow.timestamp('s')
+        else:
+            date_type = pyarrow.date32()
+
+        return pyarrow.schema([('symbol', pyarrow.string()), ('name_id', pyarrow.int64()), ('date', date_type),
+                               ('open', pyarrow.float64()), ('high', pyarrow.float64()), ('low', pyarrow.float64()), ('close', pyarrow.float64()),
+                               ('volume', pyarrow.int64()), ('open_interest', pyarrow.int64()), ('task_id', pyarrow.int64())])
+
+    def make_batch(self, schema, rows):
+        """
+        :param schema: partition schema
+        :param rows: (exchange_id, symbol, name_id, date, open, high, low, close, volume, open_interest, task_id)
+        :return: pyarrow.RecordBatch
+        """
+        columns = list(zip(*rows))
+
+        arrays = [pyarrow.array(columns[1], pyarrow.string()), pyarrow.array(columns[2], pyarrow.int64()), pyarrow.array(columns[3], schema.field('date').type)]
+        for ndx in range(4):
+            arrays.append(pyarrow.array([value / 1000.0 for value in columns[4 + ndx]], pyarrow.float64()))
+        arrays.append(pyarrow.array(columns[8], pyarrow.int64()))
+        arrays.append(pyarrow.array(columns[9], pyarrow.int64()))
+        arrays.append(pyarrow.array(columns[10], pyarrow.int64()))
+
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def export_month(self, table, month, exchanges):
+        """
+        rewrite the partitions of one month for every dirty exchange w/one ordered scan
+        :param table: price table
+        :param month: first day of month
+        :param exchanges: {exchange.id => exchange.symbol}
+        :return: None
+        """
+        start = month
+        end = next_month(month)
+        if table.name == PriceIntraDay.__tablename__:
+            start = datetime.datetime.combine(start, datetime.time())
+            end = datetime.datetime.combine(end, datetime.time())
+
+        name = Name.__table__
+        columns = [name.c.exchange_id, name.c.symbol, table.c.name_id, table.c.date] + [table.c[column] for column in PRICE_COLUMNS] + \
+                  [table.c.volume, table.c.open_interest, table.c.task_id]
+
+        statement = select(columns).select_from(table.join(name, name.c.id == table.c.name_id)).\
+            where(and_(table.c.date >= start, table.c.date < end, name.c.exchange_id.in_(list(exchanges.keys())))).\
+            order_by(name.c.exchange_id, table.c.name_id, table.c.date)
+
+        schema = self.make_schema(table)
+
+        # exchange id => (temporary name, writer)
+        writers = {}
+        current_id = None
+        writer = None
+
+        result = self.session.connection().execution_options(stream_results=True).execute(statement)
+        try:
+            rows = result.fetchmany(FETCH_SIZE)
+            while len(rows) > 0:
+                start_ndx = 0
+                for ndx in range(len(rows) + 1):
+                    if ndx < len(rows) and rows[ndx][0] == current_id:
+                        continue
+
+                    if ndx > start_ndx:
+                        writer.write_batch(self.make_batch(schema, rows[start_ndx:ndx]))
+                        self.row_counter = ndx - start_ndx + self.row_counter
+
+                    if ndx < len(rows):
+                        current_id = rows[ndx][0]
+                        file_name = self.partition_name(table.name, exchanges[current_id], month)
+                        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+                        writer = pyarrow.parquet.ParquetWriter("%s.tmp" % file_name, schema, compression='zstd')
+                        writers[current_id] = ("%s.tmp" % file_name, writer)
+                        start_ndx = ndx
+
+                rows = result.fetchmany(FETCH_SIZE)
+        finally:
+            result.close()
+            for temp_name, open_writer in writers.values():
+                open_writer.close()
+
+        for exchange_id, symbol in exchanges.items():
+            file_name = self.partition_name(table.name, symbol, month)
+            if exchange_id in writers:
+                os.replace(writers[exchange_id][0], file_name)
+                self.partition_counter = 1 + self.partition_counter
+            elif os.path.exists(file_name):
+                # rows moved or vanished
+                os.remove(file_name)
+
+        self.session.commit()
+
+        return None
+
+    def execute(self):
+        """
+        export partitions touched since the last run
+        :return: highest exported task id
+        """
+        if pyarrow is None:
+            raise ValueError('parquet export requires pyarrow')
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.load_state()
+
+        dirty, task_id = self.select_dirty()
+
+        # lower case code => (exchange.id, exchange.symbol)
+        codes = {}
+        for row_id, symbol in self.session.query(Exchange.id, Exchange.symbol):
+            codes[symbol.lower()] = (row_id, symbol)
+
+        for table in (PriceSession.__table__, PriceIntraDay.__table__):
+            for month in sorted(dirty[table.name].keys()):
+                exchanges = {}
+                for code in dirty[table.name][month]:
+                    if code in codes:
+                        exchanges[codes[code][0]] = codes[code][1]
+
+                if len(exchanges) > 0:
+                    self.export_month(table, month, exchanges)
+
+        # only after every partition is in place, a failed run repeats
+        self.task_id = task_id
+        self.save_state()
+
+        return task_id
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
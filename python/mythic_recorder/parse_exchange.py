@@ -5,7 +5,6 @@
 # Author: G.S. Cole (guycole at gmail dot com)
 #
 import time
-import xmltodict
 
 from mythic_recorder.parse_parent import ParseParent
 from mythic_recorder.sql_table import Exchange
@@ -33,8 +32,10 @@ class ParseExchange(ParseParent):
         return True
 
     def parse_row(self, raw_buffer):
-        symbol = raw_buffer['@Code']
-        name = raw_buffer['@Name']
+        symbol, name = raw_buffer
+        if symbol is None or name is None:
+            self.fail_row_counter = 1 + self.fail_row_counter
+            return None
 
         return Exchange(symbol, name)
 
@@ -66,15 +67,14 @@ class ParseExchange(ParseParent):
     def execute(self):
         start_time = time.time()
 
-        with open(self.eod_file.full_name) as fd:
-            document = xmltodict.parse(fd.read())
-
-        exchanges = document['ArrayOfEXCHANGE']['EXCHANGE']
-        for element in exchanges:
+        for element in self.read_elements('EXCHANGE'):
             self.write(None, element)
 
         self.context.session.commit()
 
+        # pick up fresh or renamed exchanges
+        self.context.exchange_registry.invalidate()
+
         stop_time = time.time()
         self.duration = stop_time - start_time
 
@@ -5,11 +5,15 @@
 # Author: G.S. Cole (guycole at gmail dot com)
 #
 import time
-import xmltodict
+
+from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import select
 
 from mythic_recorder.parse_parent import ParseParent
 from mythic_recorder.sql_table import Name
 
+NAME_COLUMNS = ('name', 'put_call_flag', 'root_symbol_id', 'expiration', 'strike')
 
 class ParseName(ParseParent):
     """
@@ -49,8 +53,10 @@ class ParseName(ParseParent):
         return True
 
     def parse_row(self, exchange_id, raw_buffer):
-        symbol = raw_buffer['@Code']
-        name = raw_buffer['@Name']
+        symbol, name = raw_buffer
+        if symbol is None or name is None:
+            self.fail_row_counter = 1 + self.fail_row_counter
+            return None
 
         return Name(exchange_id, symbol, name)
 
@@ -80,22 +86,169 @@ class ParseName(ParseParent):
             self.context.alert_log.log_writer(self.facility, 4, "exception parse:%s, row ndx:%d, contents:%s" %
                                               (self.eod_file.normalized_file_name, self.total_row_counter, raw_buffer))
 
+    def select_active_names(self, exchange_id):
+        """
+        select all active names for an exchange w/one query
+        :param exchange_id: exchange.id
+        :return: dictionary of symbol => (id, name, put_call_flag, root_symbol_id, expiration, strike)
+        """
+        table = Name.__table__
+        columns = [table.c.symbol, table.c.id] + [table.c[column] for column in NAME_COLUMNS]
+        query = select(columns).where(and_(table.c.exchange_id == exchange_id, table.c.active_flag == True)).order_by(table.c.id)
+
+        results = {}
+        for row in self.context.session.execute(query):
+            results.setdefault(row[0], tuple(row[1:]))
+
+        return results
+
+    def insert_names(self, exchange_id, fresh_set):
+        """
+        insert fresh names w/one executemany, then register row ids w/the name cache
+        :param exchange_id: exchange.id
+        :param fresh_set: list of Name
+        :return: None
+        """
+        if len(fresh_set) < 1:
+            return None
+
+        rows = []
+        for name in fresh_set:
+            row = {"creation_task_id": self.context.task_id, "update_task_id": 0, "exchange_id": exchange_id,
+                   "symbol": name.symbol, "active_flag": True}
+            for column in NAME_COLUMNS:
+                row[column] = getattr(name, column)
+            rows.append(row)
+
+        self.context.session.execute(Name.__table__.insert(), rows)
+
+        symbols = [name.symbol for name in fresh_set]
+        selected_set = self.context.session.query(Name.symbol, Name.id).\
+            filter(Name.exchange_id == exchange_id, Name.active_flag == True, Name.symbol.in_(symbols))
+        for symbol, name_id in selected_set:
+            self.context.name_cache.put(exchange_id, symbol, name_id)
+
+        self.fresh_row_counter = len(fresh_set) + self.fresh_row_counter
+
+        return None
+
+    def update_names(self, update_set):
+        """
+        update changed names w/one executemany
+        :param update_set: list of (name.id, Name)
+        :return: None
+        """
+        if len(update_set) < 1:
+            return None
+
+        table = Name.__table__
+        values = {column: bindparam(column) for column in NAME_COLUMNS}
+        values['update_task_id'] = bindparam('b_task_id')
+        statement = table.update().where(table.c.id == bindparam('b_id')).values(values)
+
+        parameters = []
+        for row_id, name in update_set:
+            parameter = {column: getattr(name, column) for column in NAME_COLUMNS}
+            parameter['b_id'] = row_id
+            parameter['b_task_id'] = self.context.task_id
+            parameters.append(parameter)
+
+        self.context.session.execute(statement, parameters)
+
+        self.update_row_counter = len(update_set) + self.update_row_counter
+
+        return None
+
+    def deactivate_names(self, exchange_id, row_ids, symbols):
+        """
+        clear active_flag for symbols which vanished from the symbol list w/one statement
+        :param exchange_id: exchange.id
+        :param row_ids: name.id to deactivate
+        :param symbols: associated symbols
+        :return: None
+        """
+        if len(row_ids) < 1:
+            return None
+
+        self.context.session.query(Name).filter(Name.id.in_(row_ids)).\
+            update({"active_flag": False, "update_task_id": self.context.task_id}, synchronize_session=False)
+
+        for symbol in symbols:
+            self.context.name_cache.discard(exchange_id, symbol)
+
+        self.context.alert_log.log_writer(self.facility, 6, "deactivate:%s, %d names" % (self.eod_file.normalized_file_name, len(row_ids)))
+
+        return None
+
+    def execute_reconcile(self, exchange):
+        """
+        reconcile the symbol list against active names as set differences, each group is applied in bulk.
+        stub names (created by price files) are never deactivated, nor is anything if the list had no valid or any failed rows.
+        :param exchange: associated exchange
+        :return: None
+        """
+        fresh = {}
+        for element in self.read_elements('SYMBOL'):
+            name = self.parse_row(exchange.id, element)
+            if name is None:
+                continue
+
+            if name.symbol in fresh:
+                self.duplicate_row_counter = 1 + self.duplicate_row_counter
+
+            fresh[name.symbol] = name
+
+        current = self.select_active_names(exchange.id)
+
+        fresh_set = []
+        update_set = []
+        for symbol, name in fresh.items():
+            selected = current.get(symbol)
+            if selected is None:
+                fresh_set.append(name)
+            elif selected[1:] == tuple(getattr(name, column) for column in NAME_COLUMNS):
+                self.duplicate_row_counter = 1 + self.duplicate_row_counter
+            else:
+                update_set.append((selected[0], name))
+
+        row_ids = []
+        symbols = []
+        for symbol in set(current.keys()).difference(fresh.keys()):
+            selected = current[symbol]
+            if selected[1] != 'stub':
+                row_ids.append(selected[0])
+                symbols.append(symbol)
+
+        self.insert_names(exchange.id, fresh_set)
+        self.update_names(update_set)
+
+        # an empty or partly unreadable symbol list would deactivate names which are still listed
+        if len(fresh) < 1 or self.fail_row_counter > 0:
+            if len(row_ids) > 0:
+                self.context.alert_log.log_writer(self.facility, 4, "deactivate skipped:%s, %d valid rows, %d failed rows, %d names" %
+                                                  (self.eod_file.normalized_file_name, len(fresh), self.fail_row_counter, len(row_ids)))
+        else:
+            self.deactivate_names(exchange.id, row_ids, symbols)
+
+        return None
+
     def execute(self):
         start_time = time.time()
 
         self.context.alert_log.log_writer(self.facility, 6, "start:%s" % self.eod_file.normalized_file_name)
 
-        exchange = self.select_exchange(self.eod_file.get_exchange())
+        exchange = self.context.exchange_registry.select(self.context.session, self.eod_file.get_exchange())
         if exchange is None:
             self.context.alert_log.log_writer(self.facility, 4, "skipping unknown exchange:%s" % self.eod_file.normalized_file_name)
             return False
 
-        with open(self.eod_file.full_name) as in_file:
-            document = xmltodict.parse(in_file.read())
+        if self.context.reconcile_names:
+            self.execute_reconcile(exchange)
+        else:
+            for element in self.read_elements('SYMBOL'):
+                self.write(exchange, element)
 
-        names = document['ArrayOfSYMBOL']['SYMBOL']
-        for element in names:
-            self.write(exchange, element)
+            self.register_fresh_names()
 
         self.context.session.commit()
 
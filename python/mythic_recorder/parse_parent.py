@@ -4,10 +4,12 @@
 # Development Environment: OS X 10.13.3/Python 3.6.4
 # Author: G.S. Cole (guycole at gmail dot com)
 #
+from xml.etree import ElementTree
+
+from sqlalchemy import func
+
 from mythic_recorder.sql_table import Exchange
 from mythic_recorder.sql_table import Name
-from mythic_recorder.sql_table import PriceIntraDay
-from mythic_recorder.sql_table import PriceSession
 
 class ParseParent:
     """
@@ -20,6 +22,7 @@ class ParseParent:
         self.facility = facility
 
         self.current_row = ''
+        self.fresh_names = []
         self.duplicate_row_counter = 0
         self.duration = 0
         self.fail_row_counter = 0
@@ -32,6 +35,22 @@ class ParseParent:
     def __repr__(self):
         return "%s(%d, %d, %d, %d, %s)" % (self.facility, self.fresh_row_counter, self.duplicate_row_counter, self.update_row_counter, self.fail_row_counter, self.eod_file.normalized_file_name)
 
+    def read_elements(self, tag):
+        """
+        stream (Code, Name) tuples from an eoddata XML file w/iterparse.
+        elements are discarded as consumed so memory remains flat as files grow.
+        :param tag: element tag, i.e. SYMBOL or EXCHANGE
+        :return: generator of (Code, Name) tuples, attributes may be None
+        """
+        with self.eod_file.open_binary() as in_file:
+            events = ElementTree.iterparse(in_file, events=('start', 'end'))
+
+            event, root = next(events)
+            for event, element in events:
+                if event == 'end' and element.tag == tag:
+                    yield element.get('Code'), element.get('Name')
+                    root.clear()
+
     def insert_exchange(self, exchange):
         exchange.creation_task_id = self.context.alert_log.task_id
         self.context.session.add(exchange)
@@ -39,7 +58,8 @@ class ParseParent:
         return exchange
 
     def select_exchange(self, symbol):
-        return self.context.session.query(Exchange).filter_by(symbol=symbol).first()
+        # exchange.symbol is upper case, MySQL collation ignores case but SQLite does not
+        return self.context.session.query(Exchange).filter(func.lower(Exchange.symbol) == symbol.lower()).first()
 
     def update_exchange(self, row_id, exchange):
         self.context.session.query(Exchange).with_for_update().filter_by(id=row_id).update({"update_task_id":self.context.alert_log.task_id, "name":exchange.name})
@@ -49,46 +69,35 @@ class ParseParent:
     def insert_name(self, name):
         name.creation_task_id = self.context.alert_log.task_id
         self.context.session.add(name)
+        self.fresh_names.append(name)
         self.fresh_row_counter = 1 + self.fresh_row_counter
         return name
 
-    def select_name(self, symbol, exchange_id):
-        return self.context.session.query(Name).filter_by(symbol=symbol, exchange_id=exchange_id, active_flag=True).first()
+    def register_fresh_names(self):
+        """
+        flush inserted names to obtain row ids, then add them to the name cache
+        """
+        if len(self.fresh_names) < 1:
+            return
 
-    def update_name(self, row_id, name):
-        task_id = self.context.alert_log.task_id
-        self.context.session.query(Name).with_for_update().filter_by(id=row_id).update({"update_task_id": task_id, "name":name.name, "root_symbol_id":name.root_symbol_id, "expiration":name.expiration, "put_call_flag":name.put_call_flag, "strike":name.strike})
-        self.update_row_counter = 1 + self.update_row_counter
-        return name
+        self.context.session.flush()
 
-    def insert_intraday_price(self, price):
-        price.creation_task_id = self.context.alert_log.task_id
-        self.context.session.add(price)
-        self.fresh_row_counter = 1 + self.fresh_row_counter
-        return price
-
-    def select_intraday_price(self, name_id, date_time):
-        return self.context.session.query(PriceIntraDay).filter_by(name_id=name_id, date=date_time).first()
+        for name in self.fresh_names:
+            self.context.name_cache.put(name.exchange_id, name.symbol, name.id)
 
-    def update_intraday_price(self, row_id, price):
-        self.context.session.query(PriceIntraDay).with_for_update().filter_by(id=row_id).update({"open_price":price.open_price, "high_price":price.high_price, "low_price":price.low_price, "close_price":price.close_price, "volume":price.volume, "open_interest": price.open_interest})
-        self.update_row_counter = 1 + self.update_row_counter
-        return price
+        self.fresh_names = []
 
-    def insert_session_price(self, price):
-        price.creation_task_id = self.context.alert_log.task_id
-        self.context.session.add(price)
-        self.fresh_row_counter = 1 + self.fresh_row_counter
-        return price
+    def select_name(self, symbol, exchange_id):
+        return self.context.session.query(Name).filter_by(symbol=symbol, exchange_id=exchange_id, active_flag=True).first()
 
-    def select_session_price(self, name_id, date):
-        return self.context.session.query(PriceSession).filter_by(name_id=name_id, date=date).first()
+    def select_name_id(self, symbol, exchange_id):
+        return self.context.name_cache.select(self.context.session, exchange_id, symbol)
 
-    def update_session_price(self, row_id, price):
+    def update_name(self, row_id, name):
         task_id = self.context.alert_log.task_id
-        self.context.session.query(PriceSession).with_for_update().filter_by(id=row_id).update({"open_price":price.open_price, "high_price":price.high_price, "low_price":price.low_price, "close_price":price.close_price, "volume":price.volume, "open_interest": price.open_interest})
+        self.context.session.query(Name).with_for_update().filter_by(id=row_id).update({"update_task_id": task_id, "name":name.name, "root_symbol_id":name.root_symbol_id, "expiration":name.expiration, "put_call_flag":name.put_call_flag, "strike":name.strike})
         self.update_row_counter = 1 + self.update_row_counter
-        return price
+        return name
 
 #;;; Local Variables: ***
 #;;; mode:python ***
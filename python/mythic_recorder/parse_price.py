@@ -7,11 +7,21 @@
 import datetime
 import time
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mythic_recorder.bar_store import BarSink
+from mythic_recorder.columnar import IntradayColumns
 from mythic_recorder.parse_parent import ParseParent
+from mythic_recorder.price_reader import PriceReader
+from mythic_recorder.price_sink import TeeSink
+from mythic_recorder.row_writer import RowWriter
+from mythic_recorder.sql_table import LoadLog
 from mythic_recorder.sql_table import Name
 from mythic_recorder.sql_table import PriceIntraDay
 from mythic_recorder.sql_table import PriceSession
-from mythic_recorder.utility import Utility
 
 
 class ParsePrice(ParseParent):
@@ -19,150 +29,448 @@ class ParsePrice(ParseParent):
     Parse and load a price file
     """
 
-    def __init__(self, context, eod_file):
+    def __init__(self, context, eod_file, load_log=None):
+        """
+        ctor
+        :param context: runtime context
+        :param eod_file: price file
+        :param load_log: associated LoadLog row, required for checkpoints
+        """
         super().__init__(context, eod_file, 'parse_price')
 
+        self.load_log = load_log
+        self.price_reader = PriceReader()
+
     def insert_stub_name(self, exchange_id, symbol):
+        """
+        insert a single stub name, flushed (not committed) to obtain the row id
+        :param exchange_id: exchange.id
+        :param symbol: undefined ticker symbol
+        :return: name.id
+        """
         name = Name(exchange_id, symbol, 'stub')
         name.creation_task_id = self.context.task_id
 
-        name.root_symbol_id = 0
-        name.expiration = datetime.date(2056, 1, 1)
-        name.put_call_flag = False
-        name.strike = 0
-
         self.context.session.add(name)
-        self.context.session.commit()
+        self.context.session.flush()
+
+        self.context.name_cache.put(exchange_id, symbol, name.id)
 
         self.stub_row_counter = 1 + self.stub_row_counter
 
-        return name
+        return name.id
 
-    def equal_row(self, selected, fresh):
+    def insert_stub_names(self, exchange_id, symbols):
         """
-        :param selected: selected price model
-        :param fresh: fresh price model
-        :return: true if rows match
+        batch insert stub names, then select the fresh row ids w/one query
+        :param exchange_id: exchange.id
+        :param symbols: collection of undefined ticker symbols
+        :return: None
         """
-        if selected.name_id != fresh.name_id:
-            return False
-
-        if selected.date != fresh.date:
-            return False
-
-        if selected.open_price != fresh.open_price:
-            return False
+        if len(symbols) < 1:
+            return None
 
-        if selected.high_price != fresh.high_price:
-            return False
+        rows = []
+        for symbol in symbols:
+            rows.append({"creation_task_id": self.context.task_id, "update_task_id": 0, "exchange_id": exchange_id,
+                         "symbol": symbol, "name": 'stub', "active_flag": True, "put_call_flag": False,
+                         "root_symbol_id": 0, "expiration": datetime.date(2056, 1, 1), "strike": 0})
 
-        if selected.low_price != fresh.low_price:
-            return False
+        self.context.session.execute(Name.__table__.insert(), rows)
 
-        if selected.close_price != fresh.close_price:
-            return False
+        selected_set = self.context.session.query(Name.symbol, Name.id).\
+            filter(Name.exchange_id == exchange_id, Name.active_flag == True, Name.symbol.in_(symbols))
+        for symbol, name_id in selected_set:
+            self.context.name_cache.put(exchange_id, symbol, name_id)
 
-        if selected.volume != fresh.volume:
-            return False
+        self.stub_row_counter = len(symbols) + self.stub_row_counter
 
-        if selected.open_interest != fresh.open_interest:
-            return False
+        return None
 
-        return True
-
-    def parse_row(self, raw_line):
-        #
-        # AAL,20180212,48.79,50.51,48.65,50.09,5437000
-        # AAPL,20180212,158.5,163.89,157.51,162.71,60808300
-        #
-        if raw_line.startswith('Symbol'):
+    def parse_row(self, raw_buffer):
+        """
+        AAL,20180212,48.79,50.51,48.65,50.09,5437000
+        AAPL,20180212,158.5,163.89,157.51,162.71,60808300
+        :param raw_buffer: tokenized price row
+        :return: None or tuple of symbol, date, open, high, low, close, volume, open interest
+        """
+        if len(raw_buffer) > 0 and raw_buffer[0] == 'Symbol':
             self.fail_row_counter = 1 + self.fail_row_counter
             return None
 
-        buffer = raw_line.strip().split(",")
-        if len(buffer) < 7 or len(buffer) > 8:
+        current = self.price_reader.parse_fields(raw_buffer)
+        if current is None:
             self.fail_row_counter = 1 + self.fail_row_counter
-            return None
 
-        utility = Utility()
+        return current
 
-        symbol = buffer[0].strip()
-        date = utility.date_converter(buffer[1].strip())
-        open_price = utility.price_converter(buffer[2].strip())
-        high_price = utility.price_converter(buffer[3].strip())
-        low_price = utility.price_converter(buffer[4].strip())
-        close_price = utility.price_converter(buffer[5].strip())
-        volume = int(buffer[6].strip())
+    def write(self, exchange, raw_buffer, price_sink):
+        """
+        parse the contents of raw_buffer and hand it to the sink
+        :param exchange: associated exchange
+        :param raw_buffer: raw exchange row
+        :param price_sink: row destination
+        :return: None
+        """
+        try:
+            current = self.parse_row(raw_buffer)
+            if current is None:
+                return None
 
-        if len(buffer) > 7:
-            open_interest = int(buffer[7].strip())
-        else:
-            open_interest = 0
+            self.context.stage_timer.switch('resolve')
+
+            name_id = self.select_name_id(current[0], exchange.id)
+            if name_id is None:
+                name_id = self.insert_stub_name(exchange.id, current[0])
 
-        return symbol, date, open_price, high_price, low_price, close_price, volume, open_interest
+            self.context.stage_timer.switch('write')
 
-    def write(self, exchange, raw_buffer, intraday_flag):
+            price_sink.append(name_id, current[1], current[2], current[3], current[4], current[5], current[6], current[7])
+        except:
+            self.fail_row_counter = 1 + self.fail_row_counter
+            self.context.alert_log.log_writer(self.facility, 4, "exception parse:%s, row ndx:%d, contents:%s" %
+                                              (self.eod_file.normalized_file_name, self.total_row_counter, raw_buffer))
+
+        return None
+
+    def write_bulk(self, raw_buffer, pending):
         """
-        parse and load the contents of raw_buffer
-        :param exchange: associated exchange
-        :param raw_buffer: raw exchange row
-        :return: None or Price
+        parse raw_buffer and append to pending rows, symbols are resolved per batch
+        :param raw_buffer: raw price row
+        :param pending: parsed rows awaiting symbol resolution
+        :return: None
         """
         try:
             current = self.parse_row(raw_buffer)
             if current is None:
                 return None
 
-            name = self.select_name(current[0], exchange.id)
-            if name is None:
-                name = self.insert_stub_name(exchange.id, current[0])
-
-            if intraday_flag:
-                price = PriceIntraDay(name.id, current[1], current[2], current[3], current[4], current[5], current[6], current[7])
-                selected = self.select_intraday_price(price.name_id, price.date)
-                if selected is None:
-                    return self.insert_intraday_price(price)
-                else:
-                    if self.equal_row(selected, price):
-                        self.duplicate_row_counter = 1 + self.duplicate_row_counter
-                        return selected
-                    else:
-                        return self.update_intraday_price(selected.id, price)
-            else:
-                price = PriceSession(name.id, current[1], current[2], current[3], current[4], current[5], current[6], current[7])
-                selected = self.select_session_price(price.name_id, price.date)
-                if selected is None:
-                    return self.insert_session_price(price)
-                else:
-                    if self.equal_row(selected, price):
-                        self.duplicate_row_counter = 1 + self.duplicate_row_counter
-                        return selected
-                    else:
-                        return self.update_session_price(selected.id, price)
+            pending.append(current)
         except:
             self.fail_row_counter = 1 + self.fail_row_counter
             self.context.alert_log.log_writer(self.facility, 4, "exception parse:%s, row ndx:%d, contents:%s" %
                                               (self.eod_file.normalized_file_name, self.total_row_counter, raw_buffer))
 
+        return None
+
+    def resolve_pending(self, exchange, pending, price_sink):
+        """
+        resolve symbols for pending rows (stubs are batch inserted) and hand them to the sink
+        :param exchange: associated exchange
+        :param pending: parsed rows awaiting symbol resolution
+        :param price_sink: row destination
+        :return: None
+        """
+        self.context.stage_timer.switch('resolve')
+
+        symbols = self.context.name_cache.get_symbols(self.context.session, exchange.id)
+
+        unknown = set()
+        for current in pending:
+            if current[0] not in symbols:
+                unknown.add(current[0])
+
+        self.insert_stub_names(exchange.id, unknown)
+
+        self.context.stage_timer.switch('write')
+
+        for current in pending:
+            price_sink.append(symbols[current[0]], current[1], current[2], current[3], current[4], current[5], current[6], current[7])
+
+        del pending[:]
+
+        return None
+
+    def chunk_flag(self):
+        """
+        :return: True if a checkpoint is due after the current row
+        """
+        if self.load_log is None or self.context.chunk_size < 1:
+            return False
+
+        return self.total_row_counter % self.context.chunk_size == 0
+
+    def restore_checkpoint(self):
+        """
+        restore counters from an interrupted load
+        :return: byte offset to resume from
+        """
+        if self.load_log is None or self.load_log.checkpoint_offset < 1:
+            return 0
+
+        self.total_row_counter = self.load_log.checkpoint_row
+        self.duplicate_row_counter = self.load_log.duplicate_pop
+        self.fail_row_counter = self.load_log.fail_pop
+        self.fresh_row_counter = self.load_log.fresh_pop
+        self.stub_row_counter = self.load_log.stub_pop
+        self.update_row_counter = self.load_log.update_pop
+
+        self.context.alert_log.log_writer(self.facility, 6, "resume:%s, row:%d" % (self.eod_file.normalized_file_name, self.total_row_counter))
+
+        return self.load_log.checkpoint_offset
+
+    def checkpoint(self, offset):
+        """
+        commit loaded rows along w/the byte offset and counters needed to resume
+        :param offset: byte offset of the next row
+        :return: None
+        """
+        self.context.session.query(LoadLog).filter_by(id=self.load_log.id).\
+            update({"checkpoint_offset":offset, "checkpoint_row":self.total_row_counter,
+                    "duplicate_pop":self.duplicate_row_counter, "fail_pop":self.fail_row_counter,
+                    "fresh_pop":self.fresh_row_counter, "stub_pop":self.stub_row_counter,
+                    "update_pop":self.update_row_counter, "total_pop":self.total_row_counter})
+
+        self.context.session.commit()
+
+        return None
+
+    def absorb(self, price_sink):
+        """
+        move sink counters to this parser
+        :param price_sink: row destination
+        :return: None
+        """
+        self.duplicate_row_counter = price_sink.duplicate_row_counter + self.duplicate_row_counter
+        self.fresh_row_counter = price_sink.fresh_row_counter + self.fresh_row_counter
+        self.update_row_counter = price_sink.update_row_counter + self.update_row_counter
+
+        price_sink.duplicate_row_counter = 0
+        price_sink.fresh_row_counter = 0
+        price_sink.update_row_counter = 0
+
+        return None
+
+    def make_sink(self, exchange, intraday_flag, database_sink):
+        """
+        :param exchange: associated exchange
+        :param intraday_flag: true if intraday file
+        :param database_sink: RowWriter, BulkWriter or whole file loader (see SqlBackend)
+        :return: sink selected by priceSink
+        """
+        if self.context.price_sink == 'database':
+            return database_sink
+
+        bar_sink = BarSink(self.context.bar_store, self.context.name_cache, self.context.session, exchange, intraday_flag)
+        if self.context.price_sink == 'store':
+            return bar_sink
+
+        return TeeSink(database_sink, bar_sink)
+
+    def execute_row(self, exchange, intraday_flag, offset):
+        """
+        load file row at a time
+        :param exchange: associated exchange
+        :param intraday_flag: true if intraday file
+        :param offset: starting byte offset
+        :return: None
+        """
+        if intraday_flag:
+            model = PriceIntraDay
+        else:
+            model = PriceSession
+
+        price_sink = self.make_sink(exchange, intraday_flag, RowWriter(self.context.session, model, self.context.task_id))
+
+        stage_timer = self.context.stage_timer
+
+        with self.eod_file.open_binary() as in_file:
+            stage_timer.switch('read')
+            for raw_buffer, offset in self.price_reader.read_offsets(in_file, offset):
+                stage_timer.switch('parse')
+
+                self.total_row_counter = 1 + self.total_row_counter
+
+                self.write(exchange, raw_buffer, price_sink)
+
+                if self.chunk_flag():
+                    price_sink.flush()
+                    self.absorb(price_sink)
+                    stage_timer.switch('commit')
+                    self.checkpoint(offset)
+
+                stage_timer.switch('read')
+
+        price_sink.flush()
+        self.absorb(price_sink)
+
+        return None
+
+    def execute_bulk(self, exchange, intraday_flag, offset):
+        """
+        load file w/multi-row upsert batches rather than row at a time
+        :param exchange: associated exchange
+        :param intraday_flag: true if intraday file
+        :param offset: starting byte offset
+        :return: None
+        """
+        if intraday_flag:
+            table = PriceIntraDay.__table__
+        else:
+            table = PriceSession.__table__
+
+        bulk_writer = self.context.sql_backend.bulk_writer(self.context.session, table, self.context.task_id, self.context.batch_size)
+        price_sink = self.make_sink(exchange, intraday_flag, bulk_writer)
+
+        stage_timer = self.context.stage_timer
+
+        pending = []
+        with self.eod_file.open_binary() as in_file:
+            stage_timer.switch('read')
+            for raw_buffer, offset in self.price_reader.read_offsets(in_file, offset):
+                stage_timer.switch('parse')
+
+                self.total_row_counter = 1 + self.total_row_counter
+
+                self.write_bulk(raw_buffer, pending)
+                if len(pending) >= self.context.batch_size:
+                    self.resolve_pending(exchange, pending, price_sink)
+
+                if self.chunk_flag():
+                    self.resolve_pending(exchange, pending, price_sink)
+                    price_sink.flush()
+                    self.absorb(price_sink)
+                    stage_timer.switch('commit')
+                    self.checkpoint(offset)
+
+                stage_timer.switch('read')
+
+        self.resolve_pending(exchange, pending, price_sink)
+        price_sink.flush()
+        self.absorb(price_sink)
+
+        return None
+
+    def infile_flag(self, offset):
+        """
+        :param offset: starting byte offset
+        :return: True if this file may use the LOAD DATA (MySQL) or COPY (PostgreSQL) fast path
+        """
+        # store only needs no staging table
+        if not self.context.load_infile or offset > 0 or self.context.price_sink == 'store':
+            return False
+
+        if self.load_log is None or not self.load_log.fresh_flag:
+            return False
+
+        return self.context.sql_backend.infile_flag
+
+    def execute_infile(self, exchange, intraday_flag):
+        """
+        load a never loaded file w/LOAD DATA LOCAL INFILE or COPY and one set based merge, no checkpoints
+        :param exchange: associated exchange
+        :param intraday_flag: true if intraday file
+        :return: None
+        """
+        if intraday_flag:
+            table = PriceIntraDay.__table__
+        else:
+            table = PriceSession.__table__
+
+        infile_loader = self.context.sql_backend.infile_loader(self.context.session, table, self.context.task_id)
+        price_sink = self.make_sink(exchange, intraday_flag, infile_loader)
+
+        stage_timer = self.context.stage_timer
+
+        pending = []
+        with self.eod_file.open_binary() as in_file:
+            stage_timer.switch('read')
+            for raw_buffer, offset in self.price_reader.read_offsets(in_file, 0):
+                stage_timer.switch('parse')
+
+                self.total_row_counter = 1 + self.total_row_counter
+
+                self.write_bulk(raw_buffer, pending)
+                if len(pending) >= self.context.batch_size:
+                    self.resolve_pending(exchange, pending, price_sink)
+
+                stage_timer.switch('read')
+
+        self.resolve_pending(exchange, pending, price_sink)
+        price_sink.flush()
+        self.absorb(price_sink)
+
+        return None
+
+    def execute_columnar(self, exchange):
+        """
+        load an intraday file as numpy columns, converted and de-duplicated vectorized
+        :param exchange: associated exchange
+        :return: False if file could not be read as columns
+        """
+        # reading and conversion are not separable, both count as parse
+        self.context.stage_timer.switch('parse')
+
+        columns = IntradayColumns()
+        try:
+            with self.eod_file.open_binary() as in_file:
+                columns.read(in_file)
+        except (ValueError, ArithmeticError):
+            # i.e. decimal.InvalidOperation from the price converter on a bad cell
+            self.context.alert_log.log_writer(self.facility, 6, "columnar fallback:%s" % self.eod_file.normalized_file_name)
+            return False
+
+        self.context.stage_timer.switch('resolve')
+
+        symbols = self.context.name_cache.get_symbols(self.context.session, exchange.id)
+
+        unknown = set(columns.symbols.tolist()).difference(symbols)
+        self.insert_stub_names(exchange.id, unknown)
+
+        # resolve distinct symbols only, then broadcast to rows
+        name_ids = numpy.array([symbols[symbol] for symbol in columns.symbols.tolist()], dtype=numpy.int64)[columns.symbol_codes]
+
+        self.context.stage_timer.switch('write')
+
+        bulk_writer = self.context.sql_backend.bulk_writer(self.context.session, PriceIntraDay.__table__, self.context.task_id, self.context.batch_size)
+        price_sink = self.make_sink(exchange, True, bulk_writer)
+        price_sink.append_columns(name_ids, columns.dates(), columns.open_price, columns.high_price, columns.low_price,
+                                  columns.close_price, columns.volume, columns.open_interest)
+        price_sink.flush()
+
+        self.total_row_counter = columns.total_row_counter + self.total_row_counter
+        self.fail_row_counter = columns.fail_row_counter + self.fail_row_counter
+        self.duplicate_row_counter = columns.duplicate_row_counter + price_sink.duplicate_row_counter + self.duplicate_row_counter
+        self.fresh_row_counter = price_sink.fresh_row_counter + self.fresh_row_counter
+        self.update_row_counter = price_sink.update_row_counter + self.update_row_counter
+
+        return True
+
     def execute(self):
         start_time = time.time()
 
+        self.context.stage_timer.reset()
+        self.context.stage_timer.switch('resolve')
+
         self.context.alert_log.log_writer(self.facility, 6, "start:%s" % self.eod_file.normalized_file_name)
 
-        exchange = self.select_exchange(self.eod_file.get_exchange())
+        exchange = self.context.exchange_registry.select(self.context.session, self.eod_file.get_exchange())
         if exchange is None:
             self.context.alert_log.log_writer(self.facility, 4, "skipping unknown exchange:%s" % self.eod_file.normalized_file_name)
+            self.context.stage_timer.stop()
             return False
 
         intraday_flag = self.eod_file.is_intraday()
 
-        with open(self.eod_file.full_name, 'rt') as in_file:
-            for raw_buffer in in_file:
-                self.total_row_counter = 1 + self.total_row_counter
+        offset = self.restore_checkpoint()
 
-                self.write(exchange, raw_buffer, intraday_flag)
+        # columnar and infile loads are all or nothing, a resumed file continues on the bulk path
+        columnar_flag = False
+        if self.context.columnar_load and intraday_flag and offset < 1 and IntradayColumns.available():
+            columnar_flag = self.execute_columnar(exchange)
+
+        if columnar_flag:
+            pass
+        elif self.infile_flag(offset):
+            self.execute_infile(exchange, intraday_flag)
+        elif self.context.bulk_load:
+            self.execute_bulk(exchange, intraday_flag, offset)
+        else:
+            self.execute_row(exchange, intraday_flag, offset)
 
+        self.context.stage_timer.switch('commit')
         self.context.session.commit()
+        self.context.stage_timer.stop()
 
         self.context.alert_log.log_writer(self.facility, 6, "stop:%s" % self.eod_file.normalized_file_name)
 
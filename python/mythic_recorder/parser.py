@@ -4,13 +4,78 @@
 # Development Environment: OS X 10.13.3/Python 3.6.4
 # Author: G.S. Cole (guycole at gmail dot com)
 #
+import multiprocessing
+import os
 import time
 
+from sqlalchemy import func
+
+from mythic_recorder.alert_log import AlertLog
+from mythic_recorder.context import Context
 from mythic_recorder.eod_file import EodFile
+from mythic_recorder.eod_file import locate_file
+from mythic_recorder.metrics_textfile import MetricsTextfile
 from mythic_recorder.parse_exchange import ParseExchange
 from mythic_recorder.parse_name import ParseName
 from mythic_recorder.parse_price import ParsePrice
 from mythic_recorder.sql_table import LoadLog
+from mythic_recorder.sql_table import ParseSummary
+from mythic_recorder.sql_table import SqlTable
+from mythic_recorder.stage_timer import STAGES
+
+# worker process state, see init_price_worker
+worker_context = None
+worker_sql_table = None
+
+def init_price_worker(yaml_file_name, task_id):
+    """
+    Process pool initializer.  Each worker builds its own context and engine (and so its pool) once, at start,
+    every exchange partition it services reuses them.
+    :param yaml_file_name: configuration file name
+    :param task_id: parent task id
+    :return: None
+    """
+    global worker_context, worker_sql_table
+
+    worker_context = Context()
+    worker_context.loader(yaml_file_name)
+    worker_context.set_task_id(task_id)
+
+    worker_sql_table = SqlTable(worker_context)
+
+def service_price_worker(load_log_ids):
+    """
+    Process pool entry point, sessions are drawn from the worker pool
+    :param load_log_ids: LoadLog rows for one exchange
+    :return: count of files loaded, PoolMetrics values for this partition
+    """
+    context = worker_context
+    sql_table = worker_sql_table
+
+    alert_session = sql_table.session_factory()
+    context.set_alert_log(AlertLog(context.sns_alarm, alert_session, context.task_id, context.log_flush_size, context.log_flush_interval))
+
+    session = sql_table.bulk_session_factory()
+    context.set_session(session)
+
+    parser = Parser()
+
+    population = 0
+    try:
+        for load_log_id in load_log_ids:
+            if parser.service_load_log(context, load_log_id):
+                population = 1 + population
+    except:
+        context.alert_log.log_writer(parser.facility, 4, 'parse worker exception noted')
+    finally:
+        context.archive_cache.close()
+        session.close()
+        context.alert_log.close()
+        alert_session.close()
+
+    values = context.pool_metrics.drain()
+
+    return population, values
 
 class Parser:
     """
@@ -21,51 +86,242 @@ class Parser:
     def __init__(self):
         self.facility = 'parser'
 
-    def update_load_log(self, session, selected_id, retstat, parser):
-        session.query(LoadLog).with_for_update().filter_by(id=selected_id). \
-            update({"update_task_id":parser.context.alert_log.task_id, "duplicate_pop":parser.duplicate_row_counter,
-                    "fail_pop":parser.fail_row_counter, "fresh_pop":parser.fresh_row_counter,
-                    "update_pop":parser.update_row_counter, "stub_pop":parser.stub_row_counter,
-                    "total_pop":parser.total_row_counter, "duration":parser.duration, "complete_flag":retstat})
+    def update_load_log(self, session, selected_id, retstat, parser, stage_timer=None):
+        values = {"update_task_id":parser.context.alert_log.task_id, "duplicate_pop":parser.duplicate_row_counter,
+                  "fail_pop":parser.fail_row_counter, "fresh_pop":parser.fresh_row_counter,
+                  "update_pop":parser.update_row_counter, "stub_pop":parser.stub_row_counter,
+                  "total_pop":parser.total_row_counter, "duration":parser.duration, "complete_flag":retstat}
+
+        # price files only, stage durations and statement counts
+        if stage_timer is not None:
+            values.update(stage_timer.values())
+
+        session.query(LoadLog).with_for_update().filter_by(id=selected_id).update(values)
 
         session.commit()
 
+    def select_eod_file(self, context, selected):
+        """
+        :param context: runtime context
+        :param selected: LoadLog row
+        :return: EodFile, unpacked or an archive member
+        """
+        if selected.archive_name is None:
+            return EodFile(locate_file("%s/%s" % (context.import_directory, selected.normalized_name)))
+
+        return context.archive_cache.select(os.path.join(context.import_directory, selected.archive_name), selected.normalized_name)
+
+    def service_exchange_file(self, context, selected):
+        context.alert_log.log_writer(self.facility, 4, "exchange file updated")
+        eod_file = self.select_eod_file(context, selected)
+
+        parser = ParseExchange(context, eod_file)
+        retstat = parser.execute()
+
+        self.update_load_log(context.session, selected.id, retstat, parser)
+
     def service_exchange(self, context):
         selected_set = context.session.query(LoadLog).filter_by(complete_flag=False, file_name='ExchangeList.xml').\
             order_by(LoadLog.normalized_name).all()
 
         for selected in selected_set:
-            context.alert_log.log_writer(self.facility, 4, "exchange file updated")
-            eod_file = EodFile("%s/%s" % (context.import_directory, selected.normalized_name))
+            self.service_exchange_file(context, selected)
+
+    def service_name_file(self, context, selected):
+        eod_file = self.select_eod_file(context, selected)
 
-            parser = ParseExchange(context, eod_file)
-            retstat = parser.execute()
+        parser = ParseName(context, eod_file)
+        retstat = parser.execute()
 
-            self.update_load_log(context.session, selected.id, retstat, parser)
+        self.update_load_log(context.session, selected.id, retstat, parser)
 
     def service_name(self, context):
         selected_set = context.session.query(LoadLog).filter_by(complete_flag=False, file_name='SymbolList.xml').\
             order_by(LoadLog.normalized_name).all()
 
         for selected in selected_set:
-            eod_file = EodFile("%s/%s" % (context.import_directory, selected.normalized_name))
+            self.service_name_file(context, selected)
+
+    def claim_load_log(self, session, selected_id, task_id):
+        """
+        atomically claim a LoadLog row so concurrent workers never load the same file.
+        a claimed row carries the current task id, update_load_log sets it again on completion.
+        :param session: database session
+        :param selected_id: LoadLog id
+        :param task_id: current task id
+        :return: True if this caller owns the row
+        """
+        population = session.query(LoadLog).\
+            filter(LoadLog.id == selected_id, LoadLog.complete_flag == False, LoadLog.update_task_id != task_id).\
+            update({"update_task_id":task_id}, synchronize_session=False)
+
+        session.commit()
+
+        return population == 1
+
+    def service_load_log(self, context, selected_id):
+        """
+        claim and load a single price file
+        :param context: runtime context
+        :param selected_id: LoadLog id
+        :return: True if file was claimed and loaded
+        """
+        if not self.claim_load_log(context.session, selected_id, context.task_id):
+            return False
+
+        selected = context.session.query(LoadLog).filter_by(id=selected_id).first()
+
+        try:
+            eod_file = self.select_eod_file(context, selected)
+        except (OSError, KeyError) as error:
+            # archive moved or member absent, the next run retries
+            context.alert_log.log_writer(self.facility, 4, "archive failure:%s/%s, %s" % (selected.archive_name, selected.normalized_name, error))
+            return False
+
+        parser = ParsePrice(context, eod_file, selected)
+        try:
+            retstat = context.profile_hook.run('prices', parser.execute, exchange=selected.exchange)
+        except Exception as error:
+            # committed chunks and checkpoint survive, the next run resumes this file
+            context.session.rollback()
+            context.name_cache.invalidate()
+            context.alert_log.log_writer(self.facility, 4, "load failure:%s, row:%d, %s" % (eod_file.normalized_file_name, parser.total_row_counter, error))
+            return False
+
+        self.update_load_log(context.session, selected.id, retstat, parser, context.stage_timer)
+
+        return retstat
+
+    def service_price_parallel(self, context, selected_set):
+        """
+        partition pending files by exchange and load each partition in a worker process.
+        exchanges are never split so stub names for an exchange are created by one worker.
+        :param context: runtime context
+        :param selected_set: pending LoadLog rows
+        :return: None
+        """
+        partitions = {}
+        for selected in selected_set:
+            partitions.setdefault(selected.exchange, []).append(selected.id)
 
-            parser = ParseName(context, eod_file)
-            retstat = parser.execute()
+        # release the parent transaction (and its locks) before workers start
+        context.session.commit()
 
-            self.update_load_log(context.session, selected.id, retstat, parser)
+        arguments = [partitions[exchange] for exchange in sorted(partitions.keys())]
+
+        # the loader is multi-threaded (AlertLog writer, hash workers), fork could inherit held locks.
+        # workers rebuild their context from the configuration file, nothing else crosses over
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('forkserver')
+        else:
+            mp_context = multiprocessing.get_context('spawn')
+
+        with mp_context.Pool(processes=context.parse_workers, initializer=init_price_worker, initargs=(context.yaml_file_name, context.task_id)) as pool:
+            results = pool.map(service_price_worker, arguments)
+
+        population = 0
+        for files, values in results:
+            population = files + population
+            context.pool_metrics.absorb(values)
+
+        context.alert_log.log_writer(self.facility, 6, "parallel load:%d files, %d workers" % (population, context.parse_workers))
 
     def service_price(self, context):
         selected_set = context.session.query(LoadLog).filter_by(complete_flag=False).\
             order_by(LoadLog.normalized_name).all()
 
+        if context.parse_workers > 1:
+            self.service_price_parallel(context, selected_set)
+            return
+
         for selected in selected_set:
-            eod_file = EodFile("%s/%s" % (context.import_directory, selected.normalized_name))
+            self.service_load_log(context, selected.id)
+
+    def summarize(self, context):
+        """
+        roll up price file LoadLog rows completed by this task into ParseSummary (per exchange),
+        then export them as a Prometheus textfile if configured
+        :param context: runtime context
+        :return: None
+        """
+        columns = [LoadLog.exchange, func.count(LoadLog.id), func.sum(LoadLog.total_pop), func.sum(LoadLog.duration)]
+        columns = columns + [func.sum(getattr(LoadLog, "%s_duration" % stage)) for stage in STAGES]
+        columns = columns + [func.sum(LoadLog.select_pop), func.sum(LoadLog.write_pop)]
 
-            parser = ParsePrice(context, eod_file)
-            retstat = parser.execute()
+        selected_set = context.session.query(*columns).\
+            filter(LoadLog.update_task_id == context.task_id, LoadLog.complete_flag == True, LoadLog.normalized_name.like('%.csv')).\
+            group_by(LoadLog.exchange).order_by(LoadLog.exchange)
 
-            self.update_load_log(context.session, selected.id, retstat, parser)
+        summaries = []
+        for row in selected_set:
+            summary = ParseSummary(context.task_id, row[0])
+            summary.file_pop = row[1]
+            summary.total_pop = int(row[2] or 0)
+            summary.duration = float(row[3] or 0.0)
+            for ndx, stage in enumerate(STAGES):
+                setattr(summary, "%s_duration" % stage, float(row[4 + ndx] or 0.0))
+            summary.select_pop = int(row[4 + len(STAGES)] or 0)
+            summary.write_pop = int(row[5 + len(STAGES)] or 0)
+
+            context.session.add(summary)
+            summaries.append(summary)
+
+        context.session.commit()
+
+        metrics_textfile = MetricsTextfile(context.metrics_file)
+        metrics_textfile.write(context.task_id, summaries, context.pool_metrics.values())
+
+    def service_stream_item(self, context, load_log_id):
+        """
+        load a single file announced by discovery
+        :param context: runtime context
+        :param load_log_id: LoadLog id
+        :return: None
+        """
+        # fresh snapshot, the row was committed by the discovery session
+        context.session.commit()
+
+        selected = context.session.query(LoadLog).filter_by(id=load_log_id, complete_flag=False).first()
+        if selected is None:
+            return None
+
+        if selected.file_name == 'ExchangeList.xml':
+            context.profile_hook.run('exchange', self.service_exchange_file, context, selected)
+        elif selected.file_name == 'SymbolList.xml':
+            context.profile_hook.run('names', self.service_name_file, context, selected)
+        else:
+            context.profile_hook.run('prices', self.service_load_log, context, selected.id)
+
+        return None
+
+    def execute_stream(self, context, load_log_queue):
+        """
+        Load files as discovery commits them, until the None sentinel arrives.
+        Discovery queues ExchangeList.xml before any exchange directory and SymbolList.xml before
+        the price files of its directory.  Leftovers (prior runs, failures) and the summary follow.
+        :param context: runtime context
+        :param load_log_queue: bounded queue.Queue of LoadLog ids
+        :return: True if success
+        """
+        context.alert_log.log_writer(self.facility, 6, 'stream start')
+
+        population = 0
+        while True:
+            load_log_id = load_log_queue.get()
+            if load_log_id is None:
+                break
+
+            # always drain the queue, a blocked discovery thread never finishes
+            try:
+                self.service_stream_item(context, load_log_id)
+                population = 1 + population
+            except:
+                context.session.rollback()
+                context.alert_log.log_writer(self.facility, 4, "stream exception noted, load log:%d" % load_log_id)
+
+        context.alert_log.log_writer(self.facility, 6, "stream stop:%d files" % population)
+
+        return self.execute(context)
 
     def execute(self, context):
         """
@@ -76,17 +332,20 @@ class Parser:
         context.alert_log.log_writer(self.facility, 6, 'start')
 
         try:
-            self.service_exchange(context)
+            context.profile_hook.run('exchange', self.service_exchange, context)
+
+            context.profile_hook.run('names', self.service_name, context)
 
-            self.service_name(context)
+            context.profile_hook.run('prices', self.service_price, context)
 
-            self.service_price(context)
+            self.summarize(context)
 
             status = True
         except:
             context.alert_log.log_writer(self.facility, 4, 'parse exception noted')
             status = False
         finally:
+            context.archive_cache.close()
             context.alert_log.log_writer(self.facility, 6, 'parse finally')
 
         context.alert_log.log_writer(self.facility, 6, 'stop')
@@ -0,0 +1,135 @@
+#
+# Title: pool_metrics.py
+# Description: connection setup and commit accounting
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import threading
+import time
+
+from sqlalchemy import event
+
+class PoolMetrics:
+    """
+    Count and time fresh DBAPI connections (connect plus per connection setup, i.e. SQLite pragmas)
+    and session commits (flush plus COMMIT), across every thread and engine of a process.
+    Worker processes return values() to the parent, which adds them w/absorb().
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+        self.checkout_counter = 0
+        self.commit_counter = 0
+        self.commit_duration = 0.0
+        self.connect_counter = 0
+        self.connect_duration = 0.0
+
+    def listen(self, engine):
+        """
+        register connection hooks, after any other connect listener so setup time is included
+        :param engine: SQLAlchemy engine
+        :return: None
+        """
+        event.listen(engine, 'do_connect', self.before_connect)
+        event.listen(engine, 'connect', self.after_connect)
+        event.listen(engine, 'checkout', self.checkout)
+
+    def listen_session(self, session_maker):
+        """
+        register commit hooks
+        :param session_maker: sessionmaker
+        :return: None
+        """
+        event.listen(session_maker, 'before_commit', self.before_commit)
+        event.listen(session_maker, 'after_commit', self.after_commit)
+
+    def before_connect(self, dialect, connection_record, cargs, cparams):
+        self.local.connect_mark = time.perf_counter()
+
+    def after_connect(self, connection, connection_record):
+        mark = getattr(self.local, 'connect_mark', None)
+        if mark is None:
+            return
+
+        self.local.connect_mark = None
+
+        with self.lock:
+            self.connect_counter = 1 + self.connect_counter
+            self.connect_duration = self.connect_duration + time.perf_counter() - mark
+
+    def checkout(self, connection, connection_record, connection_proxy):
+        with self.lock:
+            self.checkout_counter = 1 + self.checkout_counter
+
+    def before_commit(self, session):
+        self.local.commit_mark = time.perf_counter()
+
+    def after_commit(self, session):
+        mark = getattr(self.local, 'commit_mark', None)
+        if mark is None:
+            return
+
+        self.local.commit_mark = None
+
+        with self.lock:
+            self.commit_counter = 1 + self.commit_counter
+            self.commit_duration = self.commit_duration + time.perf_counter() - mark
+
+    def values(self):
+        """
+        :return: counters as a dictionary
+        """
+        with self.lock:
+            return self.snapshot()
+
+    def snapshot(self):
+        """
+        :return: counters as a dictionary, caller holds the lock
+        """
+        return {'checkout_pop': self.checkout_counter, 'commit_pop': self.commit_counter, 'commit_duration': self.commit_duration,
+                'connect_pop': self.connect_counter, 'connect_duration': self.connect_duration}
+
+    def drain(self):
+        """
+        read and zero the counters w/one lock, so a commit from another thread (i.e. AlertLog) is never lost
+        :return: counters as a dictionary
+        """
+        with self.lock:
+            results = self.snapshot()
+
+            self.checkout_counter = 0
+            self.commit_counter = 0
+            self.commit_duration = 0.0
+            self.connect_counter = 0
+            self.connect_duration = 0.0
+
+        return results
+
+    def absorb(self, values):
+        """
+        add counters from a worker process
+        :param values: from values()
+        :return: None
+        """
+        with self.lock:
+            self.checkout_counter = values['checkout_pop'] + self.checkout_counter
+            self.commit_counter = values['commit_pop'] + self.commit_counter
+            self.commit_duration = values['commit_duration'] + self.commit_duration
+            self.connect_counter = values['connect_pop'] + self.connect_counter
+            self.connect_duration = values['connect_duration'] + self.connect_duration
+
+        return None
+
+    def __repr__(self):
+        values = self.values()
+        return "connections:%d (%.3fs), checkouts:%d, commits:%d (%.3fs)" % \
+               (values['connect_pop'], values['connect_duration'], values['checkout_pop'], values['commit_pop'], values['commit_duration'])
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
@@ -0,0 +1,271 @@
+#
+# Title: price_query.py
+# Description: read price history as numpy arrays through a size bounded LRU cache
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import collections
+import datetime
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy import select
+
+from mythic_recorder.exchange_registry import ExchangeRegistry
+from mythic_recorder.sql_table import LoadLog
+from mythic_recorder.sql_table import Name
+from mythic_recorder.sql_table import PriceIntraDay
+from mythic_recorder.sql_table import PriceSession
+from mythic_recorder.sql_table import TaskLog
+
+# prices are dollars, stored as pennies * 10
+SESSION_DTYPE = [('date', 'datetime64[D]'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'), ('volume', 'i8'), ('open_interest', 'i8')]
+INTRADAY_DTYPE = [('date', 'datetime64[m]'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'), ('volume', 'i8'), ('open_interest', 'i8')]
+
+class BarCache:
+    """
+    Least recently used bar arrays, bounded by total array bytes rather than entry count.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        ctor
+        :param max_bytes: total array size retained
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+
+        self.hit_counter = 0
+        self.miss_counter = 0
+
+        # key => array, least recently used first
+        self.entries = collections.OrderedDict()
+
+    def get(self, key):
+        """
+        :param key: query key
+        :return: cached array or None
+        """
+        result = self.entries.get(key)
+        if result is None:
+            self.miss_counter = 1 + self.miss_counter
+            return None
+
+        self.entries.move_to_end(key)
+        self.hit_counter = 1 + self.hit_counter
+
+        return result
+
+    def put(self, key, value):
+        """
+        :param key: query key
+        :param value: read only array, larger than max_bytes is not retained
+        :return: None
+        """
+        if value.nbytes > self.max_bytes:
+            return None
+
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size = self.size - previous.nbytes
+
+        self.entries[key] = value
+        self.size = self.size + value.nbytes
+
+        while self.size > self.max_bytes:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.size = self.size - evicted.nbytes
+
+        return None
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+class PriceQuery:
+    """
+    Session and 5 minute bar history by exchange and ticker symbol, resolved through exchange and name.
+    Results are cached against the latest task_log.id and the files it has completed, so repeated reads
+    in a notebook are memory lookups and every completed file invalidates.  Nothing is cached while the
+    latest task has incomplete files (a load is running, or failed files await the next run).
+    Requires numpy, DataFrames require pandas.
+    """
+
+    def __init__(self, session, max_bytes=268435456, check_interval=10.0):
+        """
+        ctor
+        :param session: database session
+        :param max_bytes: cache size
+        :param check_interval: seconds between task_log checks
+        """
+        self.session = session
+
+        self.bar_cache = BarCache(max_bytes)
+        self.exchange_registry = ExchangeRegistry()
+
+        self.check_interval = check_interval
+        self.check_time = 0.0
+        self.task_id = None
+
+        # (task_log.id, complete load_log rows of that task), None while that task has incomplete files
+        self.version = None
+
+    @staticmethod
+    def available():
+        return numpy is not None
+
+    def refresh(self):
+        """
+        discard cached results if a task has started or completed a file since they were read
+        :return: most recent task_log.id
+        """
+        now = time.time()
+        if self.task_id is not None and now - self.check_time < self.check_interval:
+            return self.task_id
+
+        task_id = self.session.query(func.max(TaskLog.id)).scalar()
+
+        # files discovered (creation) or resumed (update) by the task and not yet loaded
+        incomplete = self.session.query(func.count(LoadLog.id)).\
+            filter(LoadLog.complete_flag == False, or_(LoadLog.creation_task_id == task_id, LoadLog.update_task_id == task_id)).scalar()
+        complete = self.session.query(func.count(LoadLog.id)).\
+            filter(LoadLog.complete_flag == True, LoadLog.update_task_id == task_id).scalar()
+        self.session.commit()
+
+        version = None
+        if incomplete < 1:
+            version = (task_id, complete)
+
+        if version is None or version != self.version:
+            self.bar_cache.clear()
+
+        if task_id != self.task_id:
+            self.exchange_registry.invalidate()
+
+        self.task_id = task_id
+        self.version = version
+
+        self.check_time = now
+
+        return task_id
+
+    def select_name_ids(self, exchange, symbol):
+        """
+        :param exchange: exchange code, any case
+        :param symbol: ticker symbol
+        :return: every name.id for symbol, a symbol may have been a stub before its name arrived
+        """
+        selected = self.exchange_registry.select(self.session, exchange)
+        if selected is None:
+            return []
+
+        selected_set = self.session.query(Name.id).filter_by(exchange_id=selected.id, symbol=symbol)
+
+        return [row[0] for row in selected_set]
+
+    def select_bars(self, table, dtype, name_ids, start, end):
+        """
+        :param table: price_session or price_intraday table
+        :param dtype: result dtype
+        :param name_ids: name.id list
+        :param start: first date, None for no bound
+        :param end: last date (inclusive), None for no bound
+        :return: structured array ordered by date
+        """
+        statement = select([table.c.date, table.c.open_price, table.c.high_price, table.c.low_price, table.c.close_price,
+                            table.c.volume, table.c.open_interest]).where(table.c.name_id.in_(name_ids))
+
+        if start is not None:
+            statement = statement.where(table.c.date >= start)
+
+        if end is not None:
+            if table.name == 'price_intraday' and not isinstance(end, datetime.datetime):
+                # a date includes every bar of that day
+                statement = statement.where(table.c.date < datetime.datetime.combine(end, datetime.time()) + datetime.timedelta(days=1))
+            else:
+                statement = statement.where(table.c.date <= end)
+
+        rows = self.session.execute(statement.order_by(table.c.date)).fetchall()
+        self.session.commit()
+
+        results = numpy.empty(len(rows), dtype=dtype)
+        if len(rows) < 1:
+            return results
+
+        columns = list(zip(*rows))
+        results['date'] = numpy.array(columns[0], dtype=dtype[0][1])
+        for ndx, field in enumerate(('open', 'high', 'low', 'close')):
+            results[field] = numpy.array(columns[1 + ndx], dtype=numpy.int64) / 1000.0
+        results['volume'] = columns[5]
+        results['open_interest'] = columns[6]
+
+        return results
+
+    def get_bars(self, table, dtype, exchange, symbol, start, end, frame):
+        if numpy is None:
+            raise ValueError('price query requires numpy')
+
+        self.refresh()
+
+        key = (table.name, exchange.lower(), symbol, start, end)
+
+        results = self.bar_cache.get(key)
+        if results is None:
+            results = self.select_bars(table, dtype, self.select_name_ids(exchange, symbol), start, end)
+
+            # shared by every caller
+            results.flags.writeable = False
+            if self.version is not None:
+                self.bar_cache.put(key, results)
+
+        if frame:
+            return self.frame(results)
+
+        return results
+
+    def get_session_bars(self, exchange, symbol, start=None, end=None, frame=False):
+        """
+        :param exchange: exchange code, i.e. NYSE
+        :param symbol: ticker symbol
+        :param start: first date, None for no bound
+        :param end: last date (inclusive), None for no bound
+        :param frame: True returns a DataFrame indexed by date
+        :return: read only structured array (see SESSION_DTYPE) ordered by date
+        """
+        return self.get_bars(PriceSession.__table__, SESSION_DTYPE, exchange, symbol, start, end, frame)
+
+    def get_intraday_bars(self, exchange, symbol, start=None, end=None, frame=False):
+        """
+        :param exchange: exchange code, i.e. NYSE
+        :param symbol: ticker symbol
+        :param start: first bar, None for no bound
+        :param end: last bar (inclusive, a date includes the whole day), None for no bound
+        :param frame: True returns a DataFrame indexed by date
+        :return: read only structured array (see INTRADAY_DTYPE) ordered by date
+        """
+        return self.get_bars(PriceIntraDay.__table__, INTRADAY_DTYPE, exchange, symbol, start, end, frame)
+
+    def frame(self, bars):
+        """
+        :param bars: structured array from get_session_bars or get_intraday_bars
+        :return: DataFrame indexed by date, a copy
+        """
+        if pandas is None:
+            raise ValueError('DataFrame results require pandas')
+
+        return pandas.DataFrame.from_records(bars, index='date')
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
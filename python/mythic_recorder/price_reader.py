@@ -0,0 +1,141 @@
+#
+# Title: price_reader.py
+# Description: fast path tokenizer and converters for price files
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import csv
+import decimal
+
+from mythic_recorder.utility import Utility
+
+class PriceReader:
+    """
+    Tokenize price files w/the csv module and convert fields w/o float rounding.
+    Date strings are memoized, a file contains one session date or a few dozen bar times.
+    Price strings are memoized as well, OHLC values repeat heavily within a file.
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.date_cache = {}
+        self.price_cache = {}
+        self.utility = Utility()
+
+    def read(self, in_file):
+        """
+        :param in_file: open price file
+        :return: iterator of field lists
+        """
+        return csv.reader(in_file)
+
+    def read_offsets(self, in_file, offset):
+        """
+        tokenize a binary file from offset, tracking the byte offset following each row.
+        rows never span lines in eoddata files, so csv.reader consumes exactly one line per row.
+        :param in_file: price file open in binary mode
+        :param offset: starting byte offset, i.e. a checkpoint
+        :return: iterator of (field list, offset of next row)
+        """
+        if in_file.seekable():
+            in_file.seek(offset)
+        else:
+            # zstd, skip forward to the checkpoint
+            skip = offset
+            while skip > 0:
+                buffer = in_file.read(min(skip, 65536))
+                if len(buffer) < 1:
+                    break
+                skip = skip - len(buffer)
+
+        position = [offset]
+
+        def decode_lines():
+            for raw_line in in_file:
+                position[0] = position[0] + len(raw_line)
+                yield raw_line.decode('utf-8')
+
+        for fields in csv.reader(decode_lines()):
+            yield fields, position[0]
+
+    def date_converter(self, arg):
+        """
+        memoized Utility.date_converter
+        :param arg: raw date time, i.e. 27-Apr-2018 or 27-Apr-2018 09:20
+        :return: converted date
+        """
+        result = self.date_cache.get(arg)
+        if result is None:
+            result = self.utility.date_converter(arg.strip())
+            self.date_cache[arg] = result
+
+        return result
+
+    def price_converter(self, arg):
+        """
+        memoized exact_price_converter
+        :param arg: decimal point price
+        :return: price as pennies * 10
+        """
+        result = self.price_cache.get(arg)
+        if result is None:
+            result = self.exact_price_converter(arg)
+            self.price_cache[arg] = result
+
+        return result
+
+    def exact_price_converter(self, arg):
+        """
+        exact decimal conversion, digits beyond 1/1000 are truncated like int(float(arg) * 1000.0)
+        :param arg: decimal point price
+        :return: price as pennies * 10
+        """
+        # csv fields are not stripped, int() would accept '79 ' as a fraction
+        arg = arg.strip()
+        whole, point, fraction = arg.partition('.')
+
+        negative = whole.startswith('-')
+        if negative:
+            whole = whole[1:]
+
+        if not whole.isdigit() or not (fraction.isdigit() or len(point) < 1):
+            # exponent notation, sign or empty parts, left to Decimal
+            return int(decimal.Decimal(arg) * 1000)
+
+        if len(fraction) < 3:
+            result = int(whole) * 1000 + int((fraction + '000')[:3])
+        else:
+            result = int(whole) * 1000 + int(fraction[:3])
+
+        if negative:
+            return -result
+
+        return result
+
+    def parse_fields(self, fields):
+        """
+        AAL,20180212,48.79,50.51,48.65,50.09,5437000
+        AADR,02-Apr-2018 09:30,58.96,58.96,57.85,57.85,1840
+        :param fields: tokenized price row
+        :return: tuple of symbol, date, open, high, low, close, volume, open interest or None
+        """
+        population = len(fields)
+        if population < 7 or population > 8:
+            return None
+
+        if population > 7:
+            open_interest = int(fields[7])
+        else:
+            open_interest = 0
+
+        price_converter = self.price_converter
+
+        return (fields[0].strip(), self.date_converter(fields[1]),
+                price_converter(fields[2]), price_converter(fields[3]), price_converter(fields[4]), price_converter(fields[5]),
+                int(fields[6]), open_interest)
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
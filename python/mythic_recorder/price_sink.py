@@ -0,0 +1,111 @@
+#
+# Title: price_sink.py
+# Description: destination for parsed price rows
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+
+class PriceSink:
+    """
+    Destination for price rows resolved to name.id.  ParsePrice only calls append (or append_columns)
+    and flush, then moves the fresh/update/duplicate counters to itself (see ParsePrice.absorb).
+    Implementations: RowWriter (ORM), BulkWriter, InfileLoader, BarSink (local bar store).
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.duplicate_row_counter = 0
+        self.fresh_row_counter = 0
+        self.update_row_counter = 0
+
+    def append(self, name_id, date, open_price, high_price, low_price, close_price, volume, open_interest):
+        """
+        add a price row, prices are pennies * 10
+        :return: None
+        """
+        raise NotImplementedError
+
+    def append_columns(self, name_ids, dates, open_price, high_price, low_price, close_price, volume, open_interest):
+        """
+        add numpy columns which are already de-duplicated (see IntradayColumns)
+        :return: None
+        """
+        rows = zip(name_ids.tolist(), dates.tolist(), open_price.tolist(), high_price.tolist(), low_price.tolist(),
+                   close_price.tolist(), volume.tolist(), open_interest.tolist())
+
+        for row in rows:
+            self.append(*row)
+
+        return None
+
+    def flush(self):
+        """
+        write anything pending, the caller commits
+        :return: None
+        """
+        return None
+
+class TeeSink(PriceSink):
+    """
+    Feed two sinks, i.e. the database and the bar store.  Counters are those of the primary sink.
+    """
+
+    def __init__(self, primary, secondary):
+        """
+        ctor
+        :param primary: sink of record
+        :param secondary: copy
+        """
+        self.primary = primary
+        self.secondary = secondary
+
+    @property
+    def duplicate_row_counter(self):
+        return self.primary.duplicate_row_counter
+
+    @duplicate_row_counter.setter
+    def duplicate_row_counter(self, value):
+        self.primary.duplicate_row_counter = value
+        self.secondary.duplicate_row_counter = value
+
+    @property
+    def fresh_row_counter(self):
+        return self.primary.fresh_row_counter
+
+    @fresh_row_counter.setter
+    def fresh_row_counter(self, value):
+        self.primary.fresh_row_counter = value
+        self.secondary.fresh_row_counter = value
+
+    @property
+    def update_row_counter(self):
+        return self.primary.update_row_counter
+
+    @update_row_counter.setter
+    def update_row_counter(self, value):
+        self.primary.update_row_counter = value
+        self.secondary.update_row_counter = value
+
+    def append(self, name_id, date, open_price, high_price, low_price, close_price, volume, open_interest):
+        self.primary.append(name_id, date, open_price, high_price, low_price, close_price, volume, open_interest)
+        self.secondary.append(name_id, date, open_price, high_price, low_price, close_price, volume, open_interest)
+
+        return None
+
+    def append_columns(self, name_ids, dates, open_price, high_price, low_price, close_price, volume, open_interest):
+        self.primary.append_columns(name_ids, dates, open_price, high_price, low_price, close_price, volume, open_interest)
+        self.secondary.append_columns(name_ids, dates, open_price, high_price, low_price, close_price, volume, open_interest)
+
+        return None
+
+    def flush(self):
+        self.primary.flush()
+        self.secondary.flush()
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
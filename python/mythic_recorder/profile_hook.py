@@ -0,0 +1,111 @@
+#
+# Title: profile_hook.py
+# Description: optional cProfile capture of loader stages
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import cProfile
+import os
+import pstats
+
+STAGES = ('discovery', 'exchange', 'names', 'prices')
+
+# functions listed in the text report
+REPORT_LINES = 40
+
+class ProfileHook:
+    """
+    Run loader stages under cProfile and write one artifact pair per stage, named by TaskLog.id.
+    Disabled unless a directory is supplied.  A stage filter profiles one stage, an exchange filter
+    profiles only price files from that exchange (accumulated into a single profile).
+    """
+
+    def __init__(self, directory='', stage='', exchange=''):
+        """
+        ctor
+        :param directory: artifact directory, empty disables profiling
+        :param stage: one of STAGES, empty profiles every stage
+        :param exchange: exchange code, empty profiles every exchange
+        """
+        self.directory = directory
+        self.stage = stage
+        self.exchange = exchange.lower()
+
+        # label => cProfile.Profile
+        self.profiles = {}
+
+    def enabled(self):
+        return len(self.directory) > 0
+
+    def selected(self, stage, exchange=None):
+        """
+        :param stage: one of STAGES
+        :param exchange: None for a whole stage, else the exchange of a single price file
+        :return: True if this call should be profiled
+        """
+        if not self.enabled():
+            return False
+
+        if len(self.stage) > 0 and self.stage != stage:
+            return False
+
+        # whole stage calls are profiled w/o an exchange filter, per file calls only w/one
+        if exchange is None:
+            return len(self.exchange) < 1
+
+        return exchange.lower() == self.exchange
+
+    def run(self, stage, function, *arguments, exchange=None):
+        """
+        invoke function, under the profiler when selected
+        :param stage: one of STAGES
+        :param function: stage function
+        :param arguments: function arguments
+        :param exchange: exchange for a single price file
+        :return: function result
+        """
+        if not self.selected(stage, exchange):
+            return function(*arguments)
+
+        label = stage
+        if exchange is not None:
+            label = "%s_%s" % (stage, self.exchange)
+
+        profile = self.profiles.get(label)
+        if profile is None:
+            profile = cProfile.Profile()
+            self.profiles[label] = profile
+
+        profile.enable()
+        try:
+            return function(*arguments)
+        finally:
+            profile.disable()
+
+    def dump(self, task_id):
+        """
+        write task_<id>_<label>.prof (pstats/snakeviz input) and a cumulative time text report
+        :param task_id: TaskLog.id
+        :return: list of artifact file names
+        """
+        results = []
+
+        for label in sorted(self.profiles.keys()):
+            base_name = os.path.join(self.directory, "task_%d_%s" % (task_id, label))
+
+            profile = self.profiles[label]
+            profile.dump_stats("%s.prof" % base_name)
+
+            with open("%s.txt" % base_name, 'w') as out_file:
+                stats = pstats.Stats(profile, stream=out_file)
+                stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+
+            results.append("%s.prof" % base_name)
+
+        self.profiles = {}
+
+        return results
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
@@ -0,0 +1,95 @@
+#
+# Title: row_writer.py
+# Description: row at a time price loader
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import datetime
+
+from sqlalchemy import Date
+
+from mythic_recorder.price_sink import PriceSink
+from mythic_recorder.sql_table import PriceSession
+
+class RowWriter(PriceSink):
+    """
+    Select each row by (name_id, date), then ORM insert or update.  Slow but portable, see BulkWriter.
+    """
+
+    def __init__(self, session, model, task_id):
+        """
+        ctor
+        :param session: database session
+        :param model: PriceSession or PriceIntraDay
+        :param task_id: parent task id
+        """
+        super().__init__()
+
+        self.session = session
+        self.model = model
+        self.task_id = task_id
+
+        # price_session.date is a DATE, parsed values are datetime.  SQLite compares them as text
+        self.date_only = isinstance(model.__table__.c.date.type, Date)
+
+    def equal_row(self, selected, fresh):
+        """
+        :param selected: selected price model
+        :param fresh: fresh price model
+        :return: true if rows match
+        """
+        if selected.name_id != fresh.name_id:
+            return False
+
+        if selected.date != fresh.date:
+            return False
+
+        if selected.open_price != fresh.open_price:
+            return False
+
+        if selected.high_price != fresh.high_price:
+            return False
+
+        if selected.low_price != fresh.low_price:
+            return False
+
+        if selected.close_price != fresh.close_price:
+            return False
+
+        if selected.volume != fresh.volume:
+            return False
+
+        if selected.open_interest != fresh.open_interest:
+            return False
+
+        return True
+
+    def append(self, name_id, date, open_price, high_price, low_price, close_price, volume, open_interest):
+        if self.date_only and isinstance(date, datetime.datetime):
+            date = date.date()
+
+        price = self.model(name_id, date, open_price, high_price, low_price, close_price, volume, open_interest)
+        price.task_id = self.task_id
+
+        selected = self.session.query(self.model).filter_by(name_id=price.name_id, date=price.date).first()
+        if selected is None:
+            self.session.add(price)
+            self.fresh_row_counter = 1 + self.fresh_row_counter
+        elif self.equal_row(selected, price):
+            self.duplicate_row_counter = 1 + self.duplicate_row_counter
+        else:
+            query = self.session.query(self.model).with_for_update()
+            if self.model is PriceSession:
+                query = query.filter_by(id=selected.id)
+            else:
+                query = query.filter_by(name_id=selected.name_id, date=selected.date)
+
+            query.update({"open_price":price.open_price, "high_price":price.high_price, "low_price":price.low_price,
+                          "close_price":price.close_price, "volume":price.volume, "open_interest": price.open_interest})
+            self.update_row_counter = 1 + self.update_row_counter
+
+        return None
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
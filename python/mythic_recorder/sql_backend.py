@@ -0,0 +1,192 @@
+#
+# Title: sql_backend.py
+# Description: per database connection setup and bulk load strategy
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from mythic_recorder.bulk_writer import BulkWriter
+from mythic_recorder.bulk_writer import MySqlBulkWriter
+from mythic_recorder.bulk_writer import PostgreSqlBulkWriter
+from mythic_recorder.copy_loader import CopyLoader
+from mythic_recorder.infile_loader import InfileLoader
+
+# applied to every SQLite connection, sqlitePragmas in config.dev overrides
+SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'temp_store': 'MEMORY',
+                  'cache_size': -262144, 'mmap_size': 1073741824, 'busy_timeout': 30000}
+
+class SqlBackend:
+    """
+    Database specific choices, selected by dbBackend in config.dev
+    """
+    name = ''
+    default_port = 0
+
+    # True if never loaded files may use the whole file loader (see infile_loader)
+    infile_flag = False
+
+    # applied to each connection of the bulk (price load) engine when bulkSession is set
+    bulk_statements = ()
+
+    def url(self, context):
+        """
+        :param context: runtime context
+        :return: SQLAlchemy database URL
+        """
+        port = context.db_port or self.default_port
+        return "%s://%s:%s@%s:%d/%s" % (self.name, context.mysql_username, context.mysql_password, context.mysql_hostname, port, context.mysql_database)
+
+    def connect_args(self, context):
+        """
+        :param context: runtime context
+        :return: DBAPI connect() arguments
+        """
+        return {}
+
+    def engine_args(self, context):
+        """
+        :param context: runtime context
+        :return: create_engine() arguments
+        """
+        return {'pool_size': context.pool_size, 'max_overflow': context.pool_max_overflow,
+                'pool_recycle': context.pool_recycle, 'pool_pre_ping': context.pool_pre_ping}
+
+    def configure_bulk(self, engine, context):
+        """
+        apply bulk_statements to every connection of engine
+        :param engine: fresh engine, only used for price loads
+        :param context: runtime context
+        :return: None
+        """
+        def connect(connection, record):
+            cursor = connection.cursor()
+            for statement in self.bulk_statements:
+                cursor.execute(statement)
+            cursor.close()
+
+        event.listen(engine, 'connect', connect)
+
+        return None
+
+    def configure(self, engine, context):
+        """
+        called once per engine, before the first connection
+        :param engine: fresh engine
+        :param context: runtime context
+        :return: None
+        """
+        return None
+
+    def bulk_writer(self, session, table, task_id, batch_size):
+        """
+        :return: BulkWriter for this database
+        """
+        return BulkWriter(session, table, task_id, batch_size)
+
+    def infile_loader(self, session, table, task_id):
+        """
+        :return: whole file loader for this database, None if unsupported
+        """
+        return None
+
+class MySqlBackend(SqlBackend):
+    """
+    MySQL w/mysqlclient, LOAD DATA LOCAL INFILE and INSERT ... ON DUPLICATE KEY UPDATE
+    """
+    name = 'mysql'
+    default_port = 3306
+    infile_flag = True
+
+    # no gap locks between parse workers upserting neighbouring (name_id, date) ranges
+    bulk_statements = ("SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED",)
+
+    def connect_args(self, context):
+        if context.load_infile:
+            return {'local_infile': 1}
+
+        return {}
+
+    def bulk_writer(self, session, table, task_id, batch_size):
+        return MySqlBulkWriter(session, table, task_id, batch_size)
+
+    def infile_loader(self, session, table, task_id):
+        return InfileLoader(session, table, task_id)
+
+class PostgreSqlBackend(SqlBackend):
+    """
+    PostgreSQL w/psycopg2, COPY and INSERT ... ON CONFLICT DO UPDATE
+    """
+    name = 'postgresql'
+    default_port = 5432
+    infile_flag = True
+
+    # a crash may lose the last commits (the file reloads), never corrupts
+    bulk_statements = ("SET synchronous_commit TO OFF",)
+
+    def engine_args(self, context):
+        # executemany as multi-row VALUES (insert) and execute_batch (update) pages
+        results = super().engine_args(context)
+        results.update({'executemany_mode': 'values', 'executemany_values_page_size': context.executemany_page_size,
+                        'executemany_batch_page_size': context.executemany_page_size})
+        return results
+
+    def bulk_writer(self, session, table, task_id, batch_size):
+        return PostgreSqlBulkWriter(session, table, task_id, batch_size)
+
+    def infile_loader(self, session, table, task_id):
+        return CopyLoader(session, table, task_id)
+
+class SqliteBackend(SqlBackend):
+    """
+    Single file database for one node deployments and benchmarks, no server.
+    WAL lets readers (i.e. PriceQuery) run during a load, there is still one writer at a time.
+    """
+    name = 'sqlite'
+
+    # no bulk statements, synchronous OFF risks a corrupt database on OS crash or power loss (even w/WAL),
+    # synchronous NORMAL (see SQLITE_PRAGMAS) is already consistent but may lose the last commits
+
+    def url(self, context):
+        return "sqlite:///%s" % context.sqlite_file
+
+    def connect_args(self, context):
+        # AlertLog writes from a background thread
+        return {'check_same_thread': False}
+
+    def engine_args(self, context):
+        # file databases default to NullPool, a pool keeps connection setup (pragmas) to once per connection
+        results = super().engine_args(context)
+        results['poolclass'] = QueuePool
+        return results
+
+    def configure(self, engine, context):
+        pragmas = dict(SQLITE_PRAGMAS)
+        pragmas.update(context.sqlite_pragmas)
+
+        def connect(connection, record):
+            cursor = connection.cursor()
+            for key, value in pragmas.items():
+                cursor.execute("PRAGMA %s = %s" % (key, value))
+            cursor.close()
+
+        event.listen(engine, 'connect', connect)
+
+        return None
+
+BACKENDS = {'mysql': MySqlBackend(), 'postgresql': PostgreSqlBackend(), 'sqlite': SqliteBackend()}
+
+def select_backend(name):
+    """
+    :param name: mysql, postgresql or sqlite
+    :return: SqlBackend
+    """
+    if name not in BACKENDS:
+        raise ValueError("dbBackend must be mysql, postgresql or sqlite:%s" % name)
+
+    return BACKENDS[name]
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
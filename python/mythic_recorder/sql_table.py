@@ -5,24 +5,50 @@
 # Author: G.S. Cole (guycole at gmail dot com)
 #
 import datetime
+import os
 
 from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import exc
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import select
 from sqlalchemy.orm import sessionmaker
 
 from sqlalchemy import Column
+from sqlalchemy import Index
 from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, Integer, String
 
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# bump when tables or columns change, so the next start runs create_all
+SCHEMA_VERSION = 1
+
+# columns added to existing tables, create_all never alters a table => upgrade script (relative to the repository)
+MIGRATIONS = {'load_log.checkpoint_offset': 'mysql/load_log_checkpoint.sql', 'load_log.checkpoint_row': 'mysql/load_log_checkpoint.sql',
+              'load_log.fresh_flag': 'mysql/load_log_fresh.sql', 'load_log.archive_name': 'mysql/load_log_archive.sql',
+              'load_log.read_duration': 'mysql/parse_metrics.sql', 'load_log.parse_duration': 'mysql/parse_metrics.sql',
+              'load_log.resolve_duration': 'mysql/parse_metrics.sql', 'load_log.select_duration': 'mysql/parse_metrics.sql',
+              'load_log.write_duration': 'mysql/parse_metrics.sql', 'load_log.commit_duration': 'mysql/parse_metrics.sql',
+              'load_log.select_pop': 'mysql/parse_metrics.sql', 'load_log.write_pop': 'mysql/parse_metrics.sql'}
+
+# rows per fetch for large reads w/server side cursors (Query.yield_per)
+YIELD_SIZE = 10000
+
+# SQLite only auto increments INTEGER PRIMARY KEY
+Identifier = BigInteger().with_variant(Integer, 'sqlite')
+
+# secondary indexes mirror ndx1 in mysql/mythic_recorder_v1.sql, names are prefixed because SQLite index names are global
+
 class ApplicationLog(Base):
     """
     Application log, similar to SysLog
     """
     __tablename__ = 'application_log'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Identifier, primary_key=True)
     time_stamp = Column(DateTime, default=datetime.datetime.utcnow)
     task_id = Column(BigInteger, nullable=False)
     facility = Column(String(32), nullable=False)
@@ -51,7 +77,7 @@ class Exchange(Base):
     """
     __tablename__ = 'exchange'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Identifier, primary_key=True)
     creation_task_id = Column(BigInteger, nullable=False)
     update_task_id = Column(BigInteger, nullable=False)
     symbol = Column(String(32), nullable=False, unique=True)
@@ -77,7 +103,7 @@ class FileStat(Base):
     """
     __tablename__ = 'file_stat'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Identifier, primary_key=True)
     creation_task_id = Column(BigInteger, nullable=False)
     update_task_id = Column(BigInteger, nullable=False)
     normalized_name = Column(String(64), nullable=False, unique=True)
@@ -99,8 +125,9 @@ class LoadLog(Base):
     Every fresh/updated file has a row in LoadLog to manage processing
     """
     __tablename__ = 'load_log'
+    __table_args__ = (Index('load_log_ndx1', 'complete_flag', 'file_name'),)
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Identifier, primary_key=True)
     creation_task_id = Column(BigInteger, nullable=False)
     update_task_id = Column(BigInteger, nullable=False)
     exchange = Column(String(16), nullable=False)
@@ -113,7 +140,19 @@ class LoadLog(Base):
     stub_pop = Column(Integer, nullable=False)
     total_pop = Column(Integer, nullable=False)
     complete_flag = Column(Boolean, nullable=False)
-    duration = Column(Integer, nullable=False)
+    duration = Column(Float, nullable=False)
+    checkpoint_offset = Column(BigInteger, nullable=False)
+    checkpoint_row = Column(Integer, nullable=False)
+    fresh_flag = Column(Boolean, nullable=False)
+    read_duration = Column(Float, nullable=False)
+    parse_duration = Column(Float, nullable=False)
+    resolve_duration = Column(Float, nullable=False)
+    select_duration = Column(Float, nullable=False)
+    write_duration = Column(Float, nullable=False)
+    commit_duration = Column(Float, nullable=False)
+    select_pop = Column(Integer, nullable=False)
+    write_pop = Column(Integer, nullable=False)
+    archive_name = Column(String(128))
 
     def __init__(self, task_id, exchange, file_name, normalized_name):
         """
@@ -136,6 +175,18 @@ class LoadLog(Base):
         self.total_pop = 0
         self.complete_flag = False
         self.duration = 0
+        self.checkpoint_offset = 0
+        self.checkpoint_row = 0
+        self.fresh_flag = False
+        self.archive_name = None
+        self.read_duration = 0.0
+        self.parse_duration = 0.0
+        self.resolve_duration = 0.0
+        self.select_duration = 0.0
+        self.write_duration = 0.0
+        self.commit_duration = 0.0
+        self.select_pop = 0
+        self.write_pop = 0
 
     def __repr__(self):
         return "<load_log(%s)>" % (self.normalized_name)
@@ -146,7 +197,7 @@ class LoadLogSummary(Base):
     """
     __tablename__ = 'load_log_summary'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Identifier, primary_key=True)
     time_stamp = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     task_id = Column(BigInteger, nullable=False)
     total_file_pop = Column(Integer, nullable=False)
@@ -172,13 +223,59 @@ class LoadLogSummary(Base):
     def __repr__(self):
         return "<load_log_summary(%d)>" % (self.task_id)
 
+class ParseSummary(Base):
+    """
+    Price load stage durations and SQL statement counts per task and exchange, rolled up from LoadLog
+    """
+    __tablename__ = 'parse_summary'
+
+    id = Column(Identifier, primary_key=True)
+    time_stamp = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    task_id = Column(BigInteger, nullable=False)
+    exchange = Column(String(16), nullable=False)
+    file_pop = Column(Integer, nullable=False)
+    total_pop = Column(Integer, nullable=False)
+    duration = Column(Float, nullable=False)
+    read_duration = Column(Float, nullable=False)
+    parse_duration = Column(Float, nullable=False)
+    resolve_duration = Column(Float, nullable=False)
+    select_duration = Column(Float, nullable=False)
+    write_duration = Column(Float, nullable=False)
+    commit_duration = Column(Float, nullable=False)
+    select_pop = Column(Integer, nullable=False)
+    write_pop = Column(Integer, nullable=False)
+
+    def __init__(self, task_id, exchange):
+        """
+        Create a parse summary row
+        :param task_id: parent task
+        :param exchange: associated exchange
+        """
+        self.task_id = task_id
+        self.exchange = exchange
+        self.file_pop = 0
+        self.total_pop = 0
+        self.duration = 0.0
+        self.read_duration = 0.0
+        self.parse_duration = 0.0
+        self.resolve_duration = 0.0
+        self.select_duration = 0.0
+        self.write_duration = 0.0
+        self.commit_duration = 0.0
+        self.select_pop = 0
+        self.write_pop = 0
+
+    def __repr__(self):
+        return "<parse_summary(%d, %s)>" % (self.task_id, self.exchange)
+
 class Name(Base):
     """
     Information from "Names" directory
     """
     __tablename__ = 'name'
+    __table_args__ = (Index('name_ndx1', 'symbol', 'exchange_id'),)
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Identifier, primary_key=True)
     creation_task_id = Column(BigInteger, nullable=False)
     update_task_id = Column(BigInteger, nullable=False)
     exchange_id = Column(BigInteger, nullable=False)
@@ -207,20 +304,22 @@ class Name(Base):
 
 class PriceIntraDay(Base):
     """
-    Contents of 5 minute bar price files
+    Contents of 5 minute bar price files.
+    Keyed (and on InnoDB clustered) by (name_id, date), there is no surrogate id.
+    Prices are INT, i.e. up to 2,147,483.647 per share.
+    Legacy tables w/an auto increment id remain compatible, partition_intraday.py migrates them
     """
     __tablename__ = 'price_intraday'
 
-    id = Column(BigInteger, primary_key=True)
-    task_id = Column(BigInteger, nullable=False)
-    name_id = Column(BigInteger, nullable=False)
-    date = Column(DateTime, nullable=False)
-    open_price = Column(BigInteger, nullable=False)
-    high_price = Column(BigInteger, nullable=False)
-    low_price = Column(BigInteger, nullable=False)
-    close_price = Column(BigInteger, nullable=False)
+    task_id = Column(Integer, nullable=False)
+    name_id = Column(Integer, primary_key=True, autoincrement=False)
+    date = Column(DateTime, primary_key=True)
+    open_price = Column(Integer, nullable=False)
+    high_price = Column(Integer, nullable=False)
+    low_price = Column(Integer, nullable=False)
+    close_price = Column(Integer, nullable=False)
     volume = Column(BigInteger, nullable=False)
-    open_interest = Column(BigInteger, nullable=False)
+    open_interest = Column(Integer, nullable=False)
 
     def __init__(self, name_id, date, open_price, high_price, low_price, close_price, volume, open_interest):
         """
@@ -252,8 +351,9 @@ class PriceSession(Base):
     Contents of price files
     """
     __tablename__ = 'price_session'
+    __table_args__ = (Index('price_session_ndx1', 'name_id', 'date', unique=True),)
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Identifier, primary_key=True)
     task_id = Column(BigInteger, nullable=False)
     name_id = Column(BigInteger, nullable=False)
     date = Column(Date, nullable=False)
@@ -289,13 +389,33 @@ class PriceSession(Base):
     def __repr__(self):
         return "<price_session(%d, %s)>" % (self.name_id, self.date)
 
+class SchemaVersion(Base):
+    """
+    One row per schema upgrade, startup skips create_all once SCHEMA_VERSION is recorded
+    """
+    __tablename__ = 'schema_version'
+
+    id = Column(Identifier, primary_key=True)
+    time_stamp = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    version = Column(Integer, nullable=False)
+
+    def __init__(self, version):
+        """
+        Create a SchemaVersion
+        :param version: schema version, see SCHEMA_VERSION
+        """
+        self.version = version
+
+    def __repr__(self):
+        return "<schema_version(%d)>" % (self.version)
+
 class TaskLog(Base):
     """
     All mythic recorder operations have a "task" to track operations
     """
     __tablename__ = 'task_log'
 
-    id = Column(BigInteger, primary_key=True)
+    id = Column(Identifier, primary_key=True)
     time_stamp = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     command = Column(String(128), nullable=False)
 
@@ -314,11 +434,120 @@ class SqlTable:
     SQL administration
     """
     def __init__(self, context):
-        engine = create_engine(context.mysql_url, echo=False)
-        Base.metadata.create_all(engine)
+        self.engine = self.make_engine(context)
+
+        if not self.schema_current(self.engine):
+            Base.metadata.create_all(self.engine)
+            self.schema_check(self.engine)
+            self.schema_record(self.engine)
 
         self.session_maker = sessionmaker()
-        self.session_maker.configure(bind=engine)
+        self.session_maker.configure(bind=self.engine)
+        context.pool_metrics.listen_session(self.session_maker)
+
+        # price loads, a dedicated pool so bulk connection settings never reach other sessions
+        self.bulk_engine = None
+        self.bulk_session_maker = self.session_maker
+
+        if context.bulk_session and len(context.sql_backend.bulk_statements) > 0:
+            self.bulk_engine = self.make_engine(context, True)
+
+            self.bulk_session_maker = sessionmaker()
+            self.bulk_session_maker.configure(bind=self.bulk_engine)
+            context.pool_metrics.listen_session(self.bulk_session_maker)
+
+    def make_engine(self, context, bulk_flag=False):
+        """
+        :param context: runtime context
+        :param bulk_flag: true applies SqlBackend.bulk_statements to each connection
+        :return: engine w/pool configured from context
+        """
+        sql_backend = context.sql_backend
+
+        engine = create_engine(context.database_url, echo=False, connect_args=sql_backend.connect_args(context), **sql_backend.engine_args(context))
+        sql_backend.configure(engine, context)
+        if bulk_flag:
+            sql_backend.configure_bulk(engine, context)
+
+        self.guard_fork(engine)
+
+        context.pool_metrics.listen(engine)
+        context.stage_timer.listen(engine)
+
+        return engine
+
+    def guard_fork(self, engine):
+        """
+        pooled connections belong to the process which opened them, a forked child which reaches
+        an inherited connection discards it (never closes it) and opens its own
+        :param engine: fresh engine
+        :return: None
+        """
+        def connect(connection, record):
+            record.info['pid'] = os.getpid()
+
+        def checkout(connection, record, proxy):
+            if record.info['pid'] != os.getpid():
+                record.connection = proxy.connection = None
+                raise exc.DisconnectionError("connection record belongs to pid %d, not %d" % (record.info['pid'], os.getpid()))
+
+        event.listen(engine, 'connect', connect)
+        event.listen(engine, 'checkout', checkout)
+
+        return None
+
+    def schema_current(self, engine):
+        """
+        :param engine: database engine
+        :return: True if schema_version records SCHEMA_VERSION, create_all is skipped
+        """
+        with engine.connect() as connection:
+            if not engine.dialect.has_table(connection, SchemaVersion.__tablename__):
+                return False
+
+            version = connection.execute(select([func.max(SchemaVersion.__table__.c.version)])).scalar()
+
+        return version is not None and version >= SCHEMA_VERSION
+
+    def schema_check(self, engine):
+        """
+        create_all only adds missing tables, refuse to record SCHEMA_VERSION over a table w/o every column
+        :param engine: database engine
+        :return: None
+        """
+        inspector = inspect(engine)
+
+        missing = []
+        for table in Base.metadata.sorted_tables:
+            present = set(column['name'] for column in inspector.get_columns(table.name))
+            for column in table.columns:
+                if column.name not in present:
+                    missing.append("%s.%s" % (table.name, column.name))
+
+        if len(missing) > 0:
+            scripts = sorted(set(MIGRATIONS.get(name, 'mysql/mythic_recorder_v1.sql') for name in missing))
+            raise ValueError("schema missing columns %s, apply %s" % (", ".join(missing), ", ".join(scripts)))
+
+        return None
+
+    def schema_record(self, engine):
+        with engine.begin() as connection:
+            connection.execute(SchemaVersion.__table__.insert(), {'version': SCHEMA_VERSION, 'time_stamp': datetime.datetime.utcnow()})
 
     def session_factory(self):
-        return self.session_maker()
\ No newline at end of file
+        return self.session_maker()
+
+    def bulk_session_factory(self):
+        """
+        :return: session for price loads, see bulkSession
+        """
+        return self.bulk_session_maker()
+
+    def dispose(self):
+        """
+        close pooled connections
+        :return: None
+        """
+        self.engine.dispose()
+        if self.bulk_engine is not None:
+            self.bulk_engine.dispose()
\ No newline at end of file
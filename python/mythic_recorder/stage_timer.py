@@ -0,0 +1,114 @@
+#
+# Title: stage_timer.py
+# Description: per file time and SQL statement accounting by load stage
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import threading
+import time
+
+from sqlalchemy import event
+
+STAGES = ('read', 'parse', 'resolve', 'select', 'write', 'commit')
+
+class StageTimer:
+    """
+    Exclusive wall clock accounting, exactly one stage is current and switch() charges the elapsed time to it.
+    SQL statements are charged to select or write via engine events (and counted), then the interrupted stage resumes,
+    so the stage durations sum to the file duration.  Statements from other threads (i.e. AlertLog) are ignored.
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.owner = None
+        self.current = None
+        self.mark = 0.0
+
+        # stage resumed once the current statement completes
+        self.interrupted = None
+
+        # stage => seconds
+        self.durations = dict.fromkeys(STAGES, 0.0)
+
+        self.select_counter = 0
+        self.write_counter = 0
+
+    def listen(self, engine):
+        """
+        register statement hooks on engine
+        :param engine: SQLAlchemy engine
+        :return: None
+        """
+        event.listen(engine, 'before_cursor_execute', self.before_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_execute)
+
+    def reset(self):
+        """
+        start accounting for a fresh file on the calling thread
+        :return: None
+        """
+        self.owner = threading.get_ident()
+        self.durations = dict.fromkeys(STAGES, 0.0)
+        self.select_counter = 0
+        self.write_counter = 0
+
+        self.current = None
+        self.interrupted = None
+        self.mark = time.perf_counter()
+
+    def switch(self, stage):
+        """
+        charge elapsed time to the current stage, then make stage current
+        :param stage: one of STAGES, None suspends accounting
+        :return: previous stage
+        """
+        now = time.perf_counter()
+
+        previous = self.current
+        if previous is not None:
+            self.durations[previous] = self.durations[previous] + now - self.mark
+
+        self.current = stage
+        self.mark = now
+
+        return previous
+
+    def stop(self):
+        """
+        :return: None
+        """
+        self.switch(None)
+        self.owner = None
+
+    def before_execute(self, connection, cursor, statement, parameters, context, executemany):
+        if self.owner != threading.get_ident() or self.current is None:
+            return
+
+        if statement.lstrip()[:6].upper() == 'SELECT':
+            self.select_counter = 1 + self.select_counter
+            self.interrupted = self.switch('select')
+        else:
+            self.write_counter = 1 + self.write_counter
+            self.interrupted = self.switch('write')
+
+    def after_execute(self, connection, cursor, statement, parameters, context, executemany):
+        if self.owner != threading.get_ident() or self.interrupted is None:
+            return
+
+        self.switch(self.interrupted)
+        self.interrupted = None
+
+    def values(self):
+        """
+        :return: LoadLog column values
+        """
+        results = {"%s_duration" % stage: self.durations[stage] for stage in STAGES}
+        results['select_pop'] = self.select_counter
+        results['write_pop'] = self.write_counter
+        return results
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
@@ -0,0 +1,160 @@
+#! /usr/bin/python3
+#
+# Title:parse_benchmark.py
+# Description: price row parser micro benchmark over the EODData sample tree
+# Development Environment:OS X 10.13.3/Python 3.6.4
+# Author:G.S. Cole (guycole at gmail dot com)
+#
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+from mythic_recorder.columnar import IntradayColumns
+from mythic_recorder.price_reader import PriceReader
+from mythic_recorder.sql_table import PriceIntraDay
+from mythic_recorder.utility import Utility
+
+
+class ParseBenchmark:
+    """
+    Compare the original line parser (Utility per row, strip, strptime, float) against PriceReader,
+    and per row PriceIntraDay models (as ParsePrice.execute holds them until commit) against IntradayColumns
+    """
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.facility = 'parse_benchmark'
+
+    def legacy_parse_row(self, raw_line):
+        """
+        original ParsePrice.parse_row
+        """
+        if raw_line.startswith('Symbol'):
+            return None
+
+        buffer = raw_line.strip().split(",")
+        if len(buffer) < 7 or len(buffer) > 8:
+            return None
+
+        utility = Utility()
+
+        symbol = buffer[0].strip()
+        date = utility.date_converter(buffer[1].strip())
+        open_price = utility.price_converter(buffer[2].strip())
+        high_price = utility.price_converter(buffer[3].strip())
+        low_price = utility.price_converter(buffer[4].strip())
+        close_price = utility.price_converter(buffer[5].strip())
+        volume = int(buffer[6].strip())
+
+        if len(buffer) > 7:
+            open_interest = int(buffer[7].strip())
+        else:
+            open_interest = 0
+
+        return symbol, date, open_price, high_price, low_price, close_price, volume, open_interest
+
+    def legacy_file(self, file_name):
+        population = 0
+        with open(file_name, 'rt') as in_file:
+            for raw_line in in_file:
+                if self.legacy_parse_row(raw_line) is not None:
+                    population = 1 + population
+
+        return population
+
+    def reader_file(self, file_name):
+        population = 0
+        price_reader = PriceReader()
+        with open(file_name, 'rt', newline='') as in_file:
+            for fields in price_reader.read(in_file):
+                if len(fields) > 0 and fields[0] == 'Symbol':
+                    continue
+
+                if price_reader.parse_fields(fields) is not None:
+                    population = 1 + population
+
+        return population
+
+    def model_file(self, file_name):
+        models = []
+        price_reader = PriceReader()
+        with open(file_name, 'rt', newline='') as in_file:
+            for fields in price_reader.read(in_file):
+                if len(fields) > 0 and fields[0] == 'Symbol':
+                    continue
+
+                current = price_reader.parse_fields(fields)
+                if current is not None:
+                    models.append(PriceIntraDay(0, current[1], current[2], current[3], current[4], current[5], current[6], current[7]))
+
+        return models
+
+    def columnar_file(self, file_name):
+        columns = IntradayColumns()
+        with open(file_name, 'rb') as in_file:
+            columns.read(in_file)
+        return columns
+
+    def measure_memory(self, label, function, file_name):
+        start_time = time.time()
+        result = function(file_name)
+        duration = time.time() - start_time
+        del result
+
+        # second pass for memory, tracemalloc distorts time
+        tracemalloc.start()
+        result = function(file_name)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print("%-8s %-28s %8.3f sec %8.1f MiB peak %8.1f MiB retained" % (label, os.path.basename(file_name), duration, peak / 1048576.0, current / 1048576.0))
+        del result
+
+    def measure(self, label, function, file_names):
+        start_time = time.time()
+
+        population = 0
+        for file_name in file_names:
+            population = population + function(file_name)
+
+        duration = time.time() - start_time
+        print("%-8s %9d rows %8.3f sec %10.0f rows/sec" % (label, population, duration, population / duration))
+
+        return population / duration
+
+    def execute(self, import_directory):
+        file_names = sorted(glob.glob("%s/*/*.csv" % import_directory) + glob.glob("%s/*/5/*.csv" % import_directory))
+        print("%d price files in %s" % (len(file_names), import_directory))
+
+        before = self.measure('legacy', self.legacy_file, file_names)
+        after = self.measure('reader', self.reader_file, file_names)
+
+        print("speedup %.2fx" % (after / before))
+
+        if not IntradayColumns.available():
+            print("numpy not installed, skipping columnar comparison")
+            return
+
+        for file_name in sorted(glob.glob("%s/*/5/*.csv" % import_directory))[:4]:
+            self.measure_memory('model', self.model_file, file_name)
+            self.measure_memory('columnar', self.columnar_file, file_name)
+
+#
+# argv[1] = EODData import directory
+#
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        import_directory = sys.argv[1]
+    else:
+        import_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'EODData', 'DataClient', 'ASCII')
+
+    benchmark = ParseBenchmark()
+    benchmark.execute(import_directory)
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
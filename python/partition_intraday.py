@@ -0,0 +1,68 @@
+#! /usr/bin/python3
+#
+# Title:partition_intraday.py
+# Description: migrate price_intraday to the compact partitioned layout, or provision monthly partitions
+# Development Environment:OS X 10.13.3/Python 3.6.4
+# Author:G.S. Cole (guycole at gmail dot com)
+#
+import sys
+
+from mythic_recorder.context import Context
+from mythic_recorder.intraday_partition import IntradayPartition
+from mythic_recorder.sql_table import SqlTable
+
+# empty monthly partitions kept ahead of the newest data
+MONTHS_AHEAD = 3
+
+# name_id population per copy statement during migration
+CHUNK_SIZE = 500
+
+
+class PartitionIntraday:
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.facility = 'partition_intraday'
+
+    def execute(self, yaml_file_name, command):
+        context = Context()
+        context.loader(yaml_file_name)
+
+        if context.db_backend != 'mysql':
+            print("partition_intraday requires mysql, not %s" % context.db_backend)
+            return None
+
+        sql_table = SqlTable(context)
+        intraday_partition = IntradayPartition(sql_table.engine, context.mysql_database)
+
+        if command == 'migrate':
+            intraday_partition.migrate(MONTHS_AHEAD, CHUNK_SIZE)
+        elif command == 'extend':
+            print("%d fresh partitions" % intraday_partition.extend(MONTHS_AHEAD))
+        else:
+            print("unknown command:%s" % command)
+
+print('start partition_intraday')
+
+#
+# argv[1] = configuration filename
+# argv[2] = migrate (one time conversion) or extend (monthly, before the load)
+#
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        yaml_file_name = sys.argv[1]
+        command = sys.argv[2]
+    else:
+        print("usage: partition_intraday.py config_file migrate|extend")
+        sys.exit(1)
+
+    partition_intraday = PartitionIntraday()
+    partition_intraday.execute(yaml_file_name, command)
+
+print('stop partition_intraday')
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
@@ -0,0 +1,206 @@
+#! /usr/bin/python3
+#
+# Title:recompress.py
+# Description: compress loaded price files in place, file_stat follows so nothing reloads
+# Development Environment:OS X 10.13.3/Python 3.6.4
+# Author:G.S. Cole (guycole at gmail dot com)
+#
+import gzip
+import lzma
+import os
+import shutil
+import sys
+
+from mythic_recorder.context import Context
+from mythic_recorder.eod_file import EodFile
+from mythic_recorder.eod_file import hash_algorithm
+from mythic_recorder.eod_file import zstandard
+from mythic_recorder.sql_table import YIELD_SIZE
+from mythic_recorder.sql_table import FileStat
+from mythic_recorder.sql_table import LoadLog
+from mythic_recorder.sql_table import SqlTable
+
+# method => (suffix, default level)
+METHODS = {'gzip': ('.gz', 9), 'xz': ('.xz', 6), 'zstd': ('.zst', 19)}
+
+
+class Recompress:
+
+    def __init__(self):
+        """
+        ctor
+        """
+        self.facility = 'recompress'
+
+        self.compress_counter = 0
+        self.remove_counter = 0
+        self.skip_counter = 0
+        self.source_bytes = 0
+        self.target_bytes = 0
+
+    def select_loaded(self, session):
+        """
+        :param session: database session
+        :return: normalized name => (file_stat id, size, digest) for files w/o a pending load
+        """
+        pending = set()
+        for normalized_name, in session.query(LoadLog.normalized_name).filter_by(complete_flag=False).yield_per(YIELD_SIZE):
+            pending.add(normalized_name)
+
+        results = {}
+        selected_set = session.query(FileStat.normalized_name, FileStat.id, FileStat.file_size, FileStat.sha1_hash).yield_per(YIELD_SIZE)
+        for normalized_name, row_id, file_size, sha1_hash in selected_set:
+            if normalized_name not in pending:
+                results[normalized_name] = (row_id, file_size, sha1_hash)
+
+        return results
+
+    def open_writer(self, file_name, method, level):
+        if method == 'gzip':
+            return gzip.open(file_name, 'wb', compresslevel=level)
+
+        if method == 'xz':
+            return lzma.open(file_name, 'wb', preset=level)
+
+        return zstandard.ZstdCompressor(level=level).stream_writer(open(file_name, 'wb'))
+
+    def compress_file(self, eod_file, target_name, method, level):
+        """
+        write through a temporary file, the original is untouched until file_stat is updated
+        :param eod_file: loaded price file
+        :param target_name: compressed file name
+        :param method: gzip, xz or zstd
+        :param level: compression level
+        :return: None
+        """
+        temp_name = "%s.tmp" % target_name
+
+        with open(eod_file.full_name, 'rb') as in_file:
+            with self.open_writer(temp_name, method, level) as out_file:
+                shutil.copyfileobj(in_file, out_file, 1048576)
+
+        stat = os.stat(eod_file.full_name)
+        os.utime(temp_name, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        os.replace(temp_name, target_name)
+
+        return None
+
+    def remove_original(self, full_name, file_size, file_hash, algorithm):
+        """
+        :param full_name: uncompressed price file
+        :param file_size: size from file_stat
+        :param file_hash: digest from file_stat
+        :param algorithm: digest algorithm
+        :return: True if a compressed sibling matches file_stat and the original was removed
+        """
+        for suffix, level in METHODS.values():
+            compressed = EodFile(full_name + suffix)
+            if compressed.file_size() == file_size and compressed.file_hash(algorithm) == file_hash:
+                os.remove(full_name)
+                self.remove_counter = 1 + self.remove_counter
+                return True
+
+        return False
+
+    def remove_debris(self, full_name):
+        """
+        :param full_name: any file below importDir
+        :return: True if full_name was a temporary file of compress_file() and has been removed
+        """
+        for suffix, level in METHODS.values():
+            debris_suffix = ".csv%s.tmp" % suffix
+            if full_name.endswith(debris_suffix):
+                # an interrupted run leaves the original in place, anything else is not ours
+                if os.path.isfile(full_name[:-len("%s.tmp" % suffix)]):
+                    os.remove(full_name)
+                    return True
+
+        return False
+
+    def execute(self, yaml_file_name, method, level):
+        context = Context()
+        context.loader(yaml_file_name)
+
+        sql_table = SqlTable(context)
+        session = sql_table.session_factory()
+
+        suffix = METHODS[method][0]
+
+        loaded = self.select_loaded(session)
+
+        for directory_name, directory_names, file_names in os.walk(context.import_directory):
+            for file_name in sorted(file_names):
+                full_name = os.path.join(directory_name, file_name)
+
+                if self.remove_debris(full_name):
+                    continue
+
+                if not file_name.endswith('.csv'):
+                    continue
+
+                eod_file = EodFile(full_name)
+
+                selected = loaded.get(eod_file.normalized_file_name)
+                if selected is None:
+                    self.skip_counter = 1 + self.skip_counter
+                    continue
+
+                # only the contents recorded in file_stat, anything else awaits the loader
+                row_id, file_size, file_hash = selected
+                algorithm = hash_algorithm(file_hash)
+
+                # an interrupted run committed file_stat for the compressed copy but left the original
+                if self.remove_original(full_name, file_size, file_hash, algorithm):
+                    continue
+                if eod_file.file_size() != file_size or eod_file.file_hash(algorithm) != file_hash:
+                    self.skip_counter = 1 + self.skip_counter
+                    continue
+
+                target_name = full_name + suffix
+                self.compress_file(eod_file, target_name, method, level)
+
+                compressed = EodFile(target_name)
+                session.query(FileStat).filter_by(id=row_id).update({"file_size":compressed.file_size(), "sha1_hash":compressed.file_hash(algorithm)})
+                session.commit()
+
+                os.remove(full_name)
+
+                self.compress_counter = 1 + self.compress_counter
+                self.source_bytes = file_size + self.source_bytes
+                self.target_bytes = compressed.file_size() + self.target_bytes
+
+        session.close()
+
+        print("%d files compressed, %d originals removed, %d skipped, %d bytes to %d bytes" %
+              (self.compress_counter, self.remove_counter, self.skip_counter, self.source_bytes, self.target_bytes))
+
+print('start recompress')
+
+#
+# argv[1] = configuration filename
+# argv[2] = gzip, xz or zstd (requires zstandard)
+# argv[3] = optional compression level
+# run between loads, not concurrently w/loader.py
+#
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[2] not in METHODS:
+        print("usage: recompress.py config_file gzip|xz|zstd [level]")
+        sys.exit(1)
+
+    if sys.argv[2] == 'zstd' and zstandard is None:
+        print("zstd requires the zstandard package")
+        sys.exit(1)
+
+    level = METHODS[sys.argv[2]][1]
+    if len(sys.argv) > 3:
+        level = int(sys.argv[3])
+
+    recompress = Recompress()
+    recompress.execute(sys.argv[1], sys.argv[2], level)
+
+print('stop recompress')
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
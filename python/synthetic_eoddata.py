@@ -0,0 +1,189 @@
+#! /usr/bin/python3
+#
+# Title:synthetic_eoddata.py
+# Description: scale the EODData sample tree to years of synthetic history for load benchmarks
+# Development Environment:OS X 10.13.3/Python 3.6.4
+# Author:G.S. Cole (guycole at gmail dot com)
+#
+import datetime
+import glob
+import os
+import random
+import shutil
+import sys
+
+# last synthetic trading day, matches the sample tree
+LAST_DAY = datetime.date(2018, 4, 30)
+
+
+class SyntheticEodData:
+    """
+    Write a tree shaped like ftp.eoddata.com w/one session file per exchange per weekday over the requested years,
+    and intraday files for the most recent weekdays.  Rows are copied from the sample files, dates are rewritten
+    and prices follow a seeded random walk so repeated runs produce identical trees.
+    """
+
+    def __init__(self, seed):
+        """
+        ctor
+        :param seed: random seed
+        """
+        self.facility = 'synthetic_eoddata'
+
+        self.random = random.Random(seed)
+
+        self.file_counter = 0
+        self.row_counter = 0
+
+    def weekdays(self, population):
+        """
+        :param population: weekday population
+        :return: list of weekdays ending at LAST_DAY, oldest first
+        """
+        results = []
+
+        current = LAST_DAY
+        while len(results) < population:
+            if current.weekday() < 5:
+                results.append(current)
+
+            current = current - datetime.timedelta(days=1)
+
+        results.reverse()
+        return results
+
+    def read_template(self, file_name):
+        """
+        :param file_name: sample price file
+        :return: header line and list of row fields
+        """
+        with open(file_name, 'rt') as in_file:
+            lines = in_file.read().splitlines()
+
+        return lines[0], [line.split(',') for line in lines[1:] if len(line) > 0]
+
+    def format_price(self, arg, factor):
+        price = "%.4f" % (float(arg) * factor)
+        return price.rstrip('0').rstrip('.')
+
+    def write_file(self, file_name, header, rows, day, factor):
+        """
+        write one synthetic price file
+        :param file_name: output file name
+        :param header: header line
+        :param rows: template rows
+        :param day: trading day
+        :param factor: price scale factor
+        :return: None
+        """
+        day_string = day.strftime('%d-%b-%Y')
+
+        with open(file_name, 'wt') as out_file:
+            out_file.write(header)
+            out_file.write('\n')
+
+            for fields in rows:
+                buffer = list(fields)
+
+                # intraday dates carry a bar time after the date
+                buffer[1] = day_string + fields[1][11:]
+
+                try:
+                    for ndx in range(2, 6):
+                        buffer[ndx] = self.format_price(fields[ndx], factor)
+                except (IndexError, ValueError):
+                    pass
+
+                out_file.write(','.join(buffer))
+                out_file.write('\n')
+
+        self.file_counter = 1 + self.file_counter
+        self.row_counter = len(rows) + self.row_counter
+
+        return None
+
+    def write_series(self, templates, target_directory, exchange, days):
+        """
+        :param templates: sample price file names
+        :param target_directory: output directory
+        :param exchange: exchange code, i.e. AMEX
+        :param days: trading days to write
+        :return: None
+        """
+        if len(templates) < 1:
+            return None
+
+        os.makedirs(target_directory, exist_ok=True)
+
+        contents = [self.read_template(template) for template in templates]
+
+        factor = 1.0
+        for ndx, day in enumerate(days):
+            factor = factor * (1.0 + self.random.gauss(0.0, 0.01))
+
+            header, rows = contents[ndx % len(contents)]
+            file_name = os.path.join(target_directory, "%s_%s.csv" % (exchange, day.strftime('%Y%m%d')))
+            self.write_file(file_name, header, rows, day, factor)
+
+        return None
+
+    def execute(self, source_directory, target_directory, years, intraday_days):
+        """
+        :param source_directory: sample tree, i.e. EODData/DataClient/ASCII
+        :param target_directory: synthetic tree
+        :param years: years of session history
+        :param intraday_days: weekdays of intraday history
+        :return: None
+        """
+        session_days = self.weekdays(int(years * 261))
+        intraday_days = self.weekdays(intraday_days)
+
+        os.makedirs(target_directory, exist_ok=True)
+        shutil.copy(os.path.join(source_directory, 'ExchangeList.xml'), target_directory)
+
+        for exchange_directory in sorted(glob.glob(os.path.join(source_directory, '*', ''))):
+            exchange = os.path.basename(os.path.dirname(exchange_directory))
+            target_exchange = os.path.join(target_directory, exchange)
+            os.makedirs(target_exchange, exist_ok=True)
+
+            symbol_list = os.path.join(exchange_directory, 'SymbolList.xml')
+            if os.path.exists(symbol_list):
+                shutil.copy(symbol_list, target_exchange)
+
+            templates = sorted(glob.glob(os.path.join(exchange_directory, '*.csv')))
+            self.write_series(templates, target_exchange, exchange, session_days)
+
+            templates = sorted(glob.glob(os.path.join(exchange_directory, '5', '*.csv')))
+            self.write_series(templates, os.path.join(target_exchange, '5'), exchange, intraday_days)
+
+        print("%d files, %d rows in %s" % (self.file_counter, self.row_counter, target_directory))
+
+#
+# argv[1] = synthetic tree (must end in ASCII, see EodFile)
+# argv[2] = years of session history
+# argv[3] = weekdays of intraday history
+# argv[4] = EODData sample tree
+#
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("usage: synthetic_eoddata.py target_directory years [intraday_days] [source_directory]")
+        sys.exit(1)
+
+    target_directory = sys.argv[1]
+    years = float(sys.argv[2])
+
+    intraday_days = 20
+    if len(sys.argv) > 3:
+        intraday_days = int(sys.argv[3])
+
+    if len(sys.argv) > 4:
+        source_directory = sys.argv[4]
+    else:
+        source_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'EODData', 'DataClient', 'ASCII')
+
+    synthetic = SyntheticEodData(1)
+    synthetic.execute(source_directory, target_directory, years, intraday_days)
+
+#;;; Local Variables: ***
+#;;; mode:python ***
+#;;; End: ***
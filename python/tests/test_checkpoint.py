@@ -0,0 +1,56 @@
+#
+# Title: test_checkpoint.py
+# Description: an interrupted price load resumes from its last checkpoint
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import pytest
+
+from conftest import SESSION_FILE
+
+from mythic_recorder.parse_price import ParsePrice
+from mythic_recorder.sql_table import LoadLog
+from mythic_recorder.sql_table import PriceSession
+
+SESSION_NAME = 'AMEX/AMEX_20180427.csv'
+
+# rows per chunk and the row which fails on the first attempt
+CHUNK_SIZE = 2
+CRASH_ROW = 7
+
+@pytest.mark.parametrize('mode,method', [('row', 'write'), ('bulk', 'write_bulk')])
+def test_resume(sqlite_harness, monkeypatch, mode, method):
+    expected = sqlite_harness(mode)
+    expected.context.chunk_size = CHUNK_SIZE
+    counters = expected.load(SESSION_NAME, SESSION_FILE)
+
+    harness = sqlite_harness(mode)
+    harness.context.chunk_size = CHUNK_SIZE
+    first_task_id = harness.context.task_id
+
+    original = getattr(ParsePrice, method)
+
+    def crash(self, *args):
+        if self.total_row_counter == CRASH_ROW and self.context.task_id == first_task_id:
+            raise RuntimeError('crash')
+        return original(self, *args)
+
+    monkeypatch.setattr(ParsePrice, method, crash)
+
+    harness.write_file(SESSION_NAME, SESSION_FILE)
+    load_log_id = harness.add_load_log(SESSION_NAME)
+    assert not harness.service(load_log_id)
+
+    # chunks before the failure are committed along w/the offset to resume from
+    harness.session.expire_all()
+    load_log = harness.session.query(LoadLog).filter_by(id=load_log_id).one()
+    assert not load_log.complete_flag
+    assert load_log.checkpoint_row == CRASH_ROW - 1
+    assert load_log.checkpoint_offset > 0
+    assert len(harness.prices(PriceSession)) > 0
+
+    harness.next_task()
+    assert harness.service(load_log_id)
+
+    assert harness.counters(load_log_id) == counters
+    assert harness.prices(PriceSession) == expected.prices(PriceSession)
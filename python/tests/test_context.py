@@ -0,0 +1,29 @@
+#
+# Title: test_context.py
+# Description: configurations needing concurrent writers are refused w/SQLite
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import pytest
+
+from mythic_recorder.context import Context
+
+def write_config(tmp_path, **overrides):
+    configuration = {'importDir': str(tmp_path / 'ASCII'), 'snsArn': 'bogus', 'dbBackend': 'sqlite',
+                     'sqliteFile': str(tmp_path / 'recorder.sqlite')}
+    configuration.update(overrides)
+
+    file_name = tmp_path / 'config.yaml'
+    file_name.write_text("".join("%s: %s\n" % (key, value) for key, value in configuration.items()))
+
+    return str(file_name)
+
+def test_sqlite_single_worker(tmp_path):
+    context = Context()
+    context.loader(write_config(tmp_path, parseWorkers=1))
+    assert context.sql_backend.name == 'sqlite'
+
+@pytest.mark.parametrize('overrides', [{'parseWorkers': 2}, {'streamLoad': True}])
+def test_sqlite_concurrent_writers(tmp_path, overrides):
+    with pytest.raises(ValueError):
+        Context().loader(write_config(tmp_path, **overrides))
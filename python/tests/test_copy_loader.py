@@ -0,0 +1,32 @@
+#
+# Title: test_copy_loader.py
+# Description: COPY loads classify and store like PostgreSqlBulkWriter, requires MYTHIC_RECORDER_TEST_POSTGRESQL
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import pytest
+
+from conftest import SESSION_FILE
+from test_infile_loader import CASES
+from test_infile_loader import compare_loaders
+
+from mythic_recorder.bulk_writer import PostgreSqlBulkWriter
+from mythic_recorder.copy_loader import CopyLoader
+from mythic_recorder.sql_table import PriceSession
+
+@pytest.mark.parametrize('normalized_name,prior,contents,model', CASES)
+def test_copy_matches_bulk(postgresql_harness, monkeypatch, normalized_name, prior, contents, model):
+    compare_loaders(postgresql_harness, monkeypatch, normalized_name, prior, contents, model, CopyLoader, PostgreSqlBulkWriter)
+
+def test_postgresql_modes(postgresql_harness):
+    """
+    row and bulk loads (INSERT ... ON CONFLICT) of the same file
+    """
+    results = []
+    for mode in ('row', 'bulk'):
+        harness = postgresql_harness(False)
+        harness.set_mode(mode)
+        results.append((harness.load('AMEX/AMEX_20180427.csv', SESSION_FILE), harness.prices(PriceSession)))
+        harness.close()
+
+    assert results[1] == results[0]
@@ -0,0 +1,65 @@
+#
+# Title: test_discovery.py
+# Description: a name both unpacked and in an archive is read from one source
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import os
+import zipfile
+
+from conftest import SESSION_FILE
+
+from mythic_recorder.discovery import Discovery
+from mythic_recorder.eod_archive import EodArchive
+from mythic_recorder.eod_file import EodFile
+from mythic_recorder.sql_table import FileStat
+from mythic_recorder.sql_table import LoadLog
+
+SESSION_NAME = 'AMEX/AMEX_20180427.csv'
+
+def discover(harness):
+    harness.next_task()
+    assert Discovery().execute(harness.context)
+
+    harness.session.expire_all()
+    file_stats = harness.session.query(FileStat.normalized_name, FileStat.sha1_hash).all()
+    load_logs = harness.session.query(LoadLog.normalized_name, LoadLog.archive_name).filter_by(creation_task_id=harness.context.task_id).all()
+    harness.session.commit()
+
+    return file_stats, load_logs
+
+def test_archive_collision(sqlite_harness, monkeypatch):
+    harness = sqlite_harness('row')
+    monkeypatch.chdir(os.getcwd())
+
+    harness.write_file(SESSION_NAME, SESSION_FILE)
+
+    # same name, other contents, in an archive at the import directory root
+    with zipfile.ZipFile(os.path.join(harness.context.import_directory, 'week.zip'), 'w') as zip_file:
+        zip_file.writestr('ASCII/' + SESSION_NAME, SESSION_FILE.replace('58.45', '58.46'))
+
+    file_stats, load_logs = discover(harness)
+    assert [name for name, digest in file_stats] == [SESSION_NAME]
+    assert load_logs == [(SESSION_NAME, 'week.zip')]
+
+    # the archive keeps the name, nothing changes on the next scans
+    for ndx in range(2):
+        assert discover(harness) == (file_stats, [])
+
+def test_archive_member(tmp_path):
+    file_name = str(tmp_path / 'week.zip')
+    with zipfile.ZipFile(file_name, 'w') as zip_file:
+        zip_file.writestr('DataClient/ASCII/' + SESSION_NAME, SESSION_FILE)
+
+    archive = EodArchive(file_name)
+    archive.open()
+    try:
+        members = list(archive.scan())
+    finally:
+        archive.close()
+
+    # constructed through EodFile.__init__, every EodFile attribute is present
+    assert [member.normalized_file_name for member in members] == [SESSION_NAME]
+    assert set(vars(EodFile(str(tmp_path / 'ASCII' / SESSION_NAME)))) <= set(vars(members[0]))
+    assert members[0].file_name == 'AMEX_20180427.csv'
+    assert members[0].full_name == file_name + '/DataClient/ASCII/' + SESSION_NAME
@@ -0,0 +1,200 @@
+#
+# Title: test_infile_loader.py
+# Description: LOAD DATA loads classify and store like MySqlBulkWriter, MySQL tests require MYTHIC_RECORDER_TEST_MYSQL
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import datetime
+
+import pytest
+
+from sqlalchemy import BigInteger
+from sqlalchemy import Column
+from sqlalchemy import MetaData
+from sqlalchemy import Table
+from sqlalchemy import text
+
+from conftest import INTRADAY_FILE
+from conftest import SESSION_FILE
+
+from mythic_recorder.bulk_writer import PRICE_COLUMNS
+from mythic_recorder.bulk_writer import MySqlBulkWriter
+from mythic_recorder.copy_loader import CopyLoader
+from mythic_recorder.infile_loader import InfileLoader
+from mythic_recorder.sql_table import PriceIntraDay
+from mythic_recorder.sql_table import PriceSession
+
+# an earlier file w/some of the same rows, AAU changed
+SESSION_PRIOR = """Symbol,Date,Open,High,Low,Close,Volume
+AADR,27-Apr-2018,58.07,58.47,58.07,58.45,22800
+AAU,27-Apr-2018,0.81,0.83,0.81,0.82,52700
+"""
+
+INTRADAY_PRIOR = """Symbol,Date,Open,High,Low,Close,Volume
+AADR,02-Apr-2018 09:30,58.96,58.96,57.85,57.85,1840
+AAU,02-Apr-2018 09:30,0.81,0.81,0.80,0.80,5000
+"""
+
+class SqliteStageLoader(CopyLoader):
+    """
+    CopyLoader w/the TSV inserted into a SQLite temporary table, so classify() and reclassify() run w/o a server.
+    SQLite needs WHERE to parse INSERT ... SELECT ... ON CONFLICT, otherwise the merge is CopyLoader's.
+    """
+
+    def stage(self, buffer):
+        stage = Table(self.stage_name, MetaData(), Column('name_id', BigInteger, primary_key=True, autoincrement=False),
+                      Column('date', self.table.c.date.type, primary_key=True),
+                      *[Column(column, BigInteger, nullable=False) for column in PRICE_COLUMNS], prefixes=['TEMPORARY'])
+
+        connection = self.session.connection()
+        stage.create(connection, checkfirst=True)
+        connection.execute(stage.delete())
+
+        if self.date_only:
+            date_converter = datetime.date.fromisoformat
+        else:
+            date_converter = datetime.datetime.fromisoformat
+
+        rows = []
+        for line in buffer:
+            fields = line.rstrip('\n').split('\t')
+            row = {'name_id': int(fields[0]), 'date': date_converter(fields[1])}
+            for ndx, column in enumerate(PRICE_COLUMNS):
+                row[column] = int(fields[2 + ndx])
+            rows.append(row)
+
+        connection.execute(stage.insert(), rows)
+
+        return None
+
+    def merge(self):
+        columns = ", ".join(PRICE_COLUMNS)
+        updates = ", ".join("%s = EXCLUDED.%s" % (column, column) for column in PRICE_COLUMNS)
+
+        statement = "INSERT INTO %s (task_id, name_id, date, %s) SELECT :task_id, name_id, date, %s FROM %s WHERE 1 ON CONFLICT (name_id, date) DO UPDATE SET %s" % \
+                    (self.table.name, columns, columns, self.stage_name, updates)
+
+        self.session.execute(text(statement), {'task_id': self.task_id})
+
+        return None
+
+CASES = [('AMEX/AMEX_20180427.csv', SESSION_PRIOR, SESSION_FILE, PriceSession),
+         ('AMEX/5/AMEX_20180402.csv', INTRADAY_PRIOR, INTRADAY_FILE, PriceIntraDay)]
+
+def compare_loaders(make_harness, monkeypatch, normalized_name, prior, contents, model, loader_type, writer_type):
+    """
+    the same files through the backend bulk writer, then through its whole file loader (stage, classify, merge)
+    :param make_harness: mysql_harness or postgresql_harness
+    :return: None
+    """
+    results = []
+    for load_infile in (False, True):
+        harness = make_harness(load_infile)
+
+        # the prior file is always a bulk load, the second file is fresh
+        harness.context.load_infile = False
+        harness.load(normalized_name.replace('AMEX_', 'PRIOR_'), prior)
+
+        harness.context.load_infile = load_infile
+        writers = []
+
+        def spy(original):
+            def make(*args):
+                writer = original(*args)
+                writers.append(writer)
+                return writer
+            return make
+
+        backend = harness.context.sql_backend
+        monkeypatch.setattr(backend, 'infile_loader', spy(backend.infile_loader))
+        monkeypatch.setattr(backend, 'bulk_writer', spy(backend.bulk_writer))
+
+        counters = harness.load(normalized_name, contents, fresh_flag=True)
+
+        if load_infile:
+            assert [type(writer) for writer in writers] == [loader_type]
+        else:
+            assert [type(writer) for writer in writers] == [writer_type]
+
+        results.append((counters, harness.prices(model)))
+
+        monkeypatch.undo()
+        harness.close()
+
+    assert results[1] == results[0]
+
+    # AADR repeated from the prior file, AAU changed against it
+    counters = results[0][0]
+    assert counters['duplicate_pop'] > 0
+    assert counters['update_pop'] > 0
+    assert counters['fresh_pop'] > 0
+
+@pytest.mark.parametrize('normalized_name,prior,contents,model', CASES)
+def test_infile_matches_bulk(mysql_harness, monkeypatch, normalized_name, prior, contents, model):
+    compare_loaders(mysql_harness, monkeypatch, normalized_name, prior, contents, model, InfileLoader, MySqlBulkWriter)
+
+@pytest.mark.parametrize('normalized_name,prior,contents,model', CASES)
+def test_staged_matches_bulk(sqlite_harness, monkeypatch, normalized_name, prior, contents, model):
+    """
+    stage, classify, reclassify and merge through Parser on SQLite, against a bulk load
+    """
+    results = []
+    for load_infile in (False, True):
+        harness = sqlite_harness('bulk')
+        harness.context.load_infile = load_infile
+        harness.load(normalized_name.replace('AMEX_', 'PRIOR_'), prior)
+
+        loaders = []
+
+        def make(session, table, task_id):
+            loaders.append(SqliteStageLoader(session, table, task_id))
+            return loaders[-1]
+
+        monkeypatch.setattr(harness.context.sql_backend, 'infile_flag', True)
+        monkeypatch.setattr(harness.context.sql_backend, 'infile_loader', make)
+
+        counters = harness.load(normalized_name, contents, fresh_flag=True)
+        assert len(loaders) == int(load_infile)
+
+        results.append((counters, harness.prices(model)))
+
+        monkeypatch.undo()
+
+    assert results[1] == results[0]
+
+def stage_classify_merge(harness, loader_type):
+    harness.load('AMEX/PRIOR_20180427.csv', SESSION_PRIOR)
+
+    session = harness.session
+    symbols = dict(harness.session.execute("SELECT symbol, id FROM name").fetchall())
+
+    infile_loader = loader_type(session, PriceSession.__table__, harness.context.task_id)
+
+    date = datetime.datetime(2018, 4, 27)
+
+    # AADR equal, AAU first occurrence equal then changed, AAMC fresh
+    infile_loader.append(symbols['AADR'], date, 58070, 58470, 58070, 58450, 22800, 0)
+    infile_loader.append(symbols['AAU'], date, 810, 830, 810, 820, 52700, 0)
+    infile_loader.append(symbols['AAU'], date, 810, 840, 810, 830, 52800, 0)
+    infile_loader.append(symbols['AAMC'], date, 65000, 65000, 65000, 65000, 600, 0)
+    infile_loader.flush()
+    session.commit()
+
+    assert (infile_loader.fresh_row_counter, infile_loader.update_row_counter, infile_loader.duplicate_row_counter) == (1, 1, 2)
+
+    prices = harness.prices(PriceSession)
+    assert [row[0] for row in prices] == ['AADR', 'AAMC', 'AAU']
+    assert prices[2][2:] == (810, 840, 810, 830, 52800, 0)
+
+    # staging table is per connection and emptied by the next flush
+    infile_loader.append(symbols['AAMC'], date, 65000, 65000, 65000, 65000, 600, 0)
+    infile_loader.flush()
+    session.commit()
+
+    assert infile_loader.duplicate_row_counter == 3
+
+def test_infile_stage_classify_merge(mysql_harness):
+    stage_classify_merge(mysql_harness(True), InfileLoader)
+
+def test_sqlite_stage_classify_merge(sqlite_harness):
+    stage_classify_merge(sqlite_harness('bulk'), SqliteStageLoader)
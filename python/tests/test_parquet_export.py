@@ -0,0 +1,48 @@
+#
+# Title: test_parquet_export.py
+# Description: export progress never passes a task w/price files still loading
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import datetime
+
+from mythic_recorder.parquet_export import ParquetExport
+from mythic_recorder.sql_table import LoadLog
+from mythic_recorder.sql_table import PriceSession
+
+def complete(harness, load_log_id):
+    """
+    mark a file loaded by the current task, as Parser.service_load_log would
+    """
+    harness.session.query(LoadLog).filter_by(id=load_log_id).\
+        update({'update_task_id': harness.context.task_id, 'complete_flag': True}, synchronize_session=False)
+    harness.session.commit()
+
+def test_export_mid_task(sqlite_harness, tmp_path):
+    harness = sqlite_harness('row')
+
+    parquet_export = ParquetExport(harness.session, str(tmp_path / 'parquet'))
+
+    # first task loads one file, the second file is still loading
+    harness.next_task()
+    complete(harness, harness.add_load_log('AMEX/AMEX_20180427.csv'))
+    pending_id = harness.add_load_log('AMEX/AMEX_20180430.csv')
+
+    dirty, task_id = parquet_export.select_dirty()
+    assert dirty[PriceSession.__tablename__] == {datetime.date(2018, 4, 1): {'amex'}}
+    assert task_id < harness.context.task_id
+
+    parquet_export.task_id = task_id
+
+    # same task completes the second file after the export
+    complete(harness, pending_id)
+
+    dirty, task_id = parquet_export.select_dirty()
+    assert dirty[PriceSession.__tablename__] == {datetime.date(2018, 4, 1): {'amex'}}
+    assert task_id == harness.context.task_id
+
+    parquet_export.task_id = task_id
+
+    dirty, task_id = parquet_export.select_dirty()
+    assert dirty[PriceSession.__tablename__] == {}
+    assert task_id == harness.context.task_id
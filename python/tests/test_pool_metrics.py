@@ -0,0 +1,33 @@
+#
+# Title: test_pool_metrics.py
+# Description: worker pool metrics are read and zeroed together
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import threading
+
+from mythic_recorder.pool_metrics import PoolMetrics
+
+COMMITS = 1000
+
+def test_drain_loses_nothing():
+    pool_metrics = PoolMetrics()
+
+    def commit():
+        for ndx in range(COMMITS):
+            pool_metrics.before_commit(None)
+            pool_metrics.after_commit(None)
+
+    # commits from another thread (i.e. AlertLog) while a worker drains
+    thread = threading.Thread(target=commit)
+    thread.start()
+
+    total = 0
+    while thread.is_alive():
+        total = pool_metrics.drain()['commit_pop'] + total
+    thread.join()
+
+    total = pool_metrics.drain()['commit_pop'] + total
+
+    assert total == COMMITS
+    assert pool_metrics.values()['commit_pop'] == 0
@@ -0,0 +1,124 @@
+#
+# Title: test_price_modes.py
+# Description: row, bulk and columnar loads classify and store identically
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import pytest
+
+from conftest import INTRADAY_FILE
+from conftest import MODES
+from conftest import SESSION_FILE
+
+from mythic_recorder.bar_store import BarStore
+from mythic_recorder.columnar import IntradayColumns
+from mythic_recorder.sql_table import PriceIntraDay
+from mythic_recorder.sql_table import PriceSession
+
+SESSION_NAME = 'AMEX/AMEX_20180427.csv'
+INTRADAY_NAME = 'AMEX/5/AMEX_20180402.csv'
+
+def load_sequence(harness, normalized_name, contents):
+    """
+    load a file, the same file again, then a corrected copy
+    :return: counters of each load
+    """
+    results = [harness.load(normalized_name, contents)]
+    results.append(harness.load(normalized_name, contents))
+
+    # AADR changed, AAMC (session) or ABE 09:45 (intraday) added
+    corrected = contents.replace('58.07,58.47,58.07,58.45', '58.07,58.47,58.07,58.46')
+    corrected = corrected.replace('58.96,58.96,57.85,57.85', '58.96,58.96,57.85,57.86')
+    corrected = corrected + "ABE,02-Apr-2018 09:45,14.55,14.60,14.55,14.60,200\n"
+    results.append(harness.load(normalized_name, corrected))
+
+    return results
+
+def test_session_first_load(sqlite_harness):
+    harness = sqlite_harness('row')
+
+    assert harness.load(SESSION_NAME, SESSION_FILE) == {'total_pop': 9, 'fail_pop': 2, 'fresh_pop': 5, 'update_pop': 1,
+                                                         'duplicate_pop': 1, 'stub_pop': 2, 'complete_flag': True}
+
+    prices = harness.prices(PriceSession)
+    assert [row[0] for row in prices] == ['AADR', 'AAMC', 'AAU', 'ABE', 'ACU']
+
+    # last occurrence wins, prices are pennies * 10
+    assert prices[2][2:] == (810, 830, 810, 820, 52700, 0)
+    assert prices[3][5] == 14695
+    assert prices[4][7] == 5
+
+@pytest.mark.parametrize('mode', ['bulk', 'columnar'])
+def test_session_modes(sqlite_harness, mode):
+    expected = sqlite_harness('row')
+    harness = sqlite_harness(mode)
+
+    assert load_sequence(harness, SESSION_NAME, SESSION_FILE) == load_sequence(expected, SESSION_NAME, SESSION_FILE)
+    assert harness.prices(PriceSession) == expected.prices(PriceSession)
+
+@pytest.mark.parametrize('mode', [mode for mode in MODES if mode != 'row'])
+def test_intraday_modes(sqlite_harness, mode):
+    if mode == 'columnar' and not IntradayColumns.available():
+        pytest.skip('columnar load requires numpy')
+
+    expected = sqlite_harness('row')
+    harness = sqlite_harness(mode)
+
+    counters = load_sequence(expected, INTRADAY_NAME, INTRADAY_FILE)
+    assert counters[0] == {'total_pop': 9, 'fail_pop': 2, 'fresh_pop': 5, 'update_pop': 1,
+                           'duplicate_pop': 1, 'stub_pop': 1, 'complete_flag': True}
+
+    assert load_sequence(harness, INTRADAY_NAME, INTRADAY_FILE) == counters
+    assert harness.prices(PriceIntraDay) == expected.prices(PriceIntraDay)
+
+@pytest.mark.parametrize('normalized_name,contents', [(SESSION_NAME, SESSION_FILE), (INTRADAY_NAME, INTRADAY_FILE)])
+@pytest.mark.parametrize('mode', list(MODES))
+def test_store_modes(sqlite_harness, tmp_path, mode, normalized_name, contents):
+    if not BarStore.available():
+        pytest.skip('bar store requires numpy')
+
+    expected = sqlite_harness('row')
+
+    # priceSink store, counters from BarStore.write
+    harness = sqlite_harness(mode)
+    harness.context.price_sink = 'store'
+    harness.context.bar_store = BarStore(str(tmp_path / 'bars'))
+
+    assert load_sequence(harness, normalized_name, contents) == load_sequence(expected, normalized_name, contents)
+
+@pytest.mark.parametrize('normalized_name,contents,model', [(SESSION_NAME, SESSION_FILE, PriceSession), (INTRADAY_NAME, INTRADAY_FILE, PriceIntraDay)])
+def test_negative_fields(sqlite_harness, normalized_name, contents, model):
+    if not IntradayColumns.available():
+        pytest.skip('columnar load requires numpy')
+
+    # negative volume (ABE) and open interest (ACU) are stored as read, w/o the changed repeat (AAU) the columnar load is used
+    contents = contents.replace(',8200', ',-8200').replace(',700', ',-700').replace(',1300,5', ',1300,-5')
+    contents = contents.replace("AAU,02-Apr-2018 09:30,0.81,0.82,0.80,0.81,5100\n", '')
+
+    results = []
+    for mode in MODES:
+        harness = sqlite_harness(mode)
+        results.append((harness.load(normalized_name, contents), harness.prices(model)))
+
+    assert results[0][0]['fail_pop'] == 2
+    assert results[0][0]['fresh_pop'] == 5
+    assert min(row[6] for row in results[0][1]) < 0
+
+    for result in results[1:]:
+        assert result == results[0]
+
+def test_columnar_fallback(sqlite_harness):
+    if not IntradayColumns.available():
+        pytest.skip('columnar load requires numpy')
+
+    # a bad cell fails one row on the row and bulk paths, the columnar reader gives the file to them
+    contents = INTRADAY_FILE.replace('14.50,14.55,14.45,14.55,700', 'n/a,14.55,14.45,14.55,700')
+
+    expected = sqlite_harness('row')
+    harness = sqlite_harness('columnar')
+
+    counters = expected.load(INTRADAY_NAME, contents)
+    assert counters['fail_pop'] == 3
+
+    assert harness.load(INTRADAY_NAME, contents) == counters
+    assert harness.prices(PriceIntraDay) == expected.prices(PriceIntraDay)
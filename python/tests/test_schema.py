@@ -0,0 +1,62 @@
+#
+# Title: test_schema.py
+# Description: schema_version is only recorded over tables w/every column
+# Development Environment: OS X 10.13.3/Python 3.6.4
+# Author: G.S. Cole (guycole at gmail dot com)
+#
+import sqlite3
+
+import pytest
+
+from mythic_recorder.context import Context
+from mythic_recorder.sql_table import SqlTable
+
+# load_log before mysql/load_log_checkpoint.sql and later upgrades
+LEGACY_LOAD_LOG = """CREATE TABLE load_log (
+  id INTEGER PRIMARY KEY,
+  creation_task_id BIGINT NOT NULL,
+  update_task_id BIGINT NOT NULL,
+  exchange VARCHAR(16) NOT NULL,
+  file_name VARCHAR(32) NOT NULL,
+  normalized_name VARCHAR(64) NOT NULL,
+  duplicate_pop INT NOT NULL,
+  fail_pop INT NOT NULL,
+  fresh_pop INT NOT NULL,
+  update_pop INT NOT NULL,
+  stub_pop INT NOT NULL,
+  total_pop INT NOT NULL,
+  complete_flag BOOLEAN NOT NULL,
+  duration FLOAT NOT NULL)"""
+
+def make_context(file_name):
+    context = Context()
+    context.sqlite_file = file_name
+    context.set_backend('sqlite')
+    return context
+
+def test_legacy_schema(tmp_path):
+    file_name = str(tmp_path / 'legacy.sqlite')
+
+    connection = sqlite3.connect(file_name)
+    connection.execute(LEGACY_LOAD_LOG)
+    connection.commit()
+    connection.close()
+
+    with pytest.raises(ValueError) as error:
+        SqlTable(make_context(file_name))
+
+    assert 'load_log.checkpoint_offset' in str(error.value)
+    assert 'mysql/load_log_checkpoint.sql' in str(error.value)
+    assert 'mysql/parse_metrics.sql' in str(error.value)
+
+    # still not current, the next start checks again
+    connection = sqlite3.connect(file_name)
+    assert connection.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == 0
+    connection.close()
+
+def test_fresh_schema(tmp_path):
+    file_name = str(tmp_path / 'fresh.sqlite')
+
+    sql_table = SqlTable(make_context(file_name))
+    assert sql_table.schema_current(sql_table.engine)
+    sql_table.dispose()